@@ -4,10 +4,120 @@ import os
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:////app/avukat.db"
+    DATABASE_POOL_SIZE: int = 20
+    DATABASE_MAX_OVERFLOW: int = 30
+    DATABASE_POOL_TIMEOUT: float = 30  # seconds to wait for a free connection
+    # Set on every SQLite connection. WAL lets readers run alongside the (single)
+    # writer, and with synchronous=NORMAL commits no longer fsync
+    SQLITE_JOURNAL_MODE: str = "WAL"  # "DELETE" is SQLite's default rollback journal
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait this long for a lock instead of failing with "database is locked"
+    SQLITE_CACHE_SIZE_KB: int = 20000  # page cache per connection
+    # Async engine (aiosqlite / asyncpg) for the database work of async routes,
+    # which otherwise runs on a worker thread
+    DATABASE_ASYNC_ENABLED: bool = False
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     UPLOAD_DIR: str = "./uploads"
+    # Larger upload request bodies are rejected (413) as soon as they go over
+    MAX_UPLOAD_SIZE_MB: int = 200
+    # Resumable uploads (POST /api/documents/{case_id}/uploads) are sent in chunks of this size
+    UPLOAD_CHUNK_SIZE_MB: int = 8
+    UPLOAD_SESSION_TTL_HOURS: int = 24  # unfinished resumable uploads are deleted after this
+    # Bulk import (POST /api/documents/{case_id}/import) of a ZIP archive or server-side files
+    IMPORT_MAX_ARCHIVE_MB: int = 2048
+    IMPORT_ROOT: str = ""  # directory manifest paths are relative to, empty disables manifest imports
+    # Small files are indexed together, in jobs of up to this many files and MB
+    IMPORT_JOB_MAX_DOCUMENTS: int = 32
+    IMPORT_JOB_MAX_MB: int = 16
+    IMPORT_EMBEDDING_BATCH_SIZE: int = 256  # chunks embedded at a time across the files of a job
+    # Extracted text is kept compressed next to each upload (.<filename>.txtz)
+    # and reused while the file's hash is unchanged, so re-indexing skips parsing
+    TEXT_STORE_ENABLED: bool = True
+    TEXT_STORE_FRAME_KB: int = 256  # uncompressed text per zlib frame
+    TEXT_STORE_COMPRESSION_LEVEL: int = 6
     VECTOR_DB_PATH: str = "./vector_db"
+    # Vector store backend: "chroma" (HNSW collection per case) or "numpy"
+    # (memory-mapped float16 matrix per case, brute-force search)
+    VECTOR_STORE: str = "chroma"
+    # Chroma server shared by the API, index worker processes and re-embedding. Without it Chroma
+    # runs inside the API process, which must then be its only user: index workers run as threads
+    CHROMA_SERVER_HOST: str = ""
+    CHROMA_SERVER_PORT: int = 8000
+    NUMPY_STORE_CACHE_MB: int = 256  # float32 copies of recently queried case matrices
+    # Also write every chunk to one index over all cases for /api/search
+    CROSS_CASE_SEARCH_ENABLED: bool = True
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5173", "http://localhost"]
+    EMBEDDING_MODEL: str = "paraphrase-multilingual-MiniLM-L12-v2"
+    # Tokens embedded per chunk, the rest is silently truncated. The model's default of 128, which the
+    # existing index was built with; raise it through a new index version (python -m app.reembed --max-seq-length)
+    EMBEDDING_MAX_SEQ_LENGTH: int = 128
+    # Chunking: "legal" (sentence/article aware, token budgeted) or "fixed" (1000 chars, 200 overlap)
+    CHUNKER: str = "legal"
+    CHUNK_MAX_TOKENS: int = 126  # capped at what the index version's model embeds (max sequence length - 2)
+    CHUNK_MIN_TOKENS: int = 64  # a heading only starts a new chunk once the current one has this many tokens
+    CHUNK_OVERLAP_SENTENCES: int = 0
+    # Number of chunks embedded and written to the vector store at a time
+    EMBEDDING_BATCH_SIZE: int = 64
+    # Embedding runtime: "torch" (sentence-transformers) or "onnx" (onnxruntime, exported on first use)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_QUANTIZE: bool = False  # int8 weights; compare with benchmarks.embedding_backends first
+    EMBEDDING_ONNX_DIR: str = ""  # exported models, defaults to VECTOR_DB_PATH/onnx
+    EMBEDDING_THREADS: int = 0  # threads per process, 0 for the runtime default (or INDEX_WORKER_THREADS in workers)
+    EMBEDDING_ENCODE_BATCH_SIZE: int = 0  # texts per forward pass, 0 for sentence-transformers' default of 32
+    # On-disk embedding cache shared by all processes, defaults to VECTOR_DB_PATH/embedding_cache.sqlite3
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = ""
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    # In-process caches for chat retrieval
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    RETRIEVAL_CACHE_SIZE: int = 1024
+    # Load the embedding model, the vector store and Gemini in the background at startup
+    WARMUP_ON_STARTUP: bool = True
+    # Threads for sync route handlers and blocking calls (AnyIO default is 40)
+    THREADPOOL_SIZE: int = 100
+    # Hybrid retrieval: BM25 over a per-case inverted index fused with vector search
+    HYBRID_SEARCH_ENABLED: bool = True
+    LEXICAL_INDEX_PATH: str = ""  # defaults to VECTOR_DB_PATH/lexical_index.sqlite3
+    HYBRID_CANDIDATES: int = 4  # each ranking contributes top_k * HYBRID_CANDIDATES candidates
+    RRF_K: int = 60
+    # Context packing: top_k * CONTEXT_CANDIDATES retrieved chunks are merged with
+    # adjacent ones, deduplicated and diversified with MMR into CONTEXT_MAX_TOKENS
+    CONTEXT_PACKING_ENABLED: bool = True
+    CONTEXT_MAX_TOKENS: int = 1000  # embedding-model tokens; five 256-token chunks are 1280
+    CONTEXT_CANDIDATES: int = 3
+    CONTEXT_MMR_LAMBDA: float = 0.7  # 1 ranks by relevance only, 0 by diversity only
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.95  # cosine similarity above which a chunk is a duplicate
+    # Semantic answer cache: reuse a stored answer for a near-identical question
+    # over the same retrieved chunks (opt-in, can also be enabled per request)
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # minimum cosine similarity between questions
+    ANSWER_CACHE_LOOKBACK: int = 200  # most recent messages of the case to compare against
+    # Batch chat (POST /api/chat/batch)
+    BATCH_CHAT_MAX_QUESTIONS: int = 50
+    BATCH_CHAT_CONCURRENCY: int = 4  # Gemini generations running at once per batch
+    # Chat history pages (GET /api/chat/case/{case_id})
+    CHAT_HISTORY_PAGE_SIZE: int = 50
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 200
+    # Indexing job queue
+    INDEX_WORKERS: int = 2  # workers started with the API (threads with an in-process Chroma), 0 to run them separately
+    INDEX_WORKER_THREADS: int = 0  # torch threads per worker, 0 splits the CPU cores evenly
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 5.0  # seconds, doubled on every retry
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_HEARTBEAT_INTERVAL: float = 30.0  # seconds between lock refreshes of a running job
+    JOB_LOCK_TIMEOUT: int = 300  # seconds without a heartbeat before a running job is considered abandoned
+    # Name of this machine's workers in job locks, stable across restarts (unlike a container's
+    # hostname) so jobs left running by a crashed pool are requeued on the next start; defaults to the hostname
+    WORKER_NAME: str = ""
+    # Index compaction after deletions
+    COMPACTION_DELAY: int = 300  # seconds between a deletion and the compaction it schedules
+    COMPACTION_MIN_DELETED_RATIO: float = 0.1  # only rewrite indexes with at least this share deleted
+    # Prometheus metrics at /metrics; API and index worker processes share
+    # METRICS_MULTIPROC_DIR (defaults to VECTOR_DB_PATH/metrics)
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: str = ""
+    # Add a Server-Timing header with per-stage durations to every response (for debugging)
+    SERVER_TIMING_HEADER: bool = False
     
     class Config:
         env_file = ".env"
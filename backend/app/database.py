@@ -1,10 +1,14 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from fastapi.concurrency import run_in_threadpool
+from typing import AsyncIterator, Callable, TypeVar
 from app.config import settings
 import os
 from pathlib import Path
 
+T = TypeVar("T")
+
 # Ensure database directory exists for SQLite
 if "sqlite" in settings.DATABASE_URL:
     db_path = settings.DATABASE_URL.replace("sqlite:///", "")
@@ -47,12 +51,56 @@ if "sqlite" in settings.DATABASE_URL:
     # Update DATABASE_URL to use absolute path
     settings.DATABASE_URL = f"sqlite:///{db_path}"
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite") and ":memory:" in url:
+        # In-memory databases live in a single connection
+        return {"connect_args": {"check_same_thread": False}}
+    options = {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT
+    }
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+    if url.startswith("sqlite+aiosqlite"):
+        # aiosqlite defaults to opening a connection per session
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    # Negative sizes are in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.close()
+
+def async_database_url(url: str) -> str:
+    """The URL of ``url``'s database with an asyncio driver"""
+    for prefix, async_prefix in (("sqlite:", "sqlite+aiosqlite:"), ("postgresql:", "postgresql+asyncpg:")):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+if settings.DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC_ENABLED:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    
+    _async_url = async_database_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **_engine_options(_async_url))
+    if _async_url.startswith("sqlite"):
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -61,3 +109,53 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db() -> AsyncIterator:
+    """Async session dependency, requires DATABASE_ASYNC_ENABLED"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("The async database engine is disabled (DATABASE_ASYNC_ENABLED)")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def run_with_session(fn: Callable[..., T], *args) -> T:
+    """Call ``fn(db, *args)`` with a new session from an async route.
+    
+    With the async engine ``fn`` runs on the event loop and its queries don't
+    block it; otherwise it runs with a sync session on a worker thread.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args)
+    
+    def run() -> T:
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+    
+    return await run_in_threadpool(run)
+
+def init_db():
+    """Create missing tables and add columns and indexes that were introduced after a table was created"""
+    # Import models so they are registered on Base.metadata
+    from app import models  # noqa: F401
+    
+    Base.metadata.create_all(bind=engine)
+    
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                print(f"Added column {table.name}.{column.name}")
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=conn)
+                    print(f"Added index {index.name}")
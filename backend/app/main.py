@@ -1,6 +1,13 @@
+import time
+
+# Measured first so import regressions in the app and its routes show up in /api/ready
+_import_started = time.perf_counter()
+
+import anyio
+import threading
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
@@ -41,18 +48,32 @@ if not os.path.exists(db_path):
         print(f"Warning: Could not create database file {db_path}: {e}")
 
 # Now import database module (engine will be created with existing file)
-from app.database import SessionLocal, engine, Base
+from app.database import async_engine, init_db
 from app.models import Case, Document, Task, ChatMessage
-from app.routes import cases, documents, chat, templates, tasks
+from app.routes import cases, documents, chat, templates, tasks, search, admin
+from app.services.rag_service import rag_service
+from app.services import metrics
+# After metrics, which points prometheus_client at the multiprocess directory
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.services.uploads import UploadSizeLimitMiddleware
+from app import worker
 
 # Create tables
 try:
-    Base.metadata.create_all(bind=engine)
+    init_db()
 except Exception as e:
     print(f"Warning: Could not create tables: {e}")
 
 app = FastAPI(title="Avukat AI Assistant", version="1.0.0")
 
+startup_timings = {
+    "import_seconds": round(time.perf_counter() - _import_started, 3),
+    "startup_seconds": None,
+    "warmup_seconds": None,
+    "warmup": None,
+    "warmup_error": None
+}
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -62,12 +83,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads before their bodies are spooled to disk
+app.add_middleware(UploadSizeLimitMiddleware, limits=[
+    (r"/api/documents/\d+/import$", settings.IMPORT_MAX_ARCHIVE_MB * 1024 * 1024),
+    (r"/api/documents/", settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+])
+
+# Request counts and latencies per route, outermost so CORS preflights are counted too
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware, timing_header=settings.SERVER_TIMING_HEADER)
+
 # Include routers
 app.include_router(cases.router, prefix="/api/cases", tags=["cases"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(templates.router, prefix="/api/templates", tags=["templates"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+
+def _warmup():
+    started = time.perf_counter()
+    try:
+        startup_timings["warmup"] = rag_service.warmup()
+    except Exception as e:
+        startup_timings["warmup_error"] = str(e)
+        print(f"Warmup failed: {e}")
+    startup_timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"Warmup finished in {startup_timings['warmup_seconds']}s: {startup_timings['warmup']}")
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # Sync routes and run_in_threadpool calls share this limiter
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+
+@app.on_event("startup")
+def start_index_workers():
+    # Metrics of processes from before a restart would otherwise be summed in forever
+    metrics.remove_dead_process_files()
+    if settings.INDEX_WORKERS > 0:
+        worker.start_worker_pool(settings.INDEX_WORKERS)
+
+@app.on_event("startup")
+def start_warmup():
+    # Load models in the background so liveness checks pass right away
+    if settings.WARMUP_ON_STARTUP:
+        threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+    startup_timings["startup_seconds"] = round(time.perf_counter() - _import_started, 3)
+    print(
+        f"API started: imports {startup_timings['import_seconds']}s, "
+        f"startup {startup_timings['startup_seconds']}s"
+    )
+
+@app.on_event("shutdown")
+def stop_index_workers():
+    worker.stop_worker_pool()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
 
 @app.get("/")
 async def root():
@@ -75,8 +150,31 @@ async def root():
 
 @app.get("/api/health")
 async def health():
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy"}
 
+@app.get("/api/ready")
+async def ready():
+    """Readiness: the models and vector stores of every serving index version are loaded"""
+    # Reads the serving versions from the database, off the event loop
+    is_ready = await anyio.to_thread.run_sync(lambda: rag_service.is_ready)
+    body = {
+        "status": "ready" if is_ready else "starting",
+        "timings": {**startup_timings, "load": rag_service.load_timings}
+    }
+    return JSONResponse(status_code=200 if is_ready else 503, content=body)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus metrics of the API and its index workers"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return rag_service.cache_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -12,12 +12,15 @@ class Case(Base):
     client_name = Column(String)
     case_number = Column(String, unique=True, index=True)
     status = Column(String, default="active")  # active, closed, archived
+    index_version = Column(Integer, default=0)  # bumped whenever the case's indexed documents change
+    embedding_version = Column(Integer, nullable=True)  # IndexVersion serving the case, None for version 1
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     documents = relationship("Document", back_populates="case", cascade="all, delete-orphan")
     tasks = relationship("Task", back_populates="case", cascade="all, delete-orphan")
     chat_messages = relationship("ChatMessage", back_populates="case", cascade="all, delete-orphan")
+    import_batches = relationship("ImportBatch", cascade="all, delete-orphan")
 
 class Document(Base):
     __tablename__ = "documents"
@@ -28,11 +31,54 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_type = Column(String)
     file_size = Column(Integer)
+    content_hash = Column(String, index=True)  # SHA-256 of the file contents
+    duplicate_of = Column(Integer, nullable=True)  # document whose vectors were copied
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     is_indexed = Column(Boolean, default=False)
+    index_status = Column(String, default="pending")  # pending, queued, indexing, indexed, failed
+    index_error = Column(Text, nullable=True)
+    index_duration = Column(Float, nullable=True)  # seconds
+    indexed_at = Column(DateTime, nullable=True)
+    import_batch_id = Column(Integer, nullable=True, index=True)  # bulk import the document came in
     
     case = relationship("Case", back_populates="documents")
 
+class IndexVersion(Base):
+    # A generation of the vector index, embedded with one model
+    __tablename__ = "index_versions"
+    
+    version = Column(Integer, primary_key=True)
+    embedding_model = Column(String, nullable=False)
+    max_seq_length = Column(Integer, nullable=False)
+    status = Column(String, default="building")  # building, active, retired, dropped
+    created_at = Column(DateTime, default=datetime.utcnow)
+    activated_at = Column(DateTime, nullable=True)
+
+class ImportBatch(Base):
+    __tablename__ = "import_batches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    case_id = Column(Integer, ForeignKey("cases.id"), nullable=False)
+    source = Column(String)  # archive filename, or "manifest"
+    total_files = Column(Integer, default=0)  # documents created
+    total_bytes = Column(Integer, default=0)
+    skipped = Column(Text)  # JSON list of {"name", "reason"} for entries that were not imported
+    status = Column(String, default="imported")  # extracting (archive queued for a worker), imported, failed
+    error = Column(Text, nullable=True)  # why an archive could not be imported
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String, primary_key=True)  # random hex, also names the partial file
+    case_id = Column(Integer, ForeignKey("cases.id"), nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String)
+    size = Column(Integer, nullable=False)  # announced total size in bytes
+    received = Column(Integer, default=0)  # bytes stored so far, where the next chunk starts
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -55,6 +101,36 @@ class ChatMessage(Base):
     message = Column(Text, nullable=False)
     response = Column(Text, nullable=False)
     sources = Column(Text)  # JSON string of source documents
+    # Semantic answer cache
+    question_embedding = Column(LargeBinary, nullable=True)  # float32 bytes
+    retrieval_key = Column(String, nullable=True)  # hash of the retrieved chunk ids
+    index_version = Column(Integer, nullable=True)  # case index version the answer was based on
+    cached = Column(Boolean, default=False)  # answer was reused from an earlier message
     created_at = Column(DateTime, default=datetime.utcnow)
     
     case = relationship("Case", back_populates="chat_messages")
+    
+    __table_args__ = (
+        # Keyset pagination of a case's chat history
+        Index("ix_chat_messages_case_created", "case_id", "created_at", "id"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, default="index")
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    case_id = Column(Integer, nullable=True)
+    document_id = Column(Integer, nullable=True, index=True)
+    payload = Column(Text)  # JSON string of job arguments
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    duration = Column(Float, nullable=True)  # seconds of the last attempt
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,359 @@
+"""Re-embed every case into a new index version and switch over case by case.
+
+    cd backend && python -m app.reembed --model intfloat/multilingual-e5-large --workers 4
+
+The new version's collections (``case_{id}__v{n}``) are built from the chunks
+already in the index, in parallel worker processes, while the API keeps
+answering from the version each case is on. As soon as a case's copy has
+caught up with its documents the case is switched to it in one update, and
+its collection in the previous version is deleted. Once every case has moved,
+the new version becomes the one new cases are indexed into and the previous
+version, including its cross-case index, is dropped.
+
+An interrupted run resumes when started again with the same model: switched
+cases are skipped and chunks already embedded are kept.
+
+With the NumPy store or a Chroma server (CHROMA_SERVER_HOST), each worker
+process migrates whole cases. An in-process Chroma store must only be
+written by one process, so then this process migrates the cases one after
+the other and the workers only embed. The API opens the same store, so it has
+to be stopped for such a rebuild; use a Chroma server to rebuild while it runs.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.models import Case, Document, IndexVersion
+from app.services import index_versions
+
+_progress = None
+
+
+def _init_worker(threads: int, progress):
+    global _progress
+    # Let the parent decide when to stop; Ctrl+C would otherwise interrupt a case mid-write
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        os.environ["MKL_NUM_THREADS"] = str(threads)
+    _progress = progress
+
+
+def _report(processed: int, embedded: int):
+    if _progress is not None:
+        _progress.put((processed, embedded))
+
+
+def embed_texts(texts: List[str], version: int) -> List[List[float]]:
+    from app.services.rag_service import rag_service
+
+    return rag_service.embed_texts(texts, version)
+
+
+def copy_chunks(
+    case_id: int,
+    source: int,
+    target: int,
+    batch_size: int,
+    document_ids: Optional[Set[int]] = None,
+    embedder: Optional[Executor] = None,
+    ahead: int = 1
+) -> int:
+    """Embed a case's chunks from version ``source`` into ``target`` with the target's model.
+
+    Chunk ids, texts and metadata are kept, so the lexical index stays valid.
+    Chunks the target already holds are skipped. With ``embedder``, batches
+    are embedded in its processes, up to ``ahead`` batches in flight, and
+    written from this one. Returns the number embedded.
+    """
+    from app.services.rag_service import rag_service
+
+    source_store, target_store = rag_service.store(source), rag_service.store(target)
+    embedded = 0
+    # (ids, texts, metadatas, embeddings or their future), in source order
+    pending = deque()
+
+    def write():
+        ids, texts, metadatas, embeddings = pending.popleft()
+        if embedder is not None:
+            embeddings = embeddings.result()
+        target_store.upsert(case_id, ids, embeddings, texts, metadatas)
+
+    for ids, _, documents, metadatas in source_store.iter_case(case_id, batch_size):
+        existing = set(target_store.get(case_id, ids)[0])
+        keep = [
+            i for i, chunk_id in enumerate(ids)
+            if chunk_id not in existing and (document_ids is None or metadatas[i]["document_id"] in document_ids)
+        ]
+        if keep:
+            texts = [documents[i] for i in keep]
+            embeddings = (
+                embed_texts(texts, target) if embedder is None else embedder.submit(embed_texts, texts, target)
+            )
+            pending.append(([ids[i] for i in keep], texts, [metadatas[i] for i in keep], embeddings))
+            while len(pending) > (ahead if embedder is not None else 0):
+                write()
+            embedded += len(keep)
+        _report(len(ids) if document_ids is None else 0, len(keep))
+    while pending:
+        write()
+    return embedded
+
+
+def sync_case(
+    db: Session, case_id: int, source: int, target: int, batch_size: int, embedder: Optional[Executor] = None
+) -> int:
+    """Bring the target version in line with documents indexed or deleted since the copy.
+
+    A document is copied again when its chunk count differs between the
+    versions, and removed from the target when it is no longer indexed.
+    Returns the number of documents changed.
+    """
+    from app.services.rag_service import rag_service
+
+    # End the read transaction, so this sees the latest indexing jobs
+    db.commit()
+    indexed = {
+        document_id for document_id, in
+        db.query(Document.id).filter(Document.case_id == case_id, Document.is_indexed.is_(True))
+    }
+    source_store, target_store = rag_service.store(source), rag_service.store(target)
+    source_counts = source_store.document_counts(case_id)
+    target_counts = target_store.document_counts(case_id)
+    stale = {
+        document_id for document_id, count in target_counts.items()
+        if document_id not in indexed or count != source_counts.get(document_id)
+    }
+    for document_id in stale:
+        target_store.delete_document(case_id, document_id)
+    missing = {
+        document_id for document_id in source_counts
+        if document_id in indexed and (document_id in stale or document_id not in target_counts)
+    }
+    if missing:
+        copy_chunks(case_id, source, target, batch_size, missing, embedder=embedder)
+    return len(stale | missing)
+
+
+def migrate_case(
+    case_id: int, target: int, batch_size: int, embedder: Optional[Executor] = None, ahead: int = 1
+) -> Tuple[int, int]:
+    """Copy one case into ``target``, switch it over and delete it from its previous version.
+
+    ``embedder`` and ``ahead`` are passed to ``copy_chunks``. Returns
+    (previous version, chunks embedded).
+    """
+    from app.services.rag_service import rag_service
+
+    db = SessionLocal()
+    try:
+        source = index_versions.case_version(db, case_id)
+        if source == target:
+            return source, 0
+        embedded = copy_chunks(case_id, source, target, batch_size, embedder=embedder, ahead=ahead)
+        # Documents indexed into the serving version meanwhile
+        while sync_case(db, case_id, source, target, batch_size, embedder):
+            pass
+        index_versions.switch_case(db, case_id, target)
+        # Indexing jobs that were writing to the previous version retry into this one;
+        # pick up those that finished just before the switch
+        sync_case(db, case_id, source, target, batch_size, embedder)
+        rag_service.vector_store.versioned(source, global_index=False).delete_case(case_id)
+        return source, embedded
+    finally:
+        db.close()
+
+
+def _pending_cases(db: Session, target: int, case_ids: Optional[List[int]]) -> List[int]:
+    query = db.query(Case.id).filter(or_(Case.embedding_version.is_(None), Case.embedding_version != target))
+    if case_ids:
+        query = query.filter(Case.id.in_(case_ids))
+    return [case_id for case_id, in query.order_by(Case.id)]
+
+
+def _chunk_counts(case_versions: Dict[int, int]) -> int:
+    from app.services.rag_service import rag_service
+
+    return sum(
+        sum(rag_service.store(version).document_counts(case_id).values())
+        for case_id, version in case_versions.items()
+    )
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def run_cases(db: Session, case_ids: List[int], target: int, args) -> bool:
+    """Migrate cases in parallel, printing progress; returns whether all of them succeeded.
+
+    If the vector store may only be written by one process, cases are
+    migrated here one at a time and only their embedding is parallel.
+    """
+    global _progress
+    from app.services.rag_service import rag_service
+
+    case_versions = {case_id: index_versions.case_version(db, case_id) for case_id in case_ids}
+    total_chunks = _chunk_counts(case_versions)
+    print(f"Re-embedding {len(case_ids)} cases ({total_chunks} chunks) into index version {target}")
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    # Spawn rather than fork so workers never inherit torch or SQLite state
+    context = multiprocessing.get_context("spawn")
+    progress = context.Queue()
+    processed = embedded = done = failed = 0
+    started = last_report = time.perf_counter()
+
+    def drain():
+        nonlocal processed, embedded
+        while True:
+            try:
+                chunks, new_chunks = progress.get_nowait()
+            except queue.Empty:
+                return
+            processed += chunks
+            embedded += new_chunks
+
+    def report():
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed > 0 else 0
+        eta = _format_seconds((total_chunks - processed) / rate) if rate > 0 else "?"
+        print(
+            f"cases {done}/{len(case_ids)}, chunks {processed}/{total_chunks} ({embedded} embedded), "
+            f"{embedded / elapsed if elapsed > 0 else 0:.1f} chunks/s, ETA {eta}"
+        )
+
+    if not rag_service.vector_store.multiprocess_safe:
+        print(
+            f"The vector store can only be written by one process: migrating cases here, embedding in "
+            f"{args.workers} workers. The API must not be running meanwhile"
+        )
+        _progress = progress
+        embedder = ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=context, initializer=_init_worker, initargs=(threads, None)
+        )
+        try:
+            for case_id in case_ids:
+                try:
+                    migrate_case(case_id, target, args.batch_size, embedder=embedder, ahead=args.workers)
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    print(f"Case {case_id} failed: {type(error).__name__}: {error}")
+                drain()
+                if time.perf_counter() - last_report >= args.report_seconds:
+                    report()
+                    last_report = time.perf_counter()
+        except KeyboardInterrupt:
+            print("Interrupted; run the command again to resume")
+            embedder.shutdown(wait=False, cancel_futures=True)
+            raise SystemExit(1)
+        embedder.shutdown()
+        drain()
+        report()
+        return failed == 0
+
+    executor = ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=context, initializer=_init_worker, initargs=(threads, progress)
+    )
+    futures = {executor.submit(migrate_case, case_id, target, args.batch_size): case_id for case_id in case_ids}
+    try:
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            drain()
+            for future in finished:
+                error = future.exception()
+                if error is not None:
+                    failed += 1
+                    print(f"Case {futures[future]} failed: {type(error).__name__}: {error}")
+                else:
+                    done += 1
+            if time.perf_counter() - last_report >= args.report_seconds:
+                report()
+                last_report = time.perf_counter()
+    except KeyboardInterrupt:
+        print("Interrupted, waiting for the running cases to finish; run the command again to resume")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise SystemExit(1)
+    executor.shutdown()
+    drain()
+    report()
+    return failed == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="Sentence-transformers model of the new version")
+    parser.add_argument("--max-seq-length", type=int, default=settings.EMBEDDING_MAX_SEQ_LENGTH)
+    parser.add_argument("--workers", type=int, default=max(1, settings.INDEX_WORKERS))
+    parser.add_argument("--threads", type=int, default=settings.INDEX_WORKER_THREADS,
+                        help="Torch threads per worker; by default the CPUs are split between the workers")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks embedded at a time")
+    parser.add_argument("--cases", type=int, nargs="+",
+                        help="Only move these cases; the version stays in building until all cases are on it")
+    parser.add_argument("--report-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        version = index_versions.building_version(db)
+        if version is None:
+            active = index_versions.get_version(db, index_versions.default_version(db))
+            if (active.embedding_model, active.max_seq_length) == (args.model, args.max_seq_length):
+                print(f"Index version {active.version} already uses {args.model}")
+                return
+            version = index_versions.create_version(db, args.model, args.max_seq_length)
+            print(f"Building index version {version.version} with {args.model}")
+        elif (version.embedding_model, version.max_seq_length) != (args.model, args.max_seq_length):
+            raise SystemExit(
+                f"Index version {version.version} is being built with {version.embedding_model} "
+                f"(max sequence length {version.max_seq_length}); run again with that model to finish it"
+            )
+        else:
+            print(f"Resuming index version {version.version} with {args.model}")
+        target = version.version
+
+        activated = False
+        while True:
+            # Loops for cases created while the previous ones were moving
+            case_ids = _pending_cases(db, target, args.cases)
+            if case_ids:
+                if not run_cases(db, case_ids, target, args):
+                    raise SystemExit("Some cases failed; run the command again to retry them")
+                continue
+            if args.cases or activated:
+                break
+            replaced = index_versions.activate_version(db, target)
+            activated = True
+            print(f"Index version {target} is now active, replacing {replaced}")
+
+        if not activated:
+            return
+        from app.services.rag_service import rag_service
+
+        live = set(index_versions.live_versions(db))
+        retired = db.query(IndexVersion.version).filter(IndexVersion.status == index_versions.RETIRED).all()
+        for previous, in retired:
+            if previous not in live:
+                rag_service.store(previous).drop()
+                index_versions.mark_dropped(db, previous)
+                print(f"Dropped index version {previous}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.schemas import JobResponse
+from app.services import job_queue
+from app.services.rag_service import rag_service
+
+router = APIRouter()
+
+@router.get("/index")
+def index_report(db: Session = Depends(get_db)):
+    """Per-case vector counts, orphaned vectors, tombstones and on-disk size of the indexes"""
+    return rag_service.index_report(db)
+
+@router.post("/index/compact", response_model=JobResponse)
+def compact_index(db: Session = Depends(get_db)):
+    """Queue an immediate compaction: purge orphaned vectors and reclaim deleted ones"""
+    return job_queue.enqueue_job(db, "compact_index")
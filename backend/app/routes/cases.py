@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
+import os
 from app.database import get_db
 from app.models import Case
 from app.schemas import CaseCreate, CaseResponse
+from app.services import text_store
+from app.services.index_versions import default_version
+from app.services.job_queue import schedule_compaction
+from app.services.rag_service import rag_service
 
 router = APIRouter()
 
 @router.post("/", response_model=CaseResponse)
 def create_case(case: CaseCreate, db: Session = Depends(get_db)):
-    db_case = Case(**case.dict())
+    db_case = Case(**case.dict(), embedding_version=default_version(db))
     db.add(db_case)
     db.commit()
     db.refresh(db_case)
@@ -46,6 +51,19 @@ def delete_case(case_id: int, db: Session = Depends(get_db)):
     if not db_case:
         raise HTTPException(status_code=404, detail="Case not found")
     
+    # Delete the documents' files and their extracted text
+    for document in db_case.documents:
+        if os.path.exists(document.file_path):
+            os.remove(document.file_path)
+        text_store.delete_store(document.file_path)
+    
+    # Drop the case's index; if this fails, compaction purges it later as orphans
+    try:
+        rag_service.delete_case_index(case_id)
+    except Exception as e:
+        print(f"Warning: Could not delete index of case {case_id}: {e}")
+    
     db.delete(db_case)
     db.commit()
+    schedule_compaction(db)
     return {"message": "Case deleted successfully"}
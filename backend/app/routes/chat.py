@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from app.database import get_db
+from typing import Dict, List, Optional, Tuple
+from app.database import get_db, run_with_session, SessionLocal
 from app.models import Case, ChatMessage
-from app.schemas import ChatRequest, ChatResponse
+from app.schemas import (
+    ChatRequest, ChatResponse, BatchChatRequest, BatchChatAnswer, BatchChatResponse,
+    ChatHistoryMessage, ChatHistoryPage, KVKK_WARNING
+)
 from app.services.rag_service import rag_service
+from app.config import settings
+from datetime import datetime
+import asyncio
+import base64
 import json
 
 router = APIRouter()
@@ -17,21 +28,27 @@ def chat(request: ChatRequest, db: Session = Depends(get_db)):
     
     # Query RAG service
     try:
-        result = rag_service.query(request.case_id, request.message)
+        use_cache = settings.ANSWER_CACHE_ENABLED if request.use_cache is None else request.use_cache
+        result = rag_service.query(request.case_id, request.message, db=db, use_cache=use_cache)
         
         # Save chat message
         chat_message = ChatMessage(
             case_id=request.case_id,
             message=request.message,
             response=result["response"],
-            sources=json.dumps(result["sources"])
+            sources=json.dumps(result["sources"]),
+            cached=result.get("cached", False),
+            **result.get("answer_cache", {})
         )
         db.add(chat_message)
         db.commit()
         
         return ChatResponse(
+            id=chat_message.id,
+            created_at=chat_message.created_at,
             response=result["response"],
-            sources=result["sources"]
+            sources=result["sources"],
+            cached=result.get("cached", False)
         )
     except ValueError as e:
         # No documents indexed
@@ -42,16 +59,249 @@ def chat(request: ChatRequest, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
-@router.get("/case/{case_id}")
-def get_chat_history(case_id: int, db: Session = Depends(get_db)):
-    messages = db.query(ChatMessage).filter(ChatMessage.case_id == case_id).order_by(ChatMessage.created_at).all()
-    return [
-        {
-            "id": msg.id,
-            "message": msg.message,
-            "response": msg.response,
-            "sources": json.loads(msg.sources) if msg.sources else [],
-            "created_at": msg.created_at.isoformat()
-        }
-        for msg in messages
-    ]
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _prepare_stream(request: ChatRequest, use_cache: bool) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        case = db.query(Case).filter(Case.id == request.case_id).first()
+        if not case:
+            return None
+        return rag_service.prepare_query(request.case_id, request.message, db=db, use_cache=use_cache)
+    finally:
+        db.close()
+
+def _save_chat_message(db: Session, request: ChatRequest, response: str, result: Dict) -> int:
+    chat_message = ChatMessage(
+        case_id=request.case_id,
+        message=request.message,
+        response=response,
+        sources=json.dumps(result["sources"]),
+        cached=result.get("cached", False),
+        **result.get("answer_cache", {})
+    )
+    db.add(chat_message)
+    db.commit()
+    return chat_message.id
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream a chat answer as Server-Sent Events.
+    
+    Emits a ``sources`` event once retrieval is done, ``token`` events while
+    Gemini generates, and a final ``done`` event after the message is saved.
+    Generation runs on the event loop, so no worker thread is held while
+    waiting for Gemini.
+    """
+    if not rag_service.gemini_model:
+        raise HTTPException(status_code=503, detail="Google API key not configured")
+    
+    use_cache = settings.ANSWER_CACHE_ENABLED if request.use_cache is None else request.use_cache
+    # Retrieval is CPU/disk bound, keep it off the event loop
+    result = await run_in_threadpool(_prepare_stream, request, use_cache)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    async def events():
+        yield _sse("sources", {"sources": result["sources"], "cached": result["cached"]})
+        
+        if result["response"] is not None:
+            parts = [result["response"]]
+            yield _sse("token", {"text": result["response"]})
+        else:
+            parts = []
+            try:
+                async for text in rag_service.stream_answer(result["prompt"]):
+                    parts.append(text)
+                    yield _sse("token", {"text": text})
+            except Exception as e:
+                yield _sse("error", {"detail": f"Error processing chat: {str(e)}"})
+                return
+        
+        message_id = await run_with_session(_save_chat_message, request, "".join(parts), result)
+        yield _sse("done", {"message_id": message_id, "kvkk_warning": KVKK_WARNING})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies (nginx) from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _prepare_batch(request: BatchChatRequest, use_cache: bool) -> Optional[List[Dict]]:
+    db = SessionLocal()
+    try:
+        case = db.query(Case).filter(Case.id == request.case_id).first()
+        if not case:
+            return None
+        return rag_service.prepare_queries(request.case_id, request.questions, db=db, use_cache=use_cache)
+    finally:
+        db.close()
+
+def _save_batch(
+    db: Session,
+    request: BatchChatRequest,
+    answers: List[Tuple[Optional[str], Optional[str]]],
+    results: List[Dict]
+) -> List[Optional[int]]:
+    """Save the answered questions in one transaction, returning their message ids"""
+    messages = []
+    for question, (response, error), result in zip(request.questions, answers, results):
+        if error is not None:
+            messages.append(None)
+            continue
+        chat_message = ChatMessage(
+            case_id=request.case_id,
+            message=question,
+            response=response,
+            sources=json.dumps(result["sources"]),
+            cached=result.get("cached", False),
+            **result.get("answer_cache", {})
+        )
+        db.add(chat_message)
+        messages.append(chat_message)
+    db.commit()
+    return [message.id if message is not None else None for message in messages]
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest):
+    """Answer several questions about a case at once.
+    
+    All questions are embedded in one call and searched with one vector
+    store lookup; the Gemini generations then run concurrently, at most
+    BATCH_CHAT_CONCURRENCY at a time. A failed generation is reported on its
+    question without failing the others.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(request.questions) > settings.BATCH_CHAT_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_CHAT_MAX_QUESTIONS} questions can be asked at once"
+        )
+    if not rag_service.gemini_model:
+        raise HTTPException(status_code=503, detail="Google API key not configured")
+    
+    use_cache = settings.ANSWER_CACHE_ENABLED if request.use_cache is None else request.use_cache
+    results = await run_in_threadpool(_prepare_batch, request, use_cache)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    semaphore = asyncio.Semaphore(settings.BATCH_CHAT_CONCURRENCY)
+    
+    async def answer(result: Dict) -> Tuple[Optional[str], Optional[str]]:
+        if result["response"] is not None:
+            return result["response"], None
+        async with semaphore:
+            try:
+                return await rag_service.generate_answer(result["prompt"]), None
+            except Exception as e:
+                return None, f"Error processing chat: {str(e)}"
+    
+    answers = await asyncio.gather(*(answer(result) for result in results))
+    message_ids = await run_with_session(_save_batch, request, answers, results)
+    
+    return BatchChatResponse(answers=[
+        BatchChatAnswer(
+            question=question,
+            response=response,
+            sources=result["sources"],
+            cached=result.get("cached", False),
+            message_id=message_id,
+            error=error
+        )
+        for question, (response, error), result, message_id in zip(request.questions, answers, results, message_ids)
+    ])
+
+def _encode_cursor(created_at: datetime, message_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{message_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _encode_since_cursor(message_id: int) -> str:
+    return base64.urlsafe_b64encode(str(message_id).encode()).decode()
+
+def _decode_since_cursor(cursor: str) -> int:
+    try:
+        # Earlier latest_cursors were "created_at|id"
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")[2])
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/case/{case_id}", response_model=ChatHistoryPage)
+async def get_chat_history(
+    case_id: int,
+    limit: int = Query(settings.CHAT_HISTORY_PAGE_SIZE, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """A page of a case's chat history, oldest message first.
+    
+    Without a cursor the latest ``limit`` messages are returned; ``before``
+    (a ``next_cursor``) pages back to older ones and ``since`` (a
+    ``latest_cursor``) returns the messages saved after it, for polling. A
+    full ``since`` page means there may be more. Pages are read from the
+    (case_id, created_at, id) index, so their cost doesn't grow with the
+    length of the history. Polling follows message ids, which unlike
+    ``created_at`` (set by whichever process saved the message) only grow.
+    """
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since, not both")
+    return await run_with_session(_history_page, case_id, limit, before, since)
+
+def _history_page(
+    db: Session,
+    case_id: int,
+    limit: int,
+    before: Optional[str],
+    since: Optional[str]
+) -> ChatHistoryPage:
+    # Only the displayed columns, not the answer cache's question embeddings
+    query = db.query(
+        ChatMessage.id,
+        ChatMessage.message,
+        ChatMessage.response,
+        ChatMessage.sources,
+        ChatMessage.cached,
+        ChatMessage.created_at
+    ).filter(ChatMessage.case_id == case_id)
+    position = tuple_(ChatMessage.created_at, ChatMessage.id)
+    
+    next_cursor = None
+    if since:
+        rows = query.filter(ChatMessage.id > _decode_since_cursor(since)).order_by(ChatMessage.id).limit(limit).all()
+    else:
+        if before:
+            query = query.filter(position < tuple_(*_decode_cursor(before)))
+        rows = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+        rows.reverse()
+    
+    if rows and not before:
+        latest_cursor = _encode_since_cursor(max(row.id for row in rows))
+    else:
+        latest_cursor = since
+    
+    return ChatHistoryPage(
+        messages=[
+            ChatHistoryMessage(
+                id=row.id,
+                message=row.message,
+                response=row.response,
+                sources=json.loads(row.sources) if row.sources else [],
+                cached=bool(row.cached),
+                created_at=row.created_at
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+        latest_cursor=latest_cursor
+    )
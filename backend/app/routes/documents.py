@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta
+import json
 import os
-import shutil
+import uuid
 from pathlib import Path
-from app.database import get_db, SessionLocal
-from app.models import Document, Case
-from app.schemas import DocumentResponse
+from app.database import get_db, run_with_session
+from app.models import Document, Case, Job, UploadSession, ImportBatch
+from app.schemas import (
+    DocumentResponse, JobResponse, UploadSessionCreate, UploadSessionResponse,
+    ImportManifest, ImportBatchResponse
+)
 from app.config import settings
+from app.services import bulk_import, text_store, uploads
+from app.services.job_queue import enqueue_job, schedule_compaction
 from app.services.rag_service import rag_service
+from app.services.query_cache import bump_case_index_version
 
 router = APIRouter()
 
@@ -16,69 +24,298 @@ router = APIRouter()
 upload_dir = Path(settings.UPLOAD_DIR)
 upload_dir.mkdir(exist_ok=True)
 
-@router.post("/{case_id}", response_model=DocumentResponse)
-async def upload_document(
-    case_id: int,
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
-    # Check if case exists
-    case = db.query(Case).filter(Case.id == case_id).first()
-    if not case:
+def max_upload_bytes() -> int:
+    return settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+
+def _check_case(db: Session, case_id: int):
+    if not db.query(Case.id).filter(Case.id == case_id).first():
         raise HTTPException(status_code=404, detail="Case not found")
+
+# The body is parsed by the route, so the form is described for the API docs here
+_UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"]
+        }}}
+    }
+}
+
+@router.post("/{case_id}", response_model=DocumentResponse, openapi_extra=_UPLOAD_FORM)
+async def upload_document(case_id: int, request: Request):
+    """Upload a file as a multipart ``file`` field.
     
-    # Create case-specific directory
+    The file is parsed from the request stream and written to a temporary
+    path as it arrives, hashing it on the way, without being spooled first.
+    """
+    await run_with_session(_check_case, case_id)
+    temp_path = case_upload_dir(case_id) / f".{uuid.uuid4().hex}.part"
+    filename, content_type, content_hash, file_size = await uploads.save_multipart_file(
+        request, "file", temp_path, max_upload_bytes()
+    )
+    return await run_with_session(
+        add_document, case_id, filename, content_type, temp_path, content_hash, file_size
+    )
+
+def case_upload_dir(case_id: int) -> Path:
     case_dir = upload_dir / f"case_{case_id}"
     case_dir.mkdir(exist_ok=True)
+    return case_dir
+
+def add_document(
+    db: Session,
+    case_id: int,
+    filename: str,
+    content_type: Optional[str],
+    temp_path: Path,
+    content_hash: str,
+    file_size: int
+) -> DocumentResponse:
+    """Store an uploaded file as a document of the case and queue its indexing"""
+    # Identical content already in this case: keep the existing document
+    existing = (
+        db.query(Document)
+        .filter(Document.case_id == case_id, Document.content_hash == content_hash)
+        .first()
+    )
+    if existing:
+        temp_path.unlink()
+        return DocumentResponse.model_validate(existing).model_copy(update={"is_duplicate": True})
     
-    # Save file
-    file_path = case_dir / file.filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Never overwrite another document's file that happens to share the filename
+    file_path = uploads.unique_file_path(temp_path.parent, filename)
+    os.replace(temp_path, file_path)
     
-    # Get file size
-    file_size = file_path.stat().st_size
+    # Identical content in another case: copy its vectors instead of re-indexing
+    source = (
+        db.query(Document)
+        .filter(Document.content_hash == content_hash, Document.case_id != case_id)
+        .order_by(Document.is_indexed.desc(), Document.id)
+        .first()
+    )
     
-    # Create document record
+    # Create document record and its indexing job in one transaction
     db_document = Document(
         case_id=case_id,
-        filename=file.filename,
+        filename=filename,
         file_path=str(file_path),
-        file_type=file.content_type,
+        file_type=content_type,
         file_size=file_size,
-        is_indexed=False
+        content_hash=content_hash,
+        duplicate_of=source.id if source else None,
+        is_indexed=False,
+        index_status="queued"
     )
     db.add(db_document)
+    db.flush()
+    if source:
+        job = enqueue_job(
+            db, "copy_vectors", case_id=case_id, document_id=db_document.id,
+            payload={"source_document_id": source.id}, commit=False
+        )
+    else:
+        job = enqueue_job(db, "index", case_id=case_id, document_id=db_document.id, commit=False)
     db.commit()
     db.refresh(db_document)
     
-    # Index document in background
-    background_tasks.add_task(
-        index_document_background,
-        case_id,
-        db_document.id,
-        str(file_path),
-        file.filename
+    return DocumentResponse.model_validate(db_document).model_copy(update={"job_id": job.id})
+
+# Resumable uploads: create a session, PUT the file in chunks (resuming from
+# the session's offset after an interruption), then complete it
+
+def _upload_session_response(session: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        upload_id=session.id,
+        case_id=session.case_id,
+        filename=session.filename,
+        size=session.size,
+        offset=session.received,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
     )
+
+def _upload_session_path(session: UploadSession) -> Path:
+    return case_upload_dir(session.case_id) / f".{session.id}.part"
+
+def _get_upload_session(db: Session, upload_id: str) -> UploadSession:
+    session = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+def purge_expired_uploads(db: Session):
+    """Delete resumable uploads that were not continued within UPLOAD_SESSION_TTL_HOURS"""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    for session in db.query(UploadSession).filter(UploadSession.updated_at < cutoff).all():
+        _upload_session_path(session).unlink(missing_ok=True)
+        uploads.discard(session.id)
+        db.delete(session)
+    db.commit()
+
+@router.post("/{case_id}/uploads", response_model=UploadSessionResponse)
+def create_upload(case_id: int, request: UploadSessionCreate, db: Session = Depends(get_db)):
+    """Start a resumable upload of a file of ``request.size`` bytes"""
+    case = db.query(Case).filter(Case.id == case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    if request.size > max_upload_bytes():
+        raise uploads.too_large(max_upload_bytes())
     
-    return db_document
+    purge_expired_uploads(db)
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        case_id=case_id,
+        filename=Path(request.filename).name,
+        content_type=request.content_type,
+        size=request.size,
+        received=0
+    )
+    _upload_session_path(session).touch()
+    db.add(session)
+    db.commit()
+    return _upload_session_response(session)
 
-def index_document_background(case_id: int, document_id: int, file_path: str, filename: str):
-    """Background task to index document"""
-    try:
-        rag_service.index_document(case_id, document_id, file_path, filename)
-        # Update document status
-        db = SessionLocal()
-        try:
-            doc = db.query(Document).filter(Document.id == document_id).first()
-            if doc:
-                doc.is_indexed = True
-                db.commit()
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"Error indexing document {document_id}: {e}")
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+def get_upload(upload_id: str, db: Session = Depends(get_db)):
+    """The offset to resume an interrupted upload from"""
+    return _upload_session_response(_get_upload_session(db, upload_id))
+
+def _load_upload_session(db: Session, upload_id: str) -> UploadSession:
+    session = _get_upload_session(db, upload_id)
+    db.expunge(session)
+    return session
+
+def _record_chunk(db: Session, upload_id: str, offset: int, received: int) -> UploadSession:
+    session = _get_upload_session(db, upload_id)
+    if session.received != offset:
+        raise HTTPException(status_code=409, detail=f"Upload is at offset {session.received}")
+    session.received = received
+    db.commit()
+    db.refresh(session)
+    db.expunge(session)
+    return session
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Append the request body to the upload at ``offset``.
+    
+    ``offset`` must be the upload's current offset; after an interrupted
+    chunk, GET the upload and resend from the offset it reports. The body is
+    written to disk as it arrives, on a worker thread.
+    """
+    session = await run_with_session(_load_upload_session, upload_id)
+    if offset != session.received:
+        raise HTTPException(status_code=409, detail=f"Upload is at offset {session.received}")
+    
+    written = await uploads.append_chunk(
+        upload_id, _upload_session_path(session), offset, request.stream(), session.size
+    )
+    session = await run_with_session(_record_chunk, upload_id, offset, offset + written)
+    return _upload_session_response(session)
+
+@router.post("/uploads/{upload_id}/complete", response_model=DocumentResponse)
+def complete_upload(upload_id: str, db: Session = Depends(get_db)):
+    """Turn a fully received upload into a document and queue its indexing"""
+    session = _get_upload_session(db, upload_id)
+    if session.received != session.size:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload is incomplete: {session.received} of {session.size} bytes received"
+        )
+    case = db.query(Case).filter(Case.id == session.case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    path = _upload_session_path(session)
+    content_hash = uploads.content_hash(upload_id, path, session.size)
+    case_id, filename, content_type, size = session.case_id, session.filename, session.content_type, session.size
+    db.delete(session)
+    document = add_document(db, case_id, filename, content_type, path, content_hash, size)
+    # Duplicates return before committing
+    db.commit()
+    return document
+
+@router.delete("/uploads/{upload_id}")
+def cancel_upload(upload_id: str, db: Session = Depends(get_db)):
+    session = _get_upload_session(db, upload_id)
+    _upload_session_path(session).unlink(missing_ok=True)
+    uploads.discard(upload_id)
+    db.delete(session)
+    db.commit()
+    return {"message": "Upload cancelled"}
+
+# Bulk imports: many documents from a ZIP archive or a server-side directory,
+# indexed by grouped jobs and tracked as one batch
+
+def _import_batch_response(db: Session, batch: ImportBatch, jobs: Optional[int] = None) -> ImportBatchResponse:
+    return ImportBatchResponse(
+        id=batch.id,
+        case_id=batch.case_id,
+        source=batch.source,
+        total_files=batch.total_files,
+        total_bytes=batch.total_bytes,
+        skipped=json.loads(batch.skipped or "[]"),
+        status=batch.status or bulk_import.IMPORT_IMPORTED,
+        error=batch.error,
+        jobs=jobs,
+        created_at=batch.created_at,
+        **bulk_import.import_progress(db, batch)
+    )
+
+def _get_case(db: Session, case_id: int) -> Case:
+    case = db.query(Case).filter(Case.id == case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return case
+
+@router.post("/{case_id}/import", response_model=ImportBatchResponse, openapi_extra=_UPLOAD_FORM)
+async def import_archive(case_id: int, request: Request):
+    """Import every supported file of a ZIP archive, sent as a multipart ``file`` field, into the case.
+    
+    The archive is streamed to the case's upload directory and the batch is
+    returned straight away, with status ``extracting``; a worker then
+    decompresses the entries one at a time and queues their indexing.
+    Unsupported, oversized and duplicate files are skipped and listed.
+    """
+    await run_with_session(_check_case, case_id)
+    archive_path = case_upload_dir(case_id) / f".{uuid.uuid4().hex}.zip"
+    filename, _, _, _ = await uploads.save_multipart_file(
+        request, "file", archive_path, settings.IMPORT_MAX_ARCHIVE_MB * 1024 * 1024
+    )
+    return await run_with_session(_queue_archive_import, case_id, filename, archive_path)
+
+def _queue_archive_import(db: Session, case_id: int, filename: str, archive_path: Path) -> ImportBatchResponse:
+    batch = bulk_import.queue_archive_import(db, case_id, filename, archive_path)
+    return _import_batch_response(db, batch)
+
+@router.post("/{case_id}/import/manifest", response_model=ImportBatchResponse)
+def import_manifest(case_id: int, manifest: ImportManifest, db: Session = Depends(get_db)):
+    """Import files that are already on the server, below IMPORT_ROOT"""
+    if not settings.IMPORT_ROOT:
+        raise HTTPException(status_code=400, detail="Manifest imports are disabled (IMPORT_ROOT is not set)")
+    _get_case(db, case_id)
+    if not manifest.paths and manifest.directory is None:
+        raise HTTPException(status_code=400, detail="Manifest lists no files")
+    # Resolve every path before copying anything, so a bad manifest imports nothing
+    entries = list(bulk_import.iter_manifest_entries(Path(settings.IMPORT_ROOT), manifest.paths, manifest.directory))
+    result = bulk_import.import_entries(db, case_id, "manifest", entries)
+    return _import_batch_response(db, result["batch"], result["jobs"])
+
+@router.get("/imports/{batch_id}", response_model=ImportBatchResponse)
+def get_import(batch_id: int, db: Session = Depends(get_db)):
+    """Progress and throughput of a bulk import"""
+    batch = db.query(ImportBatch).filter(ImportBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return _import_batch_response(db, batch)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @router.get("/case/{case_id}", response_model=List[DocumentResponse])
 def list_documents(case_id: int, db: Session = Depends(get_db)):
@@ -98,10 +335,20 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete file
+    # Delete file and its extracted text
     if os.path.exists(document.file_path):
         os.remove(document.file_path)
+    text_store.delete_store(document.file_path)
+    
+    # Remove its chunks so they stop showing up as sources; if this fails,
+    # compaction purges them later as orphans
+    try:
+        rag_service.delete_document_index(document.case_id, document.id)
+    except Exception as e:
+        print(f"Warning: Could not delete index entries of document {document.id}: {e}")
     
     db.delete(document)
+    bump_case_index_version(db, document.case_id, commit=False)
     db.commit()
+    schedule_compaction(db)
     return {"message": "Document deleted successfully"}
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.config import settings
+from app.database import get_db
+from app.models import Case
+from app.schemas import CaseSearchHit, CaseSearchResponse, JobResponse, SearchHit, SearchResponse
+from app.services import job_queue
+from app.services.rag_service import rag_service
+
+router = APIRouter()
+
+@router.get("/", response_model=SearchResponse)
+def search(
+    q: str = Query(..., min_length=1),
+    top_k: int = Query(10, ge=1, le=100),
+    status: Optional[str] = None,
+    client: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Semantic search over the documents of all cases, optionally filtered by case status or client"""
+    if not settings.CROSS_CASE_SEARCH_ENABLED:
+        raise HTTPException(status_code=400, detail="Cross-case search is disabled")
+    
+    case_ids = None
+    if status or client:
+        cases_query = db.query(Case.id)
+        if status:
+            cases_query = cases_query.filter(Case.status == status)
+        if client:
+            cases_query = cases_query.filter(Case.client_name.ilike(f"%{client}%"))
+        case_ids = [case_id for case_id, in cases_query.all()]
+        if not case_ids:
+            return SearchResponse(query=q, results=[])
+    
+    try:
+        # Extra candidates make up for chunks of deleted cases still in the index
+        ids, texts, metadatas = rag_service.search_cases(q, top_k=top_k * 2, case_ids=case_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+    
+    result_case_ids = {meta.get("case_id") for meta in metadatas}
+    cases = {case.id: case for case in db.query(Case).filter(Case.id.in_(result_case_ids)).all()}
+    results = []
+    for text, meta in zip(texts, metadatas):
+        case = cases.get(meta.get("case_id"))
+        if case is None:
+            continue
+        results.append(SearchHit(
+            case_id=case.id,
+            case_title=case.title,
+            client_name=case.client_name,
+            document_id=meta["document_id"],
+            filename=meta.get("filename", "Unknown"),
+            section=meta.get("section") or None,
+            chunk_index=meta.get("chunk_index"),
+            text=text
+        ))
+    return SearchResponse(query=q, results=results[:top_k])
+
+@router.get("/case/{case_id}", response_model=CaseSearchResponse)
+def search_case(
+    case_id: int,
+    q: str = Query(..., min_length=1),
+    top_k: int = Query(5, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Retrieval only: a case's chunks most relevant to a query, with scores, without generating an answer"""
+    case = db.query(Case).filter(Case.id == case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    try:
+        hits = rag_service.search_case(case_id, q, top_k=top_k) or []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+    
+    return CaseSearchResponse(query=q, case_id=case_id, results=[
+        CaseSearchHit(
+            chunk_id=hit["chunk_id"],
+            document_id=hit["metadata"]["document_id"],
+            filename=hit["metadata"].get("filename", "Unknown"),
+            section=hit["metadata"].get("section") or None,
+            chunk_index=hit["metadata"].get("chunk_index"),
+            text=hit["text"],
+            score=hit["score"]
+        )
+        for hit in hits
+    ])
+
+@router.post("/rebuild", response_model=JobResponse)
+def rebuild_search_index(db: Session = Depends(get_db)):
+    """Queue a job that copies every case's chunks into the cross-case index"""
+    return job_queue.enqueue_job(db, "rebuild_search_index")
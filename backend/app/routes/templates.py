@@ -1,12 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.database import get_db
+from typing import Dict, List, Optional, Tuple
+from app.database import get_db, SessionLocal
 from app.models import Case
-from app.schemas import TemplateRequest, TemplateResponse
+from app.schemas import (
+    TemplateRequest, TemplateResponse, TemplateBatchRequest, TemplateBatchResponse, TemplateDraft
+)
 from app.services.rag_service import rag_service
+import asyncio
 
 router = APIRouter()
 
+TEMPLATE_TYPES = ["dilekce", "sozlesme", "tutanak"]
+
+def _check_template_types(template_types: List[str]):
+    invalid = [template_type for template_type in template_types if template_type.lower() not in TEMPLATE_TYPES]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid template type. Must be one of: {', '.join(TEMPLATE_TYPES)}"
+        )
+
 @router.post("/", response_model=TemplateResponse)
 def generate_template(request: TemplateRequest, db: Session = Depends(get_db)):
     # Check if case exists
@@ -15,12 +30,7 @@ def generate_template(request: TemplateRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Case not found")
     
     # Validate template type
-    valid_types = ["dilekce", "sozlesme", "tutanak"]
-    if request.template_type.lower() not in valid_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid template type. Must be one of: {', '.join(valid_types)}"
-        )
+    _check_template_types([request.template_type])
     
     try:
         result = rag_service.generate_template(
@@ -35,3 +45,51 @@ def generate_template(request: TemplateRequest, db: Session = Depends(get_db)):
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating template: {str(e)}")
+
+def _prepare_templates(request: TemplateBatchRequest, template_types: List[str]) -> Optional[Dict]:
+    db = SessionLocal()
+    try:
+        case = db.query(Case).filter(Case.id == request.case_id).first()
+        if not case:
+            return None
+        return rag_service.prepare_templates(request.case_id, template_types, db, request.context)
+    finally:
+        db.close()
+
+@router.post("/batch", response_model=TemplateBatchResponse)
+async def generate_templates(request: TemplateBatchRequest):
+    """Generate several template types for a case at once.
+    
+    The documents are searched once for the shared context and the drafts
+    are generated concurrently. A failed generation is reported on its
+    draft without failing the others.
+    """
+    # Each type once, in the order asked for
+    template_types = list(dict.fromkeys(template_type.lower() for template_type in request.template_types))
+    if not template_types:
+        raise HTTPException(status_code=400, detail="No template types given")
+    _check_template_types(template_types)
+    if not rag_service.gemini_model:
+        raise HTTPException(status_code=503, detail="Google API key not configured")
+    
+    try:
+        prepared = await run_in_threadpool(_prepare_templates, request, template_types)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating template: {str(e)}")
+    if prepared is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    async def draft(template_type: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return await rag_service.generate_template_draft(prepared["prompts"][template_type]), None
+        except Exception as e:
+            return None, f"Error generating template: {str(e)}"
+    
+    drafts = await asyncio.gather(*(draft(template_type) for template_type in template_types))
+    return TemplateBatchResponse(
+        drafts=[
+            TemplateDraft(template_type=template_type, draft=text, error=error)
+            for template_type, (text, error) in zip(template_types, drafts)
+        ],
+        sources=prepared["sources"]
+    )
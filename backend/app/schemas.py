@@ -29,8 +29,79 @@ class DocumentResponse(DocumentBase):
     case_id: int
     file_path: str
     file_size: Optional[int] = None
+    content_hash: Optional[str] = None
+    duplicate_of: Optional[int] = None
     uploaded_at: datetime
     is_indexed: bool
+    index_status: Optional[str] = None
+    index_error: Optional[str] = None
+    index_duration: Optional[float] = None
+    indexed_at: Optional[datetime] = None
+    job_id: Optional[int] = None
+    is_duplicate: bool = False
+    
+    class Config:
+        from_attributes = True
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = None
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    case_id: int
+    filename: str
+    size: int
+    offset: int  # bytes received so far; the next chunk starts here
+    chunk_size: int
+
+class ImportManifest(BaseModel):
+    # Relative to IMPORT_ROOT
+    paths: List[str] = []
+    directory: Optional[str] = None  # imported recursively
+
+class ImportSkipped(BaseModel):
+    name: str
+    reason: str  # unsupported, too_large, unreadable, duplicate
+
+class ImportBatchResponse(BaseModel):
+    id: int
+    case_id: int
+    source: Optional[str] = None
+    total_files: int
+    total_bytes: int
+    skipped: List[ImportSkipped] = []
+    status: str = "imported"  # extracting (a worker is unpacking the archive), imported, failed
+    error: Optional[str] = None
+    jobs: Optional[int] = None  # indexing jobs queued, only when a manifest import is created
+    # Progress of the whole batch
+    queued: int = 0
+    indexing: int = 0
+    indexed: int = 0
+    failed: int = 0
+    indexed_bytes: int = 0
+    elapsed_seconds: float = 0.0
+    documents_per_sec: float = 0.0
+    mb_per_sec: float = 0.0
+    eta_seconds: Optional[float] = None
+    done: bool = False
+    created_at: datetime
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str
+    case_id: Optional[int] = None
+    document_id: Optional[int] = None
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    duration: Optional[float] = None
+    run_after: Optional[datetime] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -70,14 +141,78 @@ class TaskResponse(TaskBase):
     class Config:
         from_attributes = True
 
+KVKK_WARNING = "Bu yanıt yalnızca yüklenen dokümanlara dayanmaktadır. Kişisel verilerin korunmasına ilişkin KVKK mevzuatına uygun hareket edilmesi gerekmektedir."
+
 class ChatRequest(BaseModel):
     case_id: int
     message: str
+    use_cache: Optional[bool] = None  # defaults to ANSWER_CACHE_ENABLED
 
 class ChatResponse(BaseModel):
+    id: Optional[int] = None  # the saved chat message; None if the answer was not saved
+    created_at: Optional[datetime] = None
     response: str
     sources: List[str]
-    kvkk_warning: str = "Bu yanıt yalnızca yüklenen dokümanlara dayanmaktadır. Kişisel verilerin korunmasına ilişkin KVKK mevzuatına uygun hareket edilmesi gerekmektedir."
+    cached: bool = False
+    kvkk_warning: str = KVKK_WARNING
+
+class BatchChatRequest(BaseModel):
+    case_id: int
+    questions: List[str]
+    use_cache: Optional[bool] = None  # defaults to ANSWER_CACHE_ENABLED
+
+class BatchChatAnswer(BaseModel):
+    question: str
+    response: Optional[str] = None
+    sources: List[str]
+    cached: bool = False
+    message_id: Optional[int] = None
+    error: Optional[str] = None  # generation failed, the question was not saved
+
+class BatchChatResponse(BaseModel):
+    answers: List[BatchChatAnswer]
+    kvkk_warning: str = KVKK_WARNING
+
+class ChatHistoryMessage(BaseModel):
+    id: int
+    message: str
+    response: str
+    sources: List[str]  # source filenames, as shown under the answer
+    cached: bool = False
+    created_at: datetime
+
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatHistoryMessage]  # oldest first
+    next_cursor: Optional[str] = None  # pass as ``before`` for older messages, None if there are none
+    latest_cursor: Optional[str] = None  # pass as ``since`` to poll for newer messages
+
+class SearchHit(BaseModel):
+    case_id: int
+    case_title: str
+    client_name: Optional[str] = None
+    document_id: int
+    filename: str
+    section: Optional[str] = None
+    chunk_index: Optional[int] = None
+    text: str
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchHit]
+
+class CaseSearchHit(BaseModel):
+    chunk_id: str
+    document_id: int
+    filename: str
+    section: Optional[str] = None
+    chunk_index: Optional[int] = None
+    text: str
+    score: Optional[float] = None  # cosine similarity of the query and the chunk; None if only BM25 found it
+
+class CaseSearchResponse(BaseModel):
+    query: str
+    case_id: int
+    results: List[CaseSearchHit]  # in retrieval order
 
 class TemplateRequest(BaseModel):
     case_id: int
@@ -87,3 +222,17 @@ class TemplateRequest(BaseModel):
 class TemplateResponse(BaseModel):
     draft: str
     sources: List[str]
+
+class TemplateBatchRequest(BaseModel):
+    case_id: int
+    template_types: List[str]  # dilekce, sozlesme, tutanak
+    context: Optional[str] = None
+
+class TemplateDraft(BaseModel):
+    template_type: str
+    draft: Optional[str] = None
+    error: Optional[str] = None  # generation failed
+
+class TemplateBatchResponse(BaseModel):
+    drafts: List[TemplateDraft]
+    sources: List[str]
@@ -0,0 +1,295 @@
+"""Bulk import of many documents into a case.
+
+Entries of a ZIP archive (or files listed in a manifest) are streamed to the
+case's upload directory, hashed on the way, and become ``Document`` rows in
+one transaction. An uploaded archive is only saved by the request and
+unpacked by an ``import_archive`` job. Small files are grouped into ``index_documents`` jobs so the
+worker processes index them in parallel, each embedding the chunks of several
+files together; large files get a job of their own.
+"""
+import json
+import mimetypes
+import os
+import uuid
+import zipfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Document, ImportBatch
+from app.services import uploads
+from app.services.job_queue import enqueue_job
+
+IMPORT_EXTRACTING = "extracting"
+IMPORT_IMPORTED = "imported"
+IMPORT_FAILED = "failed"
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".doc", ".txt"}
+# Raised while reading an archive entry that is encrypted (RuntimeError), corrupt
+# (BadZipFile, zlib.error) or compressed with a method zipfile lacks (NotImplementedError)
+UNREADABLE_ENTRY_ERRORS = (RuntimeError, NotImplementedError, zipfile.BadZipFile, zlib.error)
+# SQLite limits the number of bound parameters per query
+IN_CLAUSE_SIZE = 500
+
+
+class ImportEntry(NamedTuple):
+    name: str  # path inside the archive or below IMPORT_ROOT
+    size: int  # as declared, checked again while copying
+    open: Callable[[], BinaryIO]
+
+
+def iter_archive_entries(archive: zipfile.ZipFile) -> Iterator[ImportEntry]:
+    for info in archive.infolist():
+        name = info.filename
+        # Folders and macOS resource forks
+        if info.is_dir() or name.startswith("__MACOSX/") or Path(name).name.startswith("."):
+            continue
+        yield ImportEntry(name, info.file_size, lambda info=info: archive.open(info))
+
+
+def iter_manifest_entries(root: Path, paths: Iterable[str], directory: Optional[str]) -> Iterator[ImportEntry]:
+    """Files named by a manifest, which must all lie below ``root``"""
+    root = root.resolve()
+
+    def resolve(path: str) -> Path:
+        resolved = (root / path).resolve()
+        if resolved != root and root not in resolved.parents:
+            raise HTTPException(status_code=400, detail=f"{path} is outside the import root")
+        return resolved
+
+    files = [resolve(path) for path in paths]
+    if directory is not None:
+        folder = resolve(directory)
+        if not folder.is_dir():
+            raise HTTPException(status_code=400, detail=f"{directory} is not a directory")
+        files.extend(sorted(path for path in folder.rglob("*") if path.is_file()))
+    for path in files:
+        if not path.is_file():
+            raise HTTPException(status_code=400, detail=f"{path.relative_to(root)} is not a file")
+        if path.name.startswith("."):
+            continue
+        yield ImportEntry(str(path.relative_to(root)), path.stat().st_size, lambda path=path: open(path, "rb"))
+
+
+def plan_jobs(documents: List[Document]) -> List[List[Document]]:
+    """Group documents into indexing jobs of at most IMPORT_JOB_MAX_DOCUMENTS files and IMPORT_JOB_MAX_MB"""
+    max_bytes = settings.IMPORT_JOB_MAX_MB * 1024 * 1024
+    groups: List[List[Document]] = []
+    group: List[Document] = []
+    group_bytes = 0
+    for document in sorted(documents, key=lambda document: document.file_size):
+        if group and (group_bytes + document.file_size > max_bytes or len(group) >= settings.IMPORT_JOB_MAX_DOCUMENTS):
+            groups.append(group)
+            group, group_bytes = [], 0
+        group.append(document)
+        group_bytes += document.file_size
+    if group:
+        groups.append(group)
+    return groups
+
+
+def import_entries(
+    db: Session,
+    case_id: int,
+    source: str,
+    entries: Iterable[ImportEntry],
+    batch: Optional[ImportBatch] = None
+) -> Dict:
+    """Copy the entries into the case and queue their indexing.
+
+    Unsupported, oversized, unreadable (encrypted or corrupt) and duplicate
+    entries (by content, within the case and the import) are skipped and
+    listed in the batch, a new one unless ``batch`` is given. Returns the
+    batch and the number of jobs queued.
+    """
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    case_dir = Path(settings.UPLOAD_DIR) / f"case_{case_id}"
+    case_dir.mkdir(parents=True, exist_ok=True)
+
+    known_hashes = {
+        content_hash for content_hash, in
+        db.query(Document.content_hash).filter(Document.case_id == case_id, Document.content_hash.isnot(None))
+    }
+    documents: List[Document] = []
+    skipped: List[Dict] = []
+    try:
+        for entry in entries:
+            filename = Path(entry.name).name
+            if Path(filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                skipped.append({"name": entry.name, "reason": "unsupported"})
+                continue
+            if entry.size > max_bytes:
+                skipped.append({"name": entry.name, "reason": "too_large"})
+                continue
+
+            temp_path = case_dir / f".{uuid.uuid4().hex}.part"
+            try:
+                with entry.open() as f:
+                    content_hash, file_size = uploads.save_and_hash(f, temp_path, max_bytes)
+            except HTTPException:
+                skipped.append({"name": entry.name, "reason": "too_large"})
+                continue
+            except UNREADABLE_ENTRY_ERRORS:
+                temp_path.unlink(missing_ok=True)
+                skipped.append({"name": entry.name, "reason": "unreadable"})
+                continue
+            if content_hash in known_hashes:
+                temp_path.unlink()
+                skipped.append({"name": entry.name, "reason": "duplicate"})
+                continue
+            known_hashes.add(content_hash)
+
+            file_path = uploads.unique_file_path(case_dir, filename)
+            os.replace(temp_path, file_path)
+            documents.append(Document(
+                case_id=case_id,
+                filename=filename,
+                file_path=str(file_path),
+                file_type=mimetypes.guess_type(filename)[0],
+                file_size=file_size,
+                content_hash=content_hash,
+                is_indexed=False,
+                index_status="queued"
+            ))
+    except Exception:
+        # Nothing is committed, so don't leave the copied files behind
+        for document in documents:
+            Path(document.file_path).unlink(missing_ok=True)
+        raise
+
+    # Only now start writing, so the copying doesn't hold SQLite's write lock
+    if batch is None:
+        batch = ImportBatch(case_id=case_id, source=source)
+        db.add(batch)
+        db.flush()
+    for document in documents:
+        document.import_batch_id = batch.id
+    db.add_all(documents)
+    db.flush()
+
+    # Identical content in another case: copy its vectors instead of re-indexing
+    sources: Dict[str, Document] = {}
+    hashes = [document.content_hash for document in documents]
+    for start in range(0, len(hashes), IN_CLAUSE_SIZE):
+        for source in (
+            db.query(Document)
+            .filter(Document.content_hash.in_(hashes[start:start + IN_CLAUSE_SIZE]), Document.case_id != case_id)
+            .order_by(Document.is_indexed.desc(), Document.id)
+        ):
+            sources.setdefault(source.content_hash, source)
+
+    jobs = 0
+    to_index = []
+    for document in documents:
+        source = sources.get(document.content_hash)
+        if source is None:
+            to_index.append(document)
+            continue
+        document.duplicate_of = source.id
+        enqueue_job(
+            db, "copy_vectors", case_id=case_id, document_id=document.id,
+            payload={"source_document_id": source.id}, commit=False
+        )
+        jobs += 1
+    for group in plan_jobs(to_index):
+        if len(group) == 1:
+            enqueue_job(db, "index", case_id=case_id, document_id=group[0].id, commit=False)
+        else:
+            enqueue_job(
+                db, "index_documents", case_id=case_id,
+                payload={"document_ids": [document.id for document in group]}, commit=False
+            )
+        jobs += 1
+
+    batch.total_files = len(documents)
+    batch.total_bytes = sum(document.file_size for document in documents)
+    batch.skipped = json.dumps(skipped, ensure_ascii=False)
+    batch.status = IMPORT_IMPORTED
+    db.commit()
+    db.refresh(batch)
+    return {"batch": batch, "jobs": jobs}
+
+
+def queue_archive_import(db: Session, case_id: int, filename: str, archive_path: Path) -> ImportBatch:
+    """Create the batch of an uploaded archive and queue its unpacking; deletes the archive if it isn't a ZIP"""
+    # Only reads the central directory at the end of the file
+    if not zipfile.is_zipfile(archive_path):
+        archive_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Not a ZIP archive")
+    batch = ImportBatch(case_id=case_id, source=filename, status=IMPORT_EXTRACTING)
+    db.add(batch)
+    db.flush()
+    enqueue_job(
+        db, "import_archive", case_id=case_id,
+        payload={"batch_id": batch.id, "archive_path": str(archive_path)}, commit=False
+    )
+    db.commit()
+    db.refresh(batch)
+    return batch
+
+
+def import_archive(db: Session, batch: ImportBatch, archive_path: Path) -> int:
+    """Unpack a queued archive into its batch; returns the number of indexing jobs queued.
+
+    The archive is deleted once its documents are committed. Raises
+    ``zipfile.BadZipFile`` if it can't be read.
+    """
+    if batch.status == IMPORT_EXTRACTING:
+        with zipfile.ZipFile(archive_path) as archive:
+            jobs = import_entries(db, batch.case_id, batch.source, iter_archive_entries(archive), batch=batch)["jobs"]
+    else:
+        # Imported by an earlier attempt that stopped before deleting the archive
+        jobs = 0
+    archive_path.unlink(missing_ok=True)
+    return jobs
+
+
+def fail_archive_import(db: Session, batch_id: int, archive_path: Path, error: str):
+    """Give up on a queued archive: mark its batch failed and delete the archive"""
+    batch = db.query(ImportBatch).filter(ImportBatch.id == batch_id).first()
+    if batch is not None and batch.status == IMPORT_EXTRACTING:
+        batch.status = IMPORT_FAILED
+        batch.error = error
+        db.commit()
+    archive_path.unlink(missing_ok=True)
+
+
+def import_progress(db: Session, batch: ImportBatch) -> Dict:
+    """Aggregate indexing progress and throughput of a bulk import"""
+    counts = {status: 0 for status in ("queued", "indexing", "indexed", "failed")}
+    rows = (
+        db.query(Document.index_status, func.count(Document.id), func.sum(Document.file_size), func.max(Document.indexed_at))
+        .filter(Document.import_batch_id == batch.id)
+        .group_by(Document.index_status)
+    )
+    sizes: Dict[str, int] = {}
+    last_indexed_at = None
+    for status, count, size, indexed_at in rows:
+        counts[status] = counts.get(status, 0) + count
+        sizes[status] = size or 0
+        if status == "indexed":
+            last_indexed_at = indexed_at
+    indexed_bytes = sizes.get("indexed", 0)
+
+    # An archive still being unpacked has no documents yet
+    done = counts["queued"] + counts["indexing"] == 0 and batch.status != IMPORT_EXTRACTING
+    end = last_indexed_at if done and last_indexed_at else datetime.utcnow()
+    elapsed = max((end - batch.created_at).total_seconds(), 1e-3)
+    bytes_per_sec = indexed_bytes / elapsed
+    remaining_bytes = sizes.get("queued", 0) + sizes.get("indexing", 0)
+    return {
+        "queued": counts["queued"],
+        "indexing": counts["indexing"],
+        "indexed": counts["indexed"],
+        "failed": counts["failed"],
+        "indexed_bytes": indexed_bytes,
+        "elapsed_seconds": round(elapsed, 1),
+        "documents_per_sec": round(counts["indexed"] / elapsed, 3),
+        "mb_per_sec": round(bytes_per_sec / (1024 * 1024), 3),
+        "eta_seconds": 0.0 if done else (round(remaining_bytes / bytes_per_sec, 1) if bytes_per_sec > 0 else None),
+        "done": done
+    }
@@ -0,0 +1,217 @@
+import re
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+
+# "Madde 17", "MADDE 17/A", "Ek Madde 2", "Geçici Madde 1"
+_ARTICLE = re.compile(r"^(?:(?:EK|Ek|GEÇİCİ|Geçici)\s+)?(?:MADDE|Madde)\s+\d+(?:/[A-Za-z])?\b")
+# "BİRİNCİ BÖLÜM", "İKİNCİ KISIM", "Üçüncü Bölüm"
+_PART = re.compile(r"^[\wÇĞİÖŞÜçğıöşü ]{0,40}\b(?:BÖLÜM|KISIM|KİTAP|FASIL|AYIRIM|Bölüm|Kısım|Kitap|Fasıl|Ayırım)\b")
+# Short all-caps lines: "GEREKÇE", "HÜKÜM", "AÇIKLAMALAR", "SONUÇ VE İSTEM"
+_CAPS_HEADING = re.compile(r"^[A-ZÇĞİÖŞÜÂÎÛ][A-ZÇĞİÖŞÜÂÎÛ .,'/-]{2,59}$")
+# Numbered clauses start a new paragraph: "1.", "2)", "a)", "(3)"
+_CLAUSE = re.compile(r"^(?:\(?\d{1,3}[.)]|\(?[a-zçğıöşü]\))\s")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[\"'(«A-ZÇĞİÖŞÜ0-9])")
+# Abbreviations that end with a period without ending the sentence
+_ABBREVIATIONS = {
+    "av", "dr", "prof", "doç", "no", "md", "m", "s", "sy", "vb", "vs", "bkz", "örn",
+    "t.c", "e", "k", "yarg", "hd", "ck", "tbk", "tmk", "hmk", "cmk", "iik", "ttk", "sk", "st", "tel"
+}
+# Longest paragraph kept before complete sentences are split off, in characters
+_MAX_PARAGRAPH_CHARS = 20000
+
+
+class Chunk(NamedTuple):
+    text: str
+    section: str  # e.g. "BİRİNCİ BÖLÜM > Madde 17", "" before the first heading
+    tokens: int
+
+
+def approximate_token_count(text: str) -> int:
+    """Rough subword count for when no tokenizer is available"""
+    return int(len(re.findall(r"\w+|[^\w\s]", text)) * 1.4) + 1
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences: List[str] = []
+    for piece in _SENTENCE_END.split(text):
+        if sentences:
+            words = sentences[-1].rstrip(".").rsplit(None, 1)
+            last_word = words[-1].lower() if words else ""
+            # Abbreviations, initials and ordinals ("3. Hukuk Dairesi") don't end a sentence
+            if last_word in _ABBREVIATIONS or last_word.isdigit() or (len(last_word) == 1 and last_word.isalpha()):
+                sentences[-1] = f"{sentences[-1]} {piece}"
+                continue
+        sentences.append(piece)
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+
+class LegalTextChunker:
+    """Chunk Turkish legal text on paragraph, sentence and article boundaries.
+
+    Chunks are filled with whole sentences up to ``max_tokens`` tokenizer
+    tokens. A new article or part heading starts a new chunk once the current
+    one holds at least ``min_tokens``, and the heading path is kept as the
+    chunk's section. Works incrementally on a stream of text segments.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int] = approximate_token_count,
+        max_tokens: int = 256,
+        min_tokens: int = 64,
+        overlap_sentences: int = 0
+    ):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.overlap_sentences = overlap_sentences
+
+    def chunk(self, segments: Iterable[str]) -> Iterator[Chunk]:
+        state = _ChunkState(self)
+        pending = ""
+        for segment in segments:
+            lines = (pending + segment).split("\n")
+            # The last line may continue in the next segment
+            pending = lines.pop()
+            for line in lines:
+                yield from state.add_line(line)
+        if pending:
+            yield from state.add_line(pending)
+        yield from state.finish()
+
+    def chunk_text(self, text: str) -> List[Chunk]:
+        return list(self.chunk([text]))
+
+
+class _ChunkState:
+    def __init__(self, chunker: LegalTextChunker):
+        self.chunker = chunker
+        self.part = ""
+        self.article = ""
+        self.section = ""
+        self.paragraph: List[str] = []
+        self.paragraph_chars = 0
+        self.sentences: List[str] = []
+        self.sentence_tokens: List[int] = []
+        self.tokens = 0
+        self.new_sentences = 0  # sentences not yet emitted (the rest is overlap)
+
+    def add_line(self, line: str) -> Iterator[Chunk]:
+        line = line.strip()
+        if not line:
+            yield from self.end_paragraph()
+            return
+
+        heading = self.match_heading(line)
+        if heading or _CLAUSE.match(line):
+            yield from self.end_paragraph()
+        if heading:
+            if self.tokens >= self.chunker.min_tokens:
+                # No overlap across article or part boundaries
+                yield from self.flush(keep_overlap=False)
+            self.set_heading(*heading)
+
+        self.paragraph.append(line)
+        self.paragraph_chars += len(line) + 1
+        if self.paragraph_chars > _MAX_PARAGRAPH_CHARS:
+            # Very long paragraph (e.g. text without line breaks): emit all but the last sentence
+            sentences = split_sentences(" ".join(self.paragraph))
+            if len(sentences) > 1:
+                # The last sentence may continue on the next line
+                self.paragraph = sentences[-1:]
+                sentences = sentences[:-1]
+            else:
+                self.paragraph = []
+            self.paragraph_chars = sum(len(sentence) + 1 for sentence in self.paragraph)
+            for sentence in sentences:
+                yield from self.add_sentence(sentence)
+
+    def match_heading(self, line: str):
+        article = _ARTICLE.match(line)
+        if article:
+            return "article", article.group(0)
+        if _PART.match(line) and len(line) <= 80:
+            return "part", line
+        if _CAPS_HEADING.match(line) and ":" not in line and not any(c.isdigit() for c in line):
+            return "part", line
+        return None
+
+    def set_heading(self, kind: str, title: str):
+        if kind == "part":
+            self.part = title
+            self.article = ""
+        else:
+            self.article = title
+
+    def current_section(self) -> str:
+        return " > ".join(part for part in (self.part, self.article) if part)
+
+    def end_paragraph(self) -> Iterator[Chunk]:
+        if not self.paragraph:
+            return
+        text = " ".join(self.paragraph)
+        self.paragraph = []
+        self.paragraph_chars = 0
+        for sentence in split_sentences(text):
+            yield from self.add_sentence(sentence)
+
+    def add_sentence(self, sentence: str) -> Iterator[Chunk]:
+        tokens = self.chunker.count_tokens(sentence)
+        if tokens > self.chunker.max_tokens:
+            # A single sentence over budget is split on word boundaries
+            for piece, piece_tokens in self.split_long(sentence):
+                yield from self.append(piece, piece_tokens)
+            return
+        yield from self.append(sentence, tokens)
+
+    def append(self, sentence: str, tokens: int) -> Iterator[Chunk]:
+        if self.sentences and self.tokens + tokens > self.chunker.max_tokens:
+            if self.new_sentences:
+                yield from self.flush()
+            if self.tokens + tokens > self.chunker.max_tokens:
+                # The overlap alone leaves no room for this sentence
+                self.reset()
+        if not self.sentences:
+            self.section = self.current_section()
+        self.sentences.append(sentence)
+        self.sentence_tokens.append(tokens)
+        self.tokens += tokens
+        self.new_sentences += 1
+
+    def split_long(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        words = sentence.split()
+        piece: List[str] = []
+        for word in words:
+            candidate = " ".join(piece + [word])
+            if piece and self.chunker.count_tokens(candidate) > self.chunker.max_tokens:
+                text = " ".join(piece)
+                yield text, self.chunker.count_tokens(text)
+                piece = [word]
+            else:
+                piece.append(word)
+        if piece:
+            text = " ".join(piece)
+            yield text, self.chunker.count_tokens(text)
+
+    def flush(self, keep_overlap: bool = True) -> Iterator[Chunk]:
+        if self.new_sentences:
+            yield Chunk(" ".join(self.sentences), self.section, self.tokens)
+
+        keep = self.chunker.overlap_sentences if keep_overlap else 0
+        if keep and len(self.sentences) > keep:
+            self.sentences = self.sentences[-keep:]
+            self.sentence_tokens = self.sentence_tokens[-keep:]
+            self.tokens = sum(self.sentence_tokens)
+            self.new_sentences = 0
+        else:
+            self.reset()
+
+    def reset(self):
+        self.sentences = []
+        self.sentence_tokens = []
+        self.tokens = 0
+        self.new_sentences = 0
+
+    def finish(self) -> Iterator[Chunk]:
+        yield from self.end_paragraph()
+        yield from self.flush(keep_overlap=False)
@@ -0,0 +1,128 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+
+# Shorter common prefixes/suffixes of adjacent chunks are coincidence, not chunk overlap
+MIN_OVERLAP_CHARS = 10
+
+
+class PackedContext(NamedTuple):
+    chunks: List[str]
+    metadatas: List[Dict]  # metadata of the first chunk of each (merged) context chunk
+    tokens: int
+    baseline_tokens: int  # tokens of the top chunks joined verbatim, as without packing
+
+
+def remove_overlap(previous: str, following: str, max_overlap: int = 1000) -> Optional[str]:
+    """The part of ``following`` after the text it repeats from the end of ``previous``.
+
+    Returns None if the two don't overlap.
+    """
+    for size in range(min(len(previous), len(following), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return None
+
+
+def pack_context(
+    chunks: Sequence[str],
+    metadatas: Sequence[Dict],
+    embeddings: Sequence[Sequence[float]],
+    count_tokens: Callable[[str], int],
+    max_tokens: int,
+    mmr_lambda: float = 0.7,
+    duplicate_threshold: float = 0.95,
+    baseline_chunks: int = 5
+) -> PackedContext:
+    """Choose the context for a prompt from ranked retrieval results.
+
+    Chunks are taken in maximal-marginal-relevance order, where relevance
+    follows the retrieval rank, until ``max_tokens`` is used up. Near-duplicates
+    (e.g. from copies of a document) are skipped, and a chunk next to one
+    already taken only costs the tokens of the text they don't share. Taken
+    chunks that follow each other in a document are merged into one.
+    """
+    if not chunks:
+        return PackedContext([], [], 0, 0)
+
+    token_counts = [count_tokens(chunk) for chunk in chunks]
+    baseline_tokens = sum(token_counts[:baseline_chunks])
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    # Candidates that directly follow each other in a document, and the text the second adds
+    positions = {
+        (meta.get("document_id"), meta["chunk_index"]): i
+        for i, meta in enumerate(metadatas) if meta.get("chunk_index") is not None
+    }
+    following: Dict[int, int] = {}
+    preceding: Dict[int, int] = {}
+    additions: Dict[int, str] = {}
+    shared_tokens: Dict[int, int] = {}
+    for (document_id, chunk_index), i in positions.items():
+        j = positions.get((document_id, chunk_index + 1))
+        if j is None:
+            continue
+        following[i], preceding[j] = j, i
+        rest = remove_overlap(chunks[i], chunks[j])
+        additions[j] = rest if rest is not None else f" {chunks[j]}"
+        shared_tokens[j] = count_tokens(chunks[j][:len(chunks[j]) - len(rest)]) if rest is not None else 0
+
+    taken = set()
+
+    def cost(i: int) -> int:
+        tokens = token_counts[i]
+        if preceding.get(i) in taken:
+            tokens -= shared_tokens[i]
+        if following.get(i) in taken:
+            tokens -= shared_tokens[following[i]]
+        return max(tokens, 0)
+
+    # Steeply decreasing, so diversity reorders the tail of the ranking rather than its top
+    relevance = [1 / (1 + rank) for rank in range(len(chunks))]
+    max_similarity = np.full(len(chunks), -1.0, dtype=np.float32)
+    remaining = list(range(len(chunks)))
+    order: List[int] = []
+    texts: List[str] = []
+    tokens = 0
+    while remaining:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * max_similarity[i])
+        remaining.remove(best)
+        text = " ".join(chunks[best].split())
+        if max_similarity[best] >= duplicate_threshold or any(text in seen for seen in texts):
+            continue
+        best_cost = cost(best)
+        # The best chunk is always used, even if it alone is over budget
+        if order and tokens + best_cost > max_tokens:
+            continue
+        order.append(best)
+        taken.add(best)
+        texts.append(text)
+        tokens += best_cost
+        max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+
+    # Merge runs of adjacent chunks, keeping the order in which their first chunk was taken
+    packed_chunks: List[str] = []
+    packed_metadatas: List[Dict] = []
+    emitted = set()
+    for i in order:
+        if i in emitted:
+            continue
+        start = i
+        while preceding.get(start) in taken:
+            start = preceding[start]
+        text = chunks[start]
+        emitted.add(start)
+        current = start
+        while following.get(current) in taken:
+            current = following[current]
+            text += additions[current]
+            emitted.add(current)
+        packed_chunks.append(text)
+        packed_metadatas.append(metadatas[start])
+
+    return PackedContext(
+        packed_chunks,
+        packed_metadatas,
+        sum(count_tokens(chunk) for chunk in packed_chunks),
+        baseline_tokens
+    )
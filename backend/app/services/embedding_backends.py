@@ -0,0 +1,228 @@
+"""Runtimes the embedding model can run on.
+
+``torch`` is sentence-transformers itself. ``onnx`` runs the same model's
+transformer through onnxruntime, optionally with int8 weights (dynamic
+quantization), which is considerably faster on CPUs without a GPU. The ONNX
+model is exported from the sentence-transformers model on first use and kept
+under ``EMBEDDING_ONNX_DIR``; after that neither torch nor the original
+weights are loaded.
+
+Both expose the parts of the ``SentenceTransformer`` interface the app uses:
+``encode``, ``tokenizer`` and ``max_seq_length``.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Union
+import numpy as np
+from app.config import settings
+
+POOLING_MODES = ("mean", "cls", "max")
+
+
+def variant(backend: str, quantize: bool) -> str:
+    """Name of a backend configuration, e.g. ``onnx-int8``"""
+    if backend == "onnx" and quantize:
+        return "onnx-int8"
+    return backend
+
+
+def configured_variant() -> str:
+    return variant(settings.EMBEDDING_BACKEND, settings.EMBEDDING_ONNX_QUANTIZE)
+
+
+def cache_name(name: str, max_seq_length: int, model_variant: str) -> str:
+    """Embedding cache key of a model; quantized vectors differ slightly, so they are cached apart"""
+    key = f"{name}@{max_seq_length}"
+    return key if model_variant in ("torch", "onnx") else f"{key}#{model_variant}"
+
+
+def onnx_dir() -> Path:
+    return Path(settings.EMBEDDING_ONNX_DIR or Path(settings.VECTOR_DB_PATH) / "onnx")
+
+
+def _threads(threads: int) -> int:
+    # Worker processes split the cores through OMP_NUM_THREADS, which onnxruntime ignores
+    return threads or int(os.environ.get("OMP_NUM_THREADS") or 0)
+
+
+class OnnxEmbeddingModel:
+    """A sentence-transformers model exported to ONNX, with the same pooling and normalization"""
+
+    def __init__(self, path: Path, max_seq_length: int, quantize: bool = False, threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(path / "export.json", encoding="utf-8") as f:
+            export = json.load(f)
+        self.input_names: List[str] = export["input_names"]
+        self.pooling: str = export["pooling"]
+        self.normalize: bool = export["normalize"]
+        self.dimension: int = export["dimension"]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path))
+        self.max_seq_length = max_seq_length
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = _threads(threads)
+        options.inter_op_num_threads = 1
+        model_file = path / ("model_int8.onnx" if quantize else "model.onnx")
+        self.session = onnxruntime.InferenceSession(
+            str(model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _pool(self, token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return token_embeddings[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        if self.pooling == "max":
+            return np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else [str(text).strip() for text in sentences]
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        # Longest first, like sentence-transformers, so batches carry little padding
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), max(1, batch_size)):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            embeddings[batch] = self._pool(token_embeddings, encoded["attention_mask"])
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+def export_onnx(name: str) -> Path:
+    """Export a sentence-transformers model to ONNX (fp32 and int8) once; returns its directory"""
+    path = onnx_dir() / re.sub(r"[^\w.-]+", "__", name)
+    if (path / "export.json").exists():
+        return path
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+
+    model = SentenceTransformer(name, device="cpu")
+    modules = list(model)
+    if not isinstance(modules[0], Transformer):
+        raise ValueError(f"{name} does not start with a transformer module and cannot be exported")
+    pooling = next((module for module in modules if isinstance(module, Pooling)), None)
+    pooling_mode = pooling.get_pooling_mode_str() if pooling is not None else "mean"
+    if pooling_mode not in POOLING_MODES:
+        raise ValueError(f"Pooling mode {pooling_mode} of {name} is not supported by the ONNX backend")
+    transformer = modules[0].auto_model.eval()
+    tokenizer = modules[0].tokenizer
+    sample = tokenizer(["örnek cümle", "dava dilekçesi"], padding=True, return_tensors="pt")
+    input_names = [key for key in ("input_ids", "attention_mask", "token_type_ids") if key in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Exported next to the final directory and renamed, so concurrent workers never load half a model
+    temp = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    try:
+        axes = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(),
+                tuple(sample[key] for key in input_names),
+                str(temp / "model.onnx"),
+                input_names=input_names,
+                output_names=["token_embeddings"],
+                dynamic_axes={**{key: axes for key in input_names}, "token_embeddings": axes},
+                opset_version=14
+            )
+        quantize_dynamic(str(temp / "model.onnx"), str(temp / "model_int8.onnx"), weight_type=QuantType.QInt8)
+        tokenizer.save_pretrained(str(temp))
+        with open(temp / "export.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "model": name,
+                "input_names": input_names,
+                "pooling": pooling_mode,
+                "normalize": any(isinstance(module, Normalize) for module in modules),
+                "dimension": model.get_sentence_embedding_dimension()
+            }, f, indent=2)
+        try:
+            os.rename(temp, path)
+        except OSError:
+            # Another process finished first
+            if not (path / "export.json").exists():
+                raise
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+    return path
+
+
+def load_model(
+    name: str,
+    max_seq_length: int,
+    backend: str = "torch",
+    quantize: bool = False,
+    threads: int = 0
+):
+    """An embedding model with ``SentenceTransformer``'s ``encode``/``tokenizer`` interface"""
+    if backend == "onnx":
+        return OnnxEmbeddingModel(export_onnx(name), max_seq_length, quantize=quantize, threads=threads)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(name)
+        # Embed whole chunks instead of truncating them at the model's default length
+        model.max_seq_length = max_seq_length
+        return model
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def load_configured_model(name: str, max_seq_length: int):
+    return load_model(
+        name,
+        max_seq_length,
+        backend=settings.EMBEDDING_BACKEND,
+        quantize=settings.EMBEDDING_ONNX_QUANTIZE,
+        threads=settings.EMBEDDING_THREADS
+    )
+
+
+# sentence-transformers' own default
+DEFAULT_ENCODE_BATCH_SIZE = 32
+
+
+def encode(model, texts: List[str]) -> np.ndarray:
+    """Embed texts in forward passes of EMBEDDING_ENCODE_BATCH_SIZE texts (32 when 0)"""
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    batch_size = settings.EMBEDDING_ENCODE_BATCH_SIZE or DEFAULT_ENCODE_BATCH_SIZE
+    return model.encode(texts, batch_size=batch_size, show_progress_bar=False)
@@ -0,0 +1,150 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.services import metrics
+
+_WHITESPACE = re.compile(r"\s+")
+# last_used is refreshed at most this often per entry; LRU order only needs to be coarse
+TOUCH_INTERVAL_SECONDS = 3600
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a chunk so that trivially different copies share a cache entry"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk embedding cache with size-bounded LRU eviction.
+
+    Entries are keyed by the SHA-256 of (model name, normalized text) and stored
+    in a SQLite file, so all API and worker processes share one cache. The
+    entry and eviction counts are kept in the same file, so eviction never
+    counts the table; hits and misses are counted per process, in the
+    Prometheus metrics and ``stats``, so lookups stay read-only.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Counted once for caches created before the entry count was kept
+            conn.execute(
+                "INSERT OR IGNORE INTO counters (name, value) SELECT 'entries', COUNT(*) FROM embeddings"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings for texts; missing entries are None"""
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        stale: List[str] = []
+        now = time.time()
+        stale_before = now - TOUCH_INTERVAL_SECONDS
+        conn = self._connect()
+        unique_keys = list(dict.fromkeys(keys))
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(unique_keys), 500):
+            part = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = conn.execute(
+                f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", part
+            ).fetchall()
+            for key, blob, last_used in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+                if last_used < stale_before:
+                    stale.append(key)
+
+        if stale:
+            with conn:
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in stale])
+        hits = sum(1 for key in keys if key in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        metrics.EMBEDDING_CACHE_LOOKUPS.labels("hit").inc(hits)
+        metrics.EMBEDDING_CACHE_LOOKUPS.labels("miss").inc(len(keys) - hits)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[np.ndarray]):
+        """Store embeddings and evict the least recently used entries beyond max_entries"""
+        now = time.time()
+        rows = [
+            (self.key(text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        conn = self._connect()
+        with conn:
+            # Keys are content addresses, so an existing entry already holds the same vector
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._increment(conn, entries=cursor.rowcount)
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        (count,) = conn.execute("SELECT value FROM counters WHERE name = 'entries'").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Evict a little more than needed so we don't evict on every insert
+        excess += self.max_entries // 20
+        cursor = conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._increment(conn, entries=-cursor.rowcount, evictions=cursor.rowcount)
+
+    def _increment(self, conn: sqlite3.Connection, **counts: int):
+        conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(name, value) for name, value in counts.items() if value]
+        )
+
+    def stats(self) -> Dict:
+        """Entry and eviction counts of the shared file; hits and misses of this process"""
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        hits = self.hits
+        misses = self.misses
+        lookups = hits + misses
+        return {
+            "model": self.model_name,
+            "entries": counters.get("entries", 0),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,128 @@
+"""Versions of the vector index.
+
+Each version is a set of vector store collections embedded with one model:
+``case_{id}`` (and ``all_cases``) for version 1, ``case_{id}__v{n}`` after
+that. A case is served from its ``embedding_version``; ``python -m
+app.reembed`` builds a new version next to the active one, switches the cases
+over one at a time and then makes it the version new cases start on.
+"""
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Case, IndexVersion
+from app.services.query_cache import bump_case_index_version
+
+BUILDING = "building"
+ACTIVE = "active"
+RETIRED = "retired"
+DROPPED = "dropped"
+
+
+def ensure_initial_version(db: Session):
+    """Record version 1, the collections built before versions existed, with the configured model"""
+    if db.query(IndexVersion.version).filter(IndexVersion.version == 1).first() is not None:
+        return
+    db.add(IndexVersion(
+        version=1,
+        embedding_model=settings.EMBEDDING_MODEL,
+        max_seq_length=settings.EMBEDDING_MAX_SEQ_LENGTH,
+        status=ACTIVE,
+        activated_at=datetime.utcnow()
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Recorded by another process in the meantime
+        db.rollback()
+
+
+def get_version(db: Session, version: int) -> Optional[IndexVersion]:
+    if version == 1:
+        ensure_initial_version(db)
+    return db.query(IndexVersion).filter(IndexVersion.version == version).first()
+
+
+def default_version(db: Session) -> int:
+    """The version new cases are indexed into"""
+    ensure_initial_version(db)
+    return db.query(func.max(IndexVersion.version)).filter(IndexVersion.status == ACTIVE).scalar() or 1
+
+
+def building_version(db: Session) -> Optional[IndexVersion]:
+    return db.query(IndexVersion).filter(IndexVersion.status == BUILDING).first()
+
+
+def live_versions(db: Session) -> List[int]:
+    """Versions with collections that are in use: active, being built, or still serving a case"""
+    ensure_initial_version(db)
+    versions = {
+        version for version, in
+        db.query(IndexVersion.version).filter(IndexVersion.status.in_([ACTIVE, BUILDING]))
+    }
+    versions.update(
+        version or 1 for version, in db.query(Case.embedding_version).distinct()
+    )
+    return sorted(versions)
+
+
+def serving_versions(db: Session) -> List[int]:
+    """Versions queries are answered from: the active one, which new cases get, and those of existing cases"""
+    versions = {default_version(db)}
+    versions.update(
+        version or 1 for version, in db.query(Case.embedding_version).distinct()
+    )
+    return sorted(versions)
+
+
+def case_version(db: Session, case_id: int) -> int:
+    return db.query(Case.embedding_version).filter(Case.id == case_id).scalar() or 1
+
+
+def create_version(db: Session, embedding_model: str, max_seq_length: int) -> IndexVersion:
+    ensure_initial_version(db)
+    latest = db.query(func.max(IndexVersion.version)).scalar() or 1
+    version = IndexVersion(
+        version=latest + 1,
+        embedding_model=embedding_model,
+        max_seq_length=max_seq_length,
+        status=BUILDING
+    )
+    db.add(version)
+    db.commit()
+    return version
+
+
+def switch_case(db: Session, case_id: int, version: int):
+    """Serve a case from ``version``; one UPDATE, so readers see either version whole"""
+    db.query(Case).filter(Case.id == case_id).update(
+        {Case.embedding_version: version}, synchronize_session=False
+    )
+    # Cached retrievals and answers were computed with the previous version's embeddings
+    bump_case_index_version(db, case_id, commit=False)
+    db.commit()
+
+
+def activate_version(db: Session, version: int) -> List[int]:
+    """Make ``version`` the one new cases start on; returns the versions it replaces"""
+    replaced = [
+        previous for previous, in
+        db.query(IndexVersion.version).filter(IndexVersion.status == ACTIVE, IndexVersion.version != version)
+    ]
+    db.query(IndexVersion).filter(IndexVersion.version.in_(replaced)).update(
+        {IndexVersion.status: RETIRED}, synchronize_session=False
+    )
+    db.query(IndexVersion).filter(IndexVersion.version == version).update(
+        {IndexVersion.status: ACTIVE, IndexVersion.activated_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return replaced
+
+
+def mark_dropped(db: Session, version: int):
+    db.query(IndexVersion).filter(IndexVersion.version == version).update(
+        {IndexVersion.status: DROPPED}, synchronize_session=False
+    )
+    db.commit()
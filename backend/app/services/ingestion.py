@@ -0,0 +1,85 @@
+from pathlib import Path
+from typing import Iterable, Iterator, List, TypeVar
+import PyPDF2
+import docx
+
+T = TypeVar("T")
+
+# Size of the blocks plain text files are read in
+TXT_BLOCK_SIZE = 64 * 1024
+
+
+def extract_segments(file_path: str) -> Iterator[str]:
+    """Yield a document's text one page (PDF), paragraph (DOCX) or block (TXT) at a time.
+
+    Parsing errors are raised; ``iter_text_segments`` logs them instead.
+    """
+    file_ext = Path(file_path).suffix.lower()
+
+    if file_ext == ".pdf":
+        with open(file_path, "rb") as f:
+            pdf_reader = PyPDF2.PdfReader(f)
+            for page in pdf_reader.pages:
+                yield (page.extract_text() or "") + "\n"
+    elif file_ext in [".docx", ".doc"]:
+        doc = docx.Document(file_path)
+        for para in doc.paragraphs:
+            yield para.text + "\n"
+    elif file_ext == ".txt":
+        with open(file_path, "r", encoding="utf-8") as f:
+            while True:
+                block = f.read(TXT_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+
+def iter_text_segments(file_path: str) -> Iterator[str]:
+    """Yield a document's text one page (PDF), paragraph (DOCX) or block (TXT) at a time"""
+    try:
+        yield from extract_segments(file_path)
+    except Exception as e:
+        print(f"Error extracting text from {file_path}: {e}")
+
+
+def iter_chunks(segments: Iterable[str], chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+    """Incrementally split a stream of text segments into overlapping chunks.
+
+    Equivalent to slicing the concatenated text with a stride of
+    ``chunk_size - overlap`` (minus trailing slices that are already fully
+    contained in the previous chunk), but only keeps roughly one chunk of text
+    buffered.
+    """
+    stride = chunk_size - overlap
+    if stride <= 0:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    buffer = ""
+    emitted = False
+    for segment in segments:
+        if not segment:
+            continue
+        buffer += segment
+        start = 0
+        while len(buffer) - start >= chunk_size:
+            yield buffer[start:start + chunk_size]
+            emitted = True
+            start += stride
+        if start:
+            buffer = buffer[start:]
+
+    # The tail only needs its own chunk if it holds text beyond the overlap
+    if buffer and (not emitted or len(buffer) > overlap):
+        yield buffer
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group an iterable into lists of at most ``size`` items"""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,226 @@
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Job
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def worker_node() -> str:
+    """Name of this machine's worker pool, WORKER_NAME or the hostname"""
+    return settings.WORKER_NAME or socket.gethostname()
+
+
+def worker_identity(worker_id: int) -> str:
+    """Identify a worker process as node:pid:worker so abandoned locks can be detected"""
+    return f"{worker_node()}:{os.getpid()}:{worker_id}"
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    case_id: Optional[int] = None,
+    document_id: Optional[int] = None,
+    payload: Optional[Dict] = None,
+    commit: bool = True,
+    delay: float = 0
+) -> Job:
+    """Add a job to the persistent queue, to run no earlier than ``delay`` seconds from now"""
+    job = Job(
+        kind=kind,
+        status=JOB_QUEUED,
+        case_id=case_id,
+        document_id=document_id,
+        payload=json.dumps(payload or {}),
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    if commit:
+        db.commit()
+        db.refresh(job)
+    else:
+        db.flush()
+    return job
+
+
+def schedule_compaction(db: Session) -> Job:
+    """Queue an index compaction unless one is already waiting.
+
+    It is delayed by COMPACTION_DELAY so a burst of deletions is reclaimed in one run.
+    """
+    job = db.query(Job).filter(Job.kind == "compact_index", Job.status == JOB_QUEUED).first()
+    if job is None:
+        job = enqueue_job(db, "compact_index", delay=settings.COMPACTION_DELAY)
+    return job
+
+
+def _claimable(now: datetime):
+    stale_before = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    return or_(
+        and_(Job.status == JOB_QUEUED, Job.run_after <= now),
+        and_(Job.status == JOB_RUNNING, Job.locked_at < stale_before)
+    )
+
+
+def claim_next_job(db: Session, worker: str) -> Optional[Job]:
+    """Atomically claim the next runnable job, or return None if there is none.
+
+    The claim is a compare-and-set UPDATE, so several worker processes can poll
+    the same table without picking up the same job twice.
+    """
+    while True:
+        now = datetime.utcnow()
+        candidate = (
+            db.query(Job.id)
+            .filter(_claimable(now))
+            .order_by(Job.run_after, Job.id)
+            .first()
+        )
+        if candidate is None:
+            return None
+
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == candidate.id, _claimable(now))
+            .update(
+                {
+                    Job.status: JOB_RUNNING,
+                    Job.locked_by: worker,
+                    Job.locked_at: now,
+                    Job.started_at: now,
+                    Job.attempts: Job.attempts + 1
+                },
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        if claimed == 1:
+            return db.get(Job, candidate.id)
+        # Another worker won the race, look for the next one
+
+
+def touch_job(db: Session, job_id: int, worker: str) -> bool:
+    """Refresh the lock of a running job; returns False if ``worker`` no longer holds it"""
+    touched = (
+        db.query(Job)
+        .filter(Job.id == job_id, Job.status == JOB_RUNNING, Job.locked_by == worker)
+        .update({Job.locked_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return touched == 1
+
+
+@contextmanager
+def heartbeat(job_id: int, worker: str) -> Iterator[None]:
+    """Refresh a job's lock every JOB_HEARTBEAT_INTERVAL seconds while the block runs.
+
+    Long jobs thus keep their lock, and JOB_LOCK_TIMEOUT only has to cover
+    a few missed heartbeats of a worker that died.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+            db = SessionLocal()
+            try:
+                if not touch_job(db, job_id, worker):
+                    print(f"Job {job_id} is no longer locked by {worker}")
+                    return
+            except Exception as e:
+                print(f"Heartbeat of job {job_id} failed: {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=beat, name=f"job-{job_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _finish(db: Session, job: Job, worker: str, values: Dict) -> bool:
+    """Update a job only while ``worker`` still holds its lock; returns whether it did"""
+    finished = (
+        db.query(Job)
+        .filter(Job.id == job.id, Job.status == JOB_RUNNING, Job.locked_by == worker)
+        .update({**values, Job.locked_by: None, Job.locked_at: None}, synchronize_session=False)
+    )
+    db.commit()
+    return finished == 1
+
+
+def complete_job(db: Session, job: Job, duration: float, worker: str) -> bool:
+    """Mark a job succeeded; returns False if its lock was taken over by another worker"""
+    return _finish(db, job, worker, {
+        Job.status: JOB_SUCCEEDED,
+        Job.error: None,
+        Job.duration: duration,
+        Job.finished_at: datetime.utcnow()
+    })
+
+
+def fail_job(db: Session, job: Job, error: str, duration: float, worker: str, retry: bool = True) -> Optional[bool]:
+    """Record a failed attempt; requeue with exponential backoff while attempts remain.
+
+    Returns True if the job will be retried, or None if its lock was taken
+    over by another worker, whose attempt the job now belongs to.
+    """
+    will_retry = retry and job.attempts < job.max_attempts
+    values = {Job.error: error, Job.duration: duration}
+    if will_retry:
+        backoff = settings.JOB_RETRY_BACKOFF * (2 ** (job.attempts - 1))
+        values.update({Job.status: JOB_QUEUED, Job.run_after: datetime.utcnow() + timedelta(seconds=backoff)})
+    else:
+        values.update({Job.status: JOB_FAILED, Job.finished_at: datetime.utcnow()})
+    if not _finish(db, job, worker, values):
+        return None
+    return will_retry
+
+
+def release_orphaned_jobs(db: Session) -> int:
+    """Requeue running jobs locked by processes of this worker node that no longer exist.
+
+    The node is WORKER_NAME, which unlike a container's hostname survives
+    restarts. Called before the pool's workers start, so a lock held under
+    this process's own pid is from an earlier run that happened to get it.
+    """
+    node = worker_node()
+    released = 0
+    for job in db.query(Job).filter(Job.status == JOB_RUNNING).all():
+        # node:pid:worker, where the node name may itself contain colons
+        name, _, pid = (job.locked_by or "").rpartition(":")[0].rpartition(":")
+        if name != node:
+            continue
+        if pid.isdigit() and int(pid) != os.getpid() and _process_alive(int(pid)):
+            continue
+        job.status = JOB_QUEUED
+        job.locked_by = None
+        job.locked_at = None
+        job.run_after = datetime.utcnow()
+        released += 1
+    db.commit()
+    return released
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,177 @@
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+# Lowercase the Turkish way first (I -> ı, İ -> i), then fold to ASCII so that
+# "SÖZLEŞME", "sözleşme" and "sozlesme" all match
+_TURKISH_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+_FOLD = str.maketrans({
+    "ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u",
+    "â": "a", "î": "i", "û": "u", "̇": None
+})
+# Article, docket and decision numbers ("17", "2023/1234", "5.2") are kept whole
+_TOKEN = re.compile(r"\d+(?:[./-]\d+)*|[a-z]+")
+
+# Turkish is agglutinative; truncating words to their first five letters
+# ("F5" stemming) conflates inflected forms about as well as a full stemmer
+# ("sözleşmesinin" -> "sozle", "maddesi" -> "madde") and never over-strips
+_STEM_LENGTH = 5
+
+_STOPWORDS = {
+    "ve", "veya", "ile", "bu", "su", "o", "bir", "da", "de", "icin", "olan", "olarak",
+    "gibi", "ise", "ki", "mi", "ne", "her", "daha", "en", "cok", "kadar", "sonra", "once"
+}
+
+
+def normalize_turkish(text: str) -> str:
+    return text.translate(_TURKISH_UPPER).lower().translate(_FOLD)
+
+
+def stem(token: str) -> str:
+    """Prefix stemming; numbers are kept whole"""
+    if token[0].isdigit():
+        return token
+    return token[:_STEM_LENGTH]
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        stem(token)
+        for token in _TOKEN.findall(normalize_turkish(text))
+        if token not in _STOPWORDS
+    ]
+
+
+class LexicalIndex:
+    """Per-case BM25 inverted index stored in SQLite.
+
+    Chunks are added incrementally as documents are indexed; all processes
+    share the same file.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "case_id INTEGER NOT NULL, chunk_id TEXT NOT NULL, document_id INTEGER NOT NULL, "
+                "length INTEGER NOT NULL, PRIMARY KEY (case_id, chunk_id)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_document ON chunks (case_id, document_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "case_id INTEGER NOT NULL, term TEXT NOT NULL, chunk_id TEXT NOT NULL, "
+                "tf INTEGER NOT NULL, PRIMARY KEY (case_id, term, chunk_id)) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_chunks(self, case_id: int, document_id: int, chunk_ids: Sequence[str], texts: Sequence[str]):
+        """Add (or replace) chunks of a document"""
+        chunk_rows = []
+        posting_rows = []
+        for chunk_id, text in zip(chunk_ids, texts):
+            terms = Counter(tokenize(text))
+            chunk_rows.append((case_id, chunk_id, document_id, sum(terms.values())))
+            posting_rows.extend((case_id, term, chunk_id, tf) for term, tf in terms.items())
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "DELETE FROM postings WHERE case_id = ? AND chunk_id = ?",
+                [(case_id, chunk_id) for chunk_id in chunk_ids]
+            )
+            conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", chunk_rows)
+            conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?)", posting_rows)
+
+    def search(self, case_id: int, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """Return (chunk_id, BM25 score) pairs for the best matching chunks of a case"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        conn = self._connect()
+        total, avg_length = conn.execute(
+            "SELECT COUNT(*), AVG(length) FROM chunks WHERE case_id = ?", (case_id,)
+        ).fetchone()
+        if not total:
+            return []
+
+        placeholders = ",".join("?" * len(terms))
+        rows = conn.execute(
+            f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p "
+            f"JOIN chunks c ON c.case_id = p.case_id AND c.chunk_id = p.chunk_id "
+            f"WHERE p.case_id = ? AND p.term IN ({placeholders})",
+            (case_id, *terms)
+        ).fetchall()
+
+        document_frequency = Counter(term for term, _, _, _ in rows)
+        scores: Dict[str, float] = {}
+        for term, chunk_id, tf, length in rows:
+            df = document_frequency[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def delete_document(self, case_id: int, document_id: int):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM postings WHERE case_id = ? AND chunk_id IN "
+                "(SELECT chunk_id FROM chunks WHERE case_id = ? AND document_id = ?)",
+                (case_id, case_id, document_id)
+            )
+            conn.execute("DELETE FROM chunks WHERE case_id = ? AND document_id = ?", (case_id, document_id))
+
+    def delete_case(self, case_id: int):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM postings WHERE case_id = ?", (case_id,))
+            conn.execute("DELETE FROM chunks WHERE case_id = ?", (case_id,))
+
+    def case_ids(self) -> List[int]:
+        return [case_id for case_id, in self._connect().execute("SELECT DISTINCT case_id FROM chunks")]
+
+    def document_ids(self, case_id: int) -> List[int]:
+        return [
+            document_id for document_id, in self._connect().execute(
+                "SELECT DISTINCT document_id FROM chunks WHERE case_id = ?", (case_id,)
+            )
+        ]
+
+    def disk_size(self) -> int:
+        return sum(
+            path.stat().st_size
+            for path in self.path.parent.glob(self.path.name + "*")
+            if path.is_file()
+        )
+
+    def vacuum(self):
+        """Give the pages freed by deletions back to the file system"""
+        self._connect().execute("VACUUM")
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Fuse several ranked id lists into one, scoring each id by sum(1 / (k + rank))"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,187 @@
+"""Prometheus metrics for the API and the index workers.
+
+Index workers run in their own processes, so metrics are kept in
+prometheus_client's multiprocess directory (METRICS_MULTIPROC_DIR) and
+/metrics aggregates all processes. The directory has to be set before
+prometheus_client is imported, which is why this module does it on import.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+from app.config import settings
+
+if settings.METRICS_ENABLED and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    _multiproc_dir = Path(settings.METRICS_MULTIPROC_DIR or Path(settings.VECTOR_DB_PATH) / "metrics")
+    _multiproc_dir.mkdir(parents=True, exist_ok=True)
+    # Inherited by the spawned index workers
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(_multiproc_dir)
+
+from prometheus_client import (  # noqa: E402
+    REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily  # noqa: E402
+from starlette.datastructures import MutableHeaders  # noqa: E402
+
+# From sub-millisecond cache hits up to slow LLM calls and large documents
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "avukat_rag_stage_seconds", "Time spent in each RAG stage", ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter("avukat_rag_stage_errors_total", "RAG stages that raised an exception", ["stage"])
+DOCUMENTS_INDEXED = Counter("avukat_documents_indexed_total", "Documents indexed")
+TEXT_BYTES_INDEXED = Counter("avukat_text_bytes_indexed_total", "Bytes (UTF-8) of text extracted while indexing")
+TEXT_STORE_READS = Counter(
+    "avukat_text_store_reads_total", "Document texts read from the text store (hit) or extracted (miss)", ["result"]
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "avukat_embedding_cache_lookups_total", "Texts looked up in the embedding cache, by result", ["result"]
+)
+CHUNKS_INDEXED = Counter("avukat_chunks_indexed_total", "Chunks embedded and written to the vector store")
+CONTEXT_TOKENS = Counter(
+    "avukat_context_tokens_total",
+    "Prompt context tokens: packed, and baseline for the top chunks joined verbatim", ["kind"]
+)
+JOBS = Counter("avukat_jobs_total", "Finished job attempts by outcome", ["kind", "outcome"])
+JOB_SECONDS = Histogram("avukat_job_seconds", "Duration of job attempts", ["kind"], buckets=STAGE_BUCKETS)
+REQUESTS = Counter("avukat_http_requests_total", "HTTP requests", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram(
+    "avukat_http_request_seconds", "HTTP request duration until the response is complete",
+    ["method", "route"], buckets=STAGE_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "avukat_http_requests_in_progress", "HTTP requests being served", multiprocess_mode="livesum"
+)
+
+# Stage durations of the current request, for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a RAG stage, counting it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Count and time every request by route template.
+
+    A plain ASGI middleware, so streamed responses are timed until their
+    last chunk. With ``timing_header`` each response carries a Server-Timing
+    header with the stages that ran before its headers were sent.
+    """
+
+    def __init__(self, app, timing_header: bool = False):
+        self.app = app
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_header:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            _request_timings.reset(token)
+            # The route template keeps label cardinality bounded (/api/cases/{case_id})
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path).observe(time.perf_counter() - started)
+            REQUESTS.labels(scope["method"], path, str(status)).inc()
+
+
+class JobQueueCollector:
+    """Current number of jobs per kind and status, read from the queue at scrape time"""
+
+    def collect(self):
+        from sqlalchemy import func
+        from app.database import SessionLocal
+        from app.models import Job
+
+        family = GaugeMetricFamily("avukat_jobs", "Jobs in the queue by kind and status", labels=["kind", "status"])
+        db = SessionLocal()
+        try:
+            for kind, status, count in db.query(Job.kind, Job.status, func.count(Job.id)).group_by(Job.kind, Job.status):
+                family.add_metric([kind, status], count)
+        finally:
+            db.close()
+        yield family
+
+
+_queue_registry = CollectorRegistry(auto_describe=False)
+_queue_registry.register(JobQueueCollector())
+
+
+def render() -> bytes:
+    """All metrics in the Prometheus text format"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_queue_registry)
+
+
+def remove_dead_process_files():
+    """Delete the metric files of processes that no longer run, e.g. from before a restart"""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+    for path in Path(directory).glob("*.db"):
+        try:
+            pid = int(path.stem.rsplit("_", 1)[1])
+            os.kill(pid, 0)
+        except (IndexError, ValueError):
+            continue
+        except ProcessLookupError:
+            path.unlink(missing_ok=True)
+        except PermissionError:
+            # Running, but owned by another user
+            continue
+
+
+def mark_process_dead(pid: int):
+    """Drop the live gauges of an exited worker process"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
+
@@ -1,150 +1,929 @@
-import os
 import json
-from typing import List, Dict, Optional
+import contextvars
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 from pathlib import Path
-import chromadb
-from chromadb.config import Settings
-import google.generativeai as genai
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from app.config import settings
-from app.models import Document, Case
+from app.models import Document, Case, ChatMessage
+from app.services.ingestion import iter_chunks, batched
+from app.services.text_store import iter_document_text
+from app.services.chunking import Chunk, LegalTextChunker
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+from app.services.query_cache import LRUCache
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.vector_store import QueryResult, SearchResult, VectorStore, create_vector_store
+from app.services.context_packing import pack_context
+from app.services import embedding_backends, index_versions, metrics
+from app.database import SessionLocal
 from sqlalchemy.orm import Session
-import PyPDF2
-import docx
 
 class RAGService:
     def __init__(self):
-        # Initialize Gemini
-        if settings.GOOGLE_API_KEY:
-            genai.configure(api_key=settings.GOOGLE_API_KEY)
-            # Use gemini-2.5-flash (fast and available)
-            self.gemini_model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
-            self.gemini_model = None
-        
-        # Initialize sentence transformer for embeddings
-        self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        # Gemini, the embedding model and the vector store are heavy to import and load,
+        # so they are created on first use (or by warmup())
+        self._init_lock = threading.RLock()
+        self._gemini_model = None
+        self._gemini_loaded = False
+        # Embedding models by (name, max sequence length); index versions may use different ones
+        self._embedding_models: Dict[Tuple[str, int], object] = {}
+        self._version_models: Dict[int, Tuple[str, int]] = {}
+        self.load_timings: Dict[str, float] = {}
         
         self.vector_db_path = Path(settings.VECTOR_DB_PATH)
         self.vector_db_path.mkdir(exist_ok=True)
-        
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(self.vector_db_path),
-            settings=Settings(anonymized_telemetry=False)
+        self.vector_store: VectorStore = create_vector_store(
+            settings.VECTOR_STORE,
+            str(self.vector_db_path),
+            cache_mb=settings.NUMPY_STORE_CACHE_MB,
+            global_index=settings.CROSS_CASE_SEARCH_ENABLED,
+            chroma_host=settings.CHROMA_SERVER_HOST,
+            chroma_port=settings.CHROMA_SERVER_PORT
         )
+        # Stores of the other index versions, created on first use
+        self._stores: Dict[int, VectorStore] = {1: self.vector_store}
+        
+        # Cache chunk embeddings so identical text is only ever embedded once
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH or str(self.vector_db_path / "embedding_cache.sqlite3"),
+                embedding_backends.cache_name(*self.configured_model, embedding_backends.configured_variant()),
+                settings.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        else:
+            self.embedding_cache = None
+        self._embedding_caches: Dict[Tuple[str, int], EmbeddingCache] = {}
+        if self.embedding_cache is not None:
+            self._embedding_caches[self.configured_model] = self.embedding_cache
+        
+        # In-process caches for chat retrieval
+        self.query_embedding_cache = LRUCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+        self.retrieval_cache = LRUCache(settings.RETRIEVAL_CACHE_SIZE)
+        
+        # Lexical (BM25) index fused with vector search for exact tokens such as article numbers
+        if settings.HYBRID_SEARCH_ENABLED:
+            self.lexical_index = LexicalIndex(
+                settings.LEXICAL_INDEX_PATH or str(self.vector_db_path / "lexical_index.sqlite3")
+            )
+            self._search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+        else:
+            self.lexical_index = None
     
-    def get_collection_name(self, case_id: int) -> str:
-        """Get collection name for a specific case"""
-        return f"case_{case_id}"
+    @property
+    def gemini_model(self):
+        """Gemini model, or None if no API key is configured"""
+        if not self._gemini_loaded:
+            with self._init_lock:
+                if not self._gemini_loaded:
+                    started = time.perf_counter()
+                    if settings.GOOGLE_API_KEY:
+                        import google.generativeai as genai
+                        genai.configure(api_key=settings.GOOGLE_API_KEY)
+                        # Use gemini-2.5-flash (fast and available)
+                        self._gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+                    self.load_timings["gemini"] = round(time.perf_counter() - started, 3)
+                    self._gemini_loaded = True
+        return self._gemini_model
     
-    def extract_text_from_file(self, file_path: str) -> str:
-        """Extract text from various file types"""
-        file_ext = Path(file_path).suffix.lower()
-        text = ""
-        
+    @gemini_model.setter
+    def gemini_model(self, model):
+        with self._init_lock:
+            self._gemini_model = model
+            self._gemini_loaded = True
+    
+    @property
+    def configured_model(self) -> Tuple[str, int]:
+        return settings.EMBEDDING_MODEL, settings.EMBEDDING_MAX_SEQ_LENGTH
+    
+    @property
+    def embedding_model(self):
+        """The configured embedding model (EMBEDDING_MODEL)"""
+        return self.load_embedding_model(*self.configured_model)
+    
+    def load_embedding_model(self, name: str, max_seq_length: int):
+        key = (name, max_seq_length)
+        model = self._embedding_models.get(key)
+        if model is None:
+            with self._init_lock:
+                model = self._embedding_models.get(key)
+                if model is None:
+                    started = time.perf_counter()
+                    model = embedding_backends.load_configured_model(name, max_seq_length)
+                    self._embedding_models[key] = model
+                    timing = "embedding_model" if key == self.configured_model else f"embedding_model:{name}"
+                    self.load_timings[timing] = round(time.perf_counter() - started, 3)
+        return model
+    
+    def version_model(self, version: Optional[int]) -> Tuple[str, int]:
+        """(model name, max sequence length) index ``version`` is embedded with; None is the configured model"""
+        if version is None:
+            return self.configured_model
+        key = self._version_models.get(version)
+        if key is None:
+            db = SessionLocal()
+            try:
+                row = index_versions.get_version(db, version)
+            finally:
+                db.close()
+            if row is None:
+                raise ValueError(f"Unknown index version {version}")
+            # A version's model never changes
+            key = self._version_models[version] = (row.embedding_model, row.max_seq_length)
+        return key
+    
+    def embedding_model_for(self, version: Optional[int]):
+        return self.load_embedding_model(*self.version_model(version))
+    
+    def _embedding_cache_for(self, version: Optional[int]) -> Optional[EmbeddingCache]:
+        if self.embedding_cache is None:
+            return None
+        key = self.version_model(version)
+        cache = self._embedding_caches.get(key)
+        if cache is None:
+            with self._init_lock:
+                cache = self._embedding_caches.get(key)
+                if cache is None:
+                    # Same file: entries are keyed by model
+                    cache = self._embedding_caches[key] = EmbeddingCache(
+                        str(self.embedding_cache.path),
+                        embedding_backends.cache_name(*key, embedding_backends.configured_variant()),
+                        settings.EMBEDDING_CACHE_MAX_ENTRIES
+                    )
+        return cache
+    
+    def store(self, version: int) -> VectorStore:
+        """Vector store holding index ``version``"""
+        store = self._stores.get(version)
+        if store is None:
+            with self._init_lock:
+                store = self._stores.get(version)
+                if store is None:
+                    store = self._stores[version] = self.vector_store.versioned(version)
+        return store
+    
+    def live_versions(self) -> List[int]:
+        db = SessionLocal()
+        try:
+            return index_versions.live_versions(db)
+        finally:
+            db.close()
+    
+    def serving_versions(self) -> List[int]:
+        db = SessionLocal()
         try:
-            if file_ext == ".pdf":
-                with open(file_path, "rb") as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-            elif file_ext in [".docx", ".doc"]:
-                doc = docx.Document(file_path)
-                for para in doc.paragraphs:
-                    text += para.text + "\n"
-            elif file_ext == ".txt":
-                with open(file_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-        except Exception as e:
-            print(f"Error extracting text from {file_path}: {e}")
-        
-        return text
+            return index_versions.serving_versions(db)
+        finally:
+            db.close()
+    
+    @property
+    def is_ready(self) -> bool:
+        """Whether the vector stores and embedding models of every serving index version are loaded"""
+        versions = self.serving_versions()
+        return (
+            all(self.store(version).is_loaded for version in versions)
+            and all(self.version_model(version) in self._embedding_models for version in versions)
+        )
+    
+    def warmup(self, include_llm: bool = True) -> Dict[str, float]:
+        """Load the models and clients up front and run one embedding so the first request is fast.
+        
+        Covers every index version that serves a case, so cases not yet moved
+        by a re-embedding don't load the previous model on their first query.
+        """
+        started = time.perf_counter()
+        versions = self.serving_versions()
+        for version in versions:
+            self.store(version).load()
+        self.load_timings["vector_store"] = round(time.perf_counter() - started, 3)
+        for key in dict.fromkeys(self.version_model(version) for version in versions):
+            self.load_embedding_model(*key).encode(["ısınma"], show_progress_bar=False)
+        if include_llm:
+            self.gemini_model
+        return dict(self.load_timings)
+    
+    def generation_config(self, temperature: float):
+        import google.generativeai as genai
+        return genai.types.GenerationConfig(temperature=temperature)
+    
+    def extract_text_from_file(self, file_path: str, content_hash: Optional[str] = None) -> str:
+        """Extract text from various file types, reusing the stored text if the file is unchanged"""
+        return "".join(iter_document_text(file_path, content_hash))
     
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into chunks with overlap"""
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start = end - overlap
-        return chunks
-    
-    def index_document(self, case_id: int, document_id: int, file_path: str, filename: str):
-        """Index a document for a specific case"""
-        # Extract text
-        text = self.extract_text_from_file(file_path)
-        if not text.strip():
+        return list(iter_chunks([text], chunk_size, overlap))
+    
+    def count_tokens(self, text: str, version: Optional[int] = None) -> int:
+        """Number of embedding-model tokens in a text"""
+        return len(self.embedding_model_for(version).tokenizer(text, add_special_tokens=False)["input_ids"])
+    
+    def iter_document_chunks(self, segments, version: Optional[int] = None) -> Iterator[Chunk]:
+        """Chunk a stream of text segments with the configured chunker, counting tokens of ``version``'s model"""
+        if settings.CHUNKER == "fixed":
+            for text in iter_chunks(segments):
+                yield Chunk(text, "", 0)
             return
         
-        # Get or create collection for this case
-        collection_name = self.get_collection_name(case_id)
-        try:
-            collection = self.chroma_client.get_collection(name=collection_name)
-        except:
-            collection = self.chroma_client.create_collection(name=collection_name)
+        model = self.embedding_model_for(version)
+        tokenizer = model.tokenizer
+        # Tokens past the model's max sequence length (with its special tokens) would not be embedded
+        max_tokens = min(settings.CHUNK_MAX_TOKENS, model.max_seq_length - tokenizer.num_special_tokens_to_add())
+        chunker = LegalTextChunker(
+            count_tokens=lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"]),
+            max_tokens=max_tokens,
+            min_tokens=settings.CHUNK_MIN_TOKENS,
+            overlap_sentences=settings.CHUNK_OVERLAP_SENTENCES
+        )
+        yield from chunker.chunk(segments)
+    
+    def embed_texts(self, texts: List[str], version: Optional[int] = None) -> List[List[float]]:
+        """Embed texts with ``version``'s model, only running it for texts missing from the embedding cache"""
+        with metrics.stage("embed"):
+            return self._embed_texts(texts, version)
+    
+    def _embed_texts(self, texts: List[str], version: Optional[int]) -> List[List[float]]:
+        model = self.embedding_model_for(version)
+        embedding_cache = self._embedding_cache_for(version)
+        if embedding_cache is None:
+            return embedding_backends.encode(model, texts).tolist()
         
-        # Chunk text
-        chunks = self.chunk_text(text)
+        embeddings = embedding_cache.get_many(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(texts[i], []).append(i)
+        if missing:
+            missing_texts = list(missing)
+            encoded = embedding_backends.encode(model, missing_texts)
+            embedding_cache.put_many(missing_texts, encoded)
+            for text, embedding in zip(missing_texts, encoded):
+                for i in missing[text]:
+                    embeddings[i] = embedding
+        return [embedding.tolist() for embedding in embeddings]
+    
+    def index_document(
+        self,
+        case_id: int,
+        document_id: int,
+        file_path: str,
+        filename: str,
+        content_hash: Optional[str] = None,
+        version: Optional[int] = None
+    ) -> Dict:
+        """Index a document for a specific case.
         
-        # Create metadata
-        ids = [f"doc_{document_id}_chunk_{i}" for i in range(len(chunks))]
-        metadatas = [
-            {
-                "document_id": document_id,
-                "filename": filename,
-                "case_id": case_id,
-                "chunk_index": i
+        Text is streamed from the file (or from its stored text, if it was
+        extracted before from content with ``content_hash``), chunked
+        incrementally and embedded and upserted in fixed-size batches, so
+        memory stays flat regardless of the document size. The chunks go to
+        index ``version``, by default the one serving the case.
+        """
+        if version is None:
+            version = self.get_case_versions(case_id)[1]
+        store = self.store(version)
+        started = time.perf_counter()
+        # Extracted text in UTF-8 bytes: pages, paragraphs and text blocks differ too much to count
+        text_bytes = 0
+        chunk_count = 0
+        # Extraction and chunking are interleaved generators, so time each next() call
+        extract_seconds = 0.0
+        chunk_seconds = 0.0
+        
+        def pages():
+            nonlocal text_bytes, extract_seconds
+            segments = iter_document_text(file_path, content_hash)
+            while True:
+                step_started = time.perf_counter()
+                page_text = next(segments, None)
+                extract_seconds += time.perf_counter() - step_started
+                if page_text is None:
+                    return
+                text_bytes += len(page_text.encode("utf-8"))
+                yield page_text
+        
+        def chunks():
+            nonlocal chunk_seconds
+            document_chunks = self.iter_document_chunks(pages(), version)
+            while True:
+                step_started = time.perf_counter()
+                chunk = next(document_chunks, None)
+                chunk_seconds += time.perf_counter() - step_started
+                if chunk is None:
+                    return
+                if chunk.text.strip():
+                    yield chunk
+        
+        for batch in batched(chunks(), settings.EMBEDDING_BATCH_SIZE):
+            texts = [chunk.text for chunk in batch]
+            indexes = range(chunk_count, chunk_count + len(batch))
+            ids = [f"doc_{document_id}_chunk_{i}" for i in indexes]
+            metadatas = [
+                {
+                    "document_id": document_id,
+                    "filename": filename,
+                    "case_id": case_id,
+                    "chunk_index": i,
+                    "section": chunk.section
+                }
+                for i, chunk in zip(indexes, batch)
+            ]
+            
+            # Generate embeddings, reusing cached ones for previously seen chunks
+            embeddings = self.embed_texts(texts, version)
+            
+            with metrics.stage("vector_add"):
+                store.upsert(case_id, ids, embeddings, texts, metadatas)
+            if self.lexical_index is not None:
+                with metrics.stage("lexical_add"):
+                    self.lexical_index.add_chunks(case_id, document_id, ids, texts)
+            chunk_count += len(batch)
+        
+        elapsed = time.perf_counter() - started
+        metrics.observe_stage("extract", extract_seconds)
+        # Chunking pulls pages from extraction, so its own share is the difference
+        metrics.observe_stage("chunk", chunk_seconds - extract_seconds)
+        metrics.observe_stage("index_document", elapsed)
+        metrics.DOCUMENTS_INDEXED.inc()
+        metrics.TEXT_BYTES_INDEXED.inc(text_bytes)
+        metrics.CHUNKS_INDEXED.inc(chunk_count)
+        stats = {
+            "text_bytes": text_bytes,
+            "chunks": chunk_count,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(chunk_count / elapsed, 2) if elapsed > 0 else 0.0,
+            "text_mb_per_sec": round(text_bytes / 2**20 / elapsed, 3) if elapsed > 0 else 0.0
+        }
+        print(
+            f"Indexed document {document_id}: {text_bytes / 1024:.1f} KB of text, {chunk_count} chunks "
+            f"in {elapsed:.2f}s ({stats['chunks_per_sec']} chunks/s, {stats['text_mb_per_sec']} MB/s)"
+        )
+        embedding_cache = self._embedding_cache_for(version)
+        if embedding_cache is not None:
+            stats["embedding_cache"] = embedding_cache.stats()
+        return stats
+    
+    def index_documents(
+        self,
+        case_id: int,
+        documents: List[Tuple[int, str, str, Optional[str]]],
+        version: Optional[int] = None
+    ) -> Dict[int, Dict]:
+        """Index several small documents of a case, given as (document_id, file_path, filename, content_hash).
+        
+        Each document is extracted and chunked in full, then the chunks of all
+        of them are embedded and written in IMPORT_EMBEDDING_BATCH_SIZE
+        batches, so small files still make large embedding batches. Returns
+        the stats of each document.
+        """
+        if version is None:
+            version = self.get_case_versions(case_id)[1]
+        store = self.store(version)
+        started = time.perf_counter()
+        stats: Dict[int, Dict] = {}
+        records = []  # (document_id, chunk id, text, metadata)
+        for document_id, file_path, filename, content_hash in documents:
+            document_started = time.perf_counter()
+            with metrics.stage("extract"):
+                pages = list(iter_document_text(file_path, content_hash))
+            with metrics.stage("chunk"):
+                chunks = [chunk for chunk in self.iter_document_chunks(iter(pages), version) if chunk.text.strip()]
+            for i, chunk in enumerate(chunks):
+                records.append((
+                    document_id,
+                    f"doc_{document_id}_chunk_{i}",
+                    chunk.text,
+                    {
+                        "document_id": document_id,
+                        "filename": filename,
+                        "case_id": case_id,
+                        "chunk_index": i,
+                        "section": chunk.section
+                    }
+                ))
+            stats[document_id] = {
+                "text_bytes": sum(len(page.encode("utf-8")) for page in pages),
+                "chunks": len(chunks),
+                "seconds": time.perf_counter() - document_started
             }
-            for i in range(len(chunks))
-        ]
         
-        # Generate embeddings using sentence transformer
-        embeddings = self.embedding_model.encode(chunks, show_progress_bar=False).tolist()
+        write_started = time.perf_counter()
+        for batch in batched(records, settings.IMPORT_EMBEDDING_BATCH_SIZE):
+            texts = [text for _, _, text, _ in batch]
+            ids = [chunk_id for _, chunk_id, _, _ in batch]
+            embeddings = self.embed_texts(texts, version)
+            with metrics.stage("vector_add"):
+                store.upsert(case_id, ids, embeddings, texts, [metadata for _, _, _, metadata in batch])
+            if self.lexical_index is not None:
+                with metrics.stage("lexical_add"):
+                    by_document: Dict[int, List[Tuple[str, str]]] = {}
+                    for document_id, chunk_id, text, _ in batch:
+                        by_document.setdefault(document_id, []).append((chunk_id, text))
+                    for document_id, rows in by_document.items():
+                        self.lexical_index.add_chunks(
+                            case_id, document_id, [chunk_id for chunk_id, _ in rows], [text for _, text in rows]
+                        )
+        
+        # Embedding and writing time is shared by the documents in proportion to their chunks
+        write_seconds = time.perf_counter() - write_started
+        for document_stats in stats.values():
+            share = document_stats["chunks"] / len(records) if records else 0.0
+            document_stats["seconds"] = round(document_stats["seconds"] + write_seconds * share, 3)
+            metrics.observe_stage("index_document", document_stats["seconds"])
         
-        # Add to collection
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=metadatas
+        elapsed = time.perf_counter() - started
+        text_bytes = sum(document_stats["text_bytes"] for document_stats in stats.values())
+        metrics.DOCUMENTS_INDEXED.inc(len(stats))
+        metrics.TEXT_BYTES_INDEXED.inc(text_bytes)
+        metrics.CHUNKS_INDEXED.inc(len(records))
+        print(
+            f"Indexed {len(stats)} documents: {text_bytes / 1024:.1f} KB of text, {len(records)} chunks "
+            f"in {elapsed:.2f}s ({len(records) / elapsed if elapsed > 0 else 0:.2f} chunks/s)"
         )
+        return stats
     
-    def query(self, case_id: int, query: str, top_k: int = 5) -> Dict:
-        """Query documents for a specific case"""
-        if not self.gemini_model:
-            raise ValueError("Google API key not configured")
+    def copy_document_vectors(
+        self,
+        source_case_id: int,
+        source_document_id: int,
+        case_id: int,
+        document_id: int,
+        filename: str,
+        version: Optional[int] = None
+    ) -> int:
+        """Copy an indexed document's chunk vectors into another document, without re-embedding.
+        
+        Returns the number of chunks copied (0 if the source has none, or its
+        case is served by an index version embedded with another model).
+        """
+        source_version = self.get_case_versions(source_case_id)[1]
+        if version is None:
+            version = self.get_case_versions(case_id)[1]
+        if self.version_model(source_version) != self.version_model(version):
+            return 0
+        source_store, store = self.store(source_version), self.store(version)
+        copied = 0
+        batch_size = 500
+        while True:
+            source_ids, embeddings, documents, source_metadatas = source_store.get_document(
+                source_case_id, source_document_id, limit=batch_size, offset=copied
+            )
+            if not source_ids:
+                break
+            
+            metadatas = [
+                {**meta, "document_id": document_id, "filename": filename, "case_id": case_id}
+                for meta in source_metadatas
+            ]
+            ids = [f"doc_{document_id}_chunk_{meta['chunk_index']}" for meta in metadatas]
+            store.upsert(case_id, ids, embeddings, documents, metadatas)
+            if self.lexical_index is not None:
+                self.lexical_index.add_chunks(case_id, document_id, ids, documents)
+            copied += len(source_ids)
+            if len(source_ids) < batch_size:
+                break
+        return copied
+    
+    def delete_document_index(self, case_id: int, document_id: int) -> int:
+        """Remove a document's chunks from the vector store and the lexical index.
+        
+        Every index version in use is cleaned, so a version being built
+        doesn't bring the document back when the case switches to it.
+        """
+        deleted = sum(self.store(version).delete_document(case_id, document_id) for version in self.live_versions())
+        if self.lexical_index is not None:
+            self.lexical_index.delete_document(case_id, document_id)
+        return deleted
+    
+    def delete_case_index(self, case_id: int) -> int:
+        """Remove all of a case's chunks from the vector store, in every index version, and the lexical index"""
+        deleted = sum(self.store(version).delete_case(case_id) for version in self.live_versions())
+        if self.lexical_index is not None:
+            self.lexical_index.delete_case(case_id)
+        return deleted
+    
+    def _version_stores(self, versions: List[int]) -> List[VectorStore]:
+        """One store per location: Chroma keeps all versions in one client, NumPy each in its own directory"""
+        stores: Dict[str, VectorStore] = {}
+        for version in versions:
+            stores.setdefault(str(self.store(version).path), self.store(version))
+        return list(stores.values())
+    
+    def index_report(self, db: Session) -> Dict:
+        """Per-case chunk counts, chunks of deleted cases or documents (orphans) and disk usage.
+        
+        Cases are listed once per index version holding chunks of theirs. A
+        case is ``stale`` in a version that neither serves it nor is being
+        built, e.g. left behind by an interrupted re-embedding.
+        """
+        case_titles = dict(db.query(Case.id, Case.title).all())
+        case_versions = {case_id: version or 1 for case_id, version in db.query(Case.id, Case.embedding_version)}
+        building = index_versions.building_version(db)
+        versions = index_versions.live_versions(db)
+        cases = []
+        totals = {"cases": 0, "vectors": 0, "orphaned_vectors": 0}
+        for version in versions:
+            store = self.store(version)
+            for case_id in store.case_ids():
+                counts = store.document_counts(case_id)
+                document_ids = {
+                    document_id for document_id, in
+                    db.query(Document.id).filter(Document.case_id == case_id, Document.id.in_(list(counts)))
+                } if case_id in case_titles else set()
+                orphaned = sorted(document_id for document_id in counts if document_id not in document_ids)
+                entry = {
+                    "case_id": case_id,
+                    "title": case_titles.get(case_id),
+                    "version": version,
+                    "stale": (
+                        case_id in case_titles and case_versions[case_id] != version
+                        and (building is None or building.version != version)
+                    ),
+                    "vectors": sum(counts.values()),
+                    "documents": len(counts),
+                    "orphaned_vectors": sum(counts[document_id] for document_id in orphaned),
+                    "orphaned_documents": orphaned
+                }
+                cases.append(entry)
+                totals["cases"] += 1
+                totals["vectors"] += entry["vectors"]
+                totals["orphaned_vectors"] += entry["orphaned_vectors"]
+        
+        disk_bytes = 0
+        tombstones: Dict[str, int] = {}
+        for store in self._version_stores(versions):
+            store_stats = store.stats()
+            disk_bytes += store_stats["disk_bytes"]
+            tombstones.update(store_stats["tombstones"])
+        disk = {"vector_store": disk_bytes}
+        if self.lexical_index is not None:
+            disk["lexical_index"] = self.lexical_index.disk_size()
+        return {
+            "backend": settings.VECTOR_STORE,
+            "versions": versions,
+            "disk_bytes": disk,
+            "tombstones": tombstones,
+            "totals": totals,
+            "cases": cases
+        }
+    
+    def compact_index(self, db: Session) -> Dict:
+        """Purge orphaned chunks, then reclaim the space of deleted ones.
+        
+        Orphans are left behind when a deletion fails, or when a document is
+        deleted while a worker is still indexing it.
+        """
+        purged = 0
+        report = self.index_report(db)
+        for case in report["cases"]:
+            if case["title"] is None:
+                purged += self.delete_case_index(case["case_id"])
+                continue
+            if case["stale"]:
+                # The global index of that version may still serve cross-case search
+                purged += self.vector_store.versioned(case["version"], global_index=False).delete_case(case["case_id"])
+                continue
+            for document_id in case["orphaned_documents"]:
+                purged += self.delete_document_index(case["case_id"], document_id)
         
-        collection_name = self.get_collection_name(case_id)
+        if self.lexical_index is not None:
+            # Lexical entries can outlive their vectors the same way
+            case_ids = {case_id for case_id, in db.query(Case.id)}
+            for case_id in self.lexical_index.case_ids():
+                if case_id not in case_ids:
+                    self.lexical_index.delete_case(case_id)
+                    continue
+                document_ids = self.lexical_index.document_ids(case_id)
+                existing = {
+                    document_id for document_id, in
+                    db.query(Document.id).filter(Document.id.in_(document_ids))
+                }
+                for document_id in document_ids:
+                    if document_id not in existing:
+                        self.lexical_index.delete_document(case_id, document_id)
+        
+        reclaimed: Dict[str, int] = {}
+        disk_bytes = 0
+        for store in self._version_stores(report["versions"]):
+            reclaimed.update(store.compact(settings.COMPACTION_MIN_DELETED_RATIO))
+            disk_bytes += store.stats()["disk_bytes"]
+        if self.lexical_index is not None:
+            self.lexical_index.vacuum()
+        return {"purged_orphans": purged, "reclaimed": reclaimed, "disk_bytes": disk_bytes}
+    
+    def embed_query(self, query: str, version: Optional[int] = None) -> List[float]:
+        """Embed a chat question, reusing the embedding of an identical earlier question"""
+        return self.embed_queries([query], version)[0]
+    
+    def embed_queries(self, queries: List[str], version: Optional[int] = None) -> List[List[float]]:
+        """Embed several questions with ``version``'s model, in one call for those not embedded before"""
+        model_key = self.version_model(version)
+        texts = [normalize_text(query) for query in queries]
+        embeddings = [self.query_embedding_cache.get((model_key, text)) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            model = self.load_embedding_model(*model_key)
+            with metrics.stage("embed_query"):
+                encoded = embedding_backends.encode(model, missing)
+            found = dict(zip(missing, encoded.tolist()))
+            for text, embedding in found.items():
+                self.query_embedding_cache.put((model_key, text), embedding)
+            embeddings = [found[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+        return embeddings
+    
+    def get_case_versions(self, case_id: int) -> Tuple[int, int]:
+        """(index version, embedding version) of a case.
+        
+        The index version is bumped whenever the case's indexed documents
+        change; the embedding version is the index version serving it.
+        """
+        db = SessionLocal()
         try:
-            collection = self.chroma_client.get_collection(name=collection_name)
-        except:
-            # No documents indexed for this case
-            return {
-                "response": "Bu dava için henüz doküman yüklenmemiş veya indekslenmemiş. Lütfen önce doküman yükleyin.",
-                "sources": [],
-                "relevant_chunks": []
-            }
+            versions = db.query(Case.index_version, Case.embedding_version).filter(Case.id == case_id).first()
+        finally:
+            db.close()
+        if versions is None:
+            return 0, 1
+        return versions[0] or 0, versions[1] or 1
+    
+    def retrieve(self, case_id: int, query: str, top_k: int = 5) -> Optional[Dict]:
+        """Find the chunks of a case most relevant to a query.
+        
+        Results are cached per case index version, so they are reused until a
+        document of the case is indexed or deleted. Returns None if the case has
+        no indexed documents.
+        """
+        index_version, embedding_version = self.get_case_versions(case_id)
+        cache_key = (case_id, normalize_text(query), top_k, index_version, embedding_version)
+        cached = self.retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
+        if self.lexical_index is None:
+            result = self._vector_search(case_id, query, top_k, embedding_version)
+        else:
+            result = self._hybrid_search(case_id, query, top_k, embedding_version)
+        if result is None:
+            return None
+        retrieval = self._retrieval(result, index_version, embedding_version)
+        self.retrieval_cache.put(cache_key, retrieval)
+        return retrieval
+    
+    def retrieve_many(self, case_id: int, queries: List[str], top_k: int = 5) -> Optional[List[Dict]]:
+        """``retrieve`` for several queries of one case.
+        
+        Queries missing from the retrieval cache are embedded in one model call
+        and searched with one multi-query vector store lookup. Returns None if
+        the case has no indexed documents.
+        """
+        index_version, embedding_version = self.get_case_versions(case_id)
+        cache_keys = [
+            (case_id, normalize_text(query), top_k, index_version, embedding_version) for query in queries
+        ]
+        retrievals = [self.retrieval_cache.get(cache_key) for cache_key in cache_keys]
+        missing = [i for i, retrieval in enumerate(retrievals) if retrieval is None]
+        if not missing:
+            return retrievals
+        
+        missing_queries = [queries[i] for i in missing]
+        embeddings = self.embed_queries(missing_queries, embedding_version)
+        if self.lexical_index is None:
+            results = self._vector_search_many(case_id, embeddings, top_k, embedding_version)
+        else:
+            depth = top_k * settings.HYBRID_CANDIDATES
+            vector_future = self._search_pool.submit(
+                contextvars.copy_context().run, self._vector_search_many, case_id, embeddings, depth, embedding_version
+            )
+            with metrics.stage("lexical_query"):
+                lexical_rankings = [
+                    [chunk_id for chunk_id, _ in self.lexical_index.search(case_id, query, depth)]
+                    for query in missing_queries
+                ]
+            vector_results = vector_future.result()
+            results = None if vector_results is None else [
+                self._fuse(case_id, vector_result, lexical_ids, top_k, embedding_version)
+                for vector_result, lexical_ids in zip(vector_results, lexical_rankings)
+            ]
+        if results is None:
+            return None
+        
+        for i, result in zip(missing, results):
+            retrievals[i] = self._retrieval(result, index_version, embedding_version)
+            self.retrieval_cache.put(cache_keys[i], retrievals[i])
+        return retrievals
+    
+    def _retrieval(self, result: QueryResult, index_version: int, embedding_version: int) -> Dict:
+        ids, relevant_chunks, metadatas, embeddings, scores = result
+        return {
+            "ids": ids,
+            "relevant_chunks": relevant_chunks,
+            "metadatas": metadatas,
+            # Stored chunk embeddings (float32 rows) and cosine similarities to the query,
+            # None for chunks only the lexical search found
+            "embeddings": embeddings,
+            "scores": scores,
+            "sources": self._sources(metadatas),
+            "index_version": index_version,
+            "embedding_version": embedding_version,
+            # Identifies the retrieved chunk set, independent of ranking order
+            "retrieval_key": hashlib.sha1("\n".join(sorted(ids)).encode("utf-8")).hexdigest()
+        }
+    
+    def _sources(self, metadatas: List[Dict]) -> List[str]:
+        # Get unique source filenames
+        return list(set([meta.get("filename", "Unknown") for meta in metadatas]))
+    
+    def _vector_search(self, case_id: int, query: str, top_k: int, version: int) -> Optional[QueryResult]:
         # Generate query embedding
-        query_embedding = self.embedding_model.encode([query], show_progress_bar=False)[0].tolist()
+        query_embedding = self.embed_query(query, version)
         
-        # Search
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
+        # Search, None if the case has no index
+        with metrics.stage("vector_query"):
+            return self.store(version).query(case_id, query_embedding, top_k)
+    
+    def _vector_search_many(
+        self, case_id: int, embeddings: List[List[float]], top_k: int, version: int
+    ) -> Optional[List[QueryResult]]:
+        with metrics.stage("vector_query"):
+            return self.store(version).query_many(case_id, embeddings, top_k)
+    
+    def _hybrid_search(self, case_id: int, query: str, top_k: int, version: int) -> Optional[QueryResult]:
+        """Fuse vector and BM25 rankings with reciprocal-rank fusion"""
+        depth = top_k * settings.HYBRID_CANDIDATES
+        # Both searches are independent, so run the vector search alongside the lexical one
+        # (in a copy of this context, so its stage timings count towards the current request)
+        vector_future = self._search_pool.submit(
+            contextvars.copy_context().run, self._vector_search, case_id, query, depth, version
         )
+        with metrics.stage("lexical_query"):
+            lexical_ids = [chunk_id for chunk_id, _ in self.lexical_index.search(case_id, query, depth)]
+        vector_result = vector_future.result()
+        if vector_result is None:
+            return None
+        return self._fuse(case_id, vector_result, lexical_ids, top_k, version)
+    
+    def _fuse(
+        self, case_id: int, vector_result: QueryResult, lexical_ids: List[str], top_k: int, version: int
+    ) -> QueryResult:
+        vector_ids, vector_chunks, vector_metadatas, vector_embeddings, vector_scores = vector_result
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=settings.RRF_K)[:top_k]
+        found = {
+            chunk_id: (chunk, meta, embedding, score)
+            for chunk_id, chunk, meta, embedding, score in zip(
+                vector_ids, vector_chunks, vector_metadatas, vector_embeddings, vector_scores
+            )
+        }
+        missing = [chunk_id for chunk_id in fused if chunk_id not in found]
+        if missing:
+            # Lexical-only hits: fetch their text, metadata and stored embedding from the vector store
+            store = self.store(version)
+            embeddings = store.get_embeddings(case_id, missing)
+            for chunk_id, chunk, meta in zip(*store.get(case_id, missing)):
+                if chunk_id in embeddings:
+                    found[chunk_id] = (chunk, meta, embeddings[chunk_id], None)
         
-        # Get relevant chunks and sources
-        relevant_chunks = results["documents"][0] if results["documents"] else []
-        metadatas = results["metadatas"][0] if results["metadatas"] else []
+        # Lexical entries of chunks no longer in the vector store are dropped here
+        ids = [chunk_id for chunk_id in fused if chunk_id in found]
+        embeddings = np.asarray([found[chunk_id][2] for chunk_id in ids], dtype=np.float32)
+        return (
+            ids,
+            [found[chunk_id][0] for chunk_id in ids],
+            [found[chunk_id][1] for chunk_id in ids],
+            embeddings.reshape(len(ids), vector_embeddings.shape[1] if not ids else -1),
+            [found[chunk_id][3] for chunk_id in ids]
+        )
+    
+    def search_case(self, case_id: int, query: str, top_k: int = 5) -> Optional[List[Dict]]:
+        """Retrieval only: a case's chunks ranked for a query, without generating an answer.
         
-        # Get unique source filenames
-        sources = list(set([meta.get("filename", "Unknown") for meta in metadatas]))
+        Each hit carries the chunk id, text, metadata and ``score``, the cosine
+        similarity of the query and the chunk as computed by the vector store,
+        or None for a chunk only the BM25 search found. Hits keep the retrieval
+        order, which with hybrid search also weighs the BM25 ranking, so scores
+        need not be descending. Returns None if the case has no indexed documents.
+        """
+        retrieval = self.retrieve(case_id, query, top_k)
+        if retrieval is None:
+            return None
+        return [
+            {
+                "chunk_id": chunk_id,
+                "text": chunk,
+                "metadata": meta,
+                "score": round(score, 4) if score is not None else None
+            }
+            for chunk_id, chunk, meta, score in zip(
+                retrieval["ids"], retrieval["relevant_chunks"], retrieval["metadatas"], retrieval["scores"]
+            )
+        ]
+    
+    def search_cases(self, query: str, top_k: int = 10, case_ids: Optional[List[int]] = None) -> SearchResult:
+        """Find the chunks most relevant to a query across all cases, or only ``case_ids``.
         
-        # Generate response using Gemini
+        A single query against the global index, however many cases there are.
+        It is the global index of the version new cases start on; while a
+        re-embedding runs, that is still the previous one.
+        """
+        db = SessionLocal()
+        try:
+            version = index_versions.default_version(db)
+        finally:
+            db.close()
+        embedding = self.embed_query(query, version)
+        with metrics.stage("vector_search"):
+            return self.store(version).search(embedding, top_k, case_ids)
+    
+    def find_cached_answer(
+        self,
+        db: Session,
+        case_id: int,
+        question_embedding: List[float],
+        retrieval: Dict
+    ) -> Optional[ChatMessage]:
+        """Find an earlier answer to a near-identical question over the same retrieved chunks.
+        
+        Only messages answered against the current case index version are
+        considered, so the cache is invalidated whenever the case's documents change.
+        """
+        candidates = (
+            db.query(ChatMessage)
+            .filter(
+                ChatMessage.case_id == case_id,
+                ChatMessage.index_version == retrieval["index_version"],
+                ChatMessage.retrieval_key == retrieval["retrieval_key"],
+                ChatMessage.question_embedding.isnot(None)
+            )
+            .order_by(ChatMessage.id.desc())
+            .limit(settings.ANSWER_CACHE_LOOKBACK)
+            .all()
+        )
+        if not candidates:
+            return None
+        
+        matrix = np.stack([np.frombuffer(msg.question_embedding, dtype=np.float32) for msg in candidates])
+        question = np.asarray(question_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(question)
+        similarities = matrix @ question / np.maximum(norms, 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= settings.ANSWER_CACHE_THRESHOLD:
+            return candidates[best]
+        return None
+    
+    def cache_stats(self) -> Dict:
+        return {
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+            "query_embedding_cache": self.query_embedding_cache.stats(),
+            "retrieval_cache": self.retrieval_cache.stats()
+        }
+    
+    def retrieval_depth(self, top_k: int) -> int:
+        """Chunks to retrieve for a chat answer using ``top_k`` chunks, leaving room for context packing"""
+        return top_k * settings.CONTEXT_CANDIDATES if settings.CONTEXT_PACKING_ENABLED else top_k
+    
+    def build_context(self, retrieval: Dict, question_embedding: List[float], top_k: int) -> Dict:
+        """Choose the chunks sent to Gemini from the retrieved ones.
+        
+        With context packing, adjacent chunks are merged without their
+        overlap, near-duplicates are dropped and the rest is diversified with
+        MMR and packed into CONTEXT_MAX_TOKENS. ``tokens_saved`` compares
+        against joining the top ``top_k`` chunks verbatim.
+        """
+        chunks = retrieval["relevant_chunks"]
+        metadatas = retrieval["metadatas"]
+        if not settings.CONTEXT_PACKING_ENABLED or not chunks:
+            return {
+                "chunks": chunks[:top_k],
+                "sources": self._sources(metadatas[:top_k]),
+                "tokens": None,
+                "tokens_saved": 0
+            }
+        
+        version = retrieval["embedding_version"]
+        with metrics.stage("context_packing"):
+            # The chunks' stored embeddings, returned by the vector search
+            packed = pack_context(
+                chunks,
+                metadatas,
+                retrieval["embeddings"],
+                lambda text: self.count_tokens(text, version),
+                settings.CONTEXT_MAX_TOKENS,
+                mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+                duplicate_threshold=settings.CONTEXT_DUPLICATE_THRESHOLD,
+                baseline_chunks=top_k
+            )
+        metrics.CONTEXT_TOKENS.labels("packed").inc(packed.tokens)
+        metrics.CONTEXT_TOKENS.labels("baseline").inc(packed.baseline_tokens)
+        return {
+            "chunks": packed.chunks,
+            "sources": self._sources(packed.metadatas),
+            "tokens": packed.tokens,
+            "tokens_saved": packed.baseline_tokens - packed.tokens
+        }
+    
+    def build_prompt(self, query: str, relevant_chunks: List[str]) -> str:
+        """Build the Gemini prompt for a chat question"""
         context = "\n\n".join(relevant_chunks)
         prompt = f"""Aşağıdaki yasal dokümanlardan sadece verilen bilgilere dayanarak soruyu yanıtla. 
 Eğer sorunun cevabı dokümanlarda yoksa, "Bu bilgi yüklenen dokümanlarda bulunmamaktadır" de.
@@ -157,28 +936,171 @@ Soru: {query}
 Yanıt:"""
         
         system_prompt = "Sen bir yasal asistanısın. Sadece verilen dokümanlardaki bilgilere dayanarak yanıt ver."
-        full_prompt = f"{system_prompt}\n\n{prompt}"
-        
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.3,
-        )
+        return f"{system_prompt}\n\n{prompt}"
+    
+    def prepare_query(
+        self,
+        case_id: int,
+        query: str,
+        top_k: int = 5,
+        db: Optional[Session] = None,
+        use_cache: bool = False
+    ) -> Dict:
+        """Do all the work of a chat query that comes before generation.
         
-        response = self.gemini_model.generate_content(
-            full_prompt,
-            generation_config=generation_config
-        )
+        If the returned ``response`` is None the answer still has to be
+        generated from ``prompt``; otherwise it is final (no indexed documents,
+        or an answer reused from the semantic answer cache).
+        """
+        retrieval = self.retrieve(case_id, query, self.retrieval_depth(top_k))
+        if retrieval is None:
+            return self._no_documents_result()
+        question_embedding = self.embed_query(query, retrieval["embedding_version"])
+        return self._prepare(case_id, query, retrieval, question_embedding, top_k, db, use_cache)
+    
+    def prepare_queries(
+        self,
+        case_id: int,
+        queries: List[str],
+        top_k: int = 5,
+        db: Optional[Session] = None,
+        use_cache: bool = False
+    ) -> List[Dict]:
+        """``prepare_query`` for several questions, with one embedding call and one vector search"""
+        retrievals = self.retrieve_many(case_id, queries, self.retrieval_depth(top_k))
+        if retrievals is None:
+            return [self._no_documents_result() for _ in queries]
+        # Already embedded (and cached) by retrieve_many, unless all retrievals were cached
+        embeddings = self.embed_queries(queries, retrievals[0]["embedding_version"])
+        return [
+            self._prepare(case_id, query, retrieval, embedding, top_k, db, use_cache)
+            for query, retrieval, embedding in zip(queries, retrievals, embeddings)
+        ]
+    
+    def _no_documents_result(self) -> Dict:
+        return {
+            "response": "Bu dava için henüz doküman yüklenmemiş veya indekslenmemiş. Lütfen önce doküman yükleyin.",
+            "sources": [],
+            "relevant_chunks": [],
+            "cached": False
+        }
+    
+    def _prepare(
+        self,
+        case_id: int,
+        query: str,
+        retrieval: Dict,
+        question_embedding: List[float],
+        top_k: int,
+        db: Optional[Session],
+        use_cache: bool
+    ) -> Dict:
+        answer_cache = {
+            "question_embedding": np.asarray(question_embedding, dtype=np.float32).tobytes(),
+            "retrieval_key": retrieval["retrieval_key"],
+            "index_version": retrieval["index_version"]
+        }
+        if use_cache and db is not None:
+            with metrics.stage("answer_cache"):
+                cached = self.find_cached_answer(db, case_id, question_embedding, retrieval)
+            if cached is not None:
+                return {
+                    "response": cached.response,
+                    "sources": json.loads(cached.sources) if cached.sources else [],
+                    "relevant_chunks": retrieval["relevant_chunks"][:top_k],
+                    "cached": True,
+                    "answer_cache": answer_cache
+                }
         
+        context = self.build_context(retrieval, question_embedding, top_k)
+        with metrics.stage("prompt_build"):
+            prompt = self.build_prompt(query, context["chunks"])
         return {
-            "response": response.text,
-            "sources": sources,
-            "relevant_chunks": relevant_chunks
+            "response": None,
+            "prompt": prompt,
+            "sources": context["sources"],
+            "relevant_chunks": context["chunks"],
+            "context_tokens": context["tokens"],
+            "tokens_saved": context["tokens_saved"],
+            "cached": False,
+            "answer_cache": answer_cache
         }
     
-    def generate_template(self, case_id: int, template_type: str, db: Session, context: Optional[str] = None) -> Dict:
-        """Generate a template (dilekçe, sözleşme, tutanak) based on case documents"""
+    def query(
+        self,
+        case_id: int,
+        query: str,
+        top_k: int = 5,
+        db: Optional[Session] = None,
+        use_cache: bool = False
+    ) -> Dict:
+        """Query documents for a specific case.
+        
+        With ``use_cache`` (and a ``db`` session) a stored answer to a
+        near-identical question is returned instead of calling Gemini. The
+        result's ``answer_cache`` entry holds the ChatMessage columns needed to
+        make this answer reusable later.
+        """
         if not self.gemini_model:
             raise ValueError("Google API key not configured")
         
+        result = self.prepare_query(case_id, query, top_k, db=db, use_cache=use_cache)
+        if result["response"] is None:
+            # Generate response using Gemini
+            with metrics.stage("llm"):
+                response = self.gemini_model.generate_content(
+                    result.pop("prompt"),
+                    generation_config=self.generation_config(0.3)
+                )
+            result["response"] = response.text
+        return result
+    
+    async def generate_answer(self, prompt: str, temperature: float = 0.3) -> str:
+        """Generate a chat answer (or a template draft) from Gemini without blocking a thread"""
+        if not self.gemini_model:
+            raise ValueError("Google API key not configured")
+        
+        with metrics.stage("llm"):
+            response = await self.gemini_model.generate_content_async(
+                prompt,
+                generation_config=self.generation_config(temperature)
+            )
+        return response.text
+    
+    async def stream_answer(self, prompt: str) -> AsyncIterator[str]:
+        """Stream a chat answer from Gemini token by token without blocking a thread"""
+        if not self.gemini_model:
+            raise ValueError("Google API key not configured")
+        
+        started = time.perf_counter()
+        first_token = True
+        with metrics.stage("llm"):
+            response = await self.gemini_model.generate_content_async(
+                prompt,
+                generation_config=self.generation_config(0.3),
+                stream=True
+            )
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. only safety ratings)
+                    continue
+                if text:
+                    if first_token:
+                        metrics.observe_stage("llm_first_token", time.perf_counter() - started)
+                        first_token = False
+                    yield text
+    
+    def prepare_templates(
+        self, case_id: int, template_types: List[str], db: Session, context: Optional[str] = None
+    ) -> Dict:
+        """Build the Gemini prompts of template drafts (dilekçe, sözleşme, tutanak) for a case.
+        
+        The documents are searched once for ``context``, retrieval only, and
+        the chunks found are shared by all drafts. Returns {"prompts": {template
+        type: prompt}, "sources": filenames of the case's documents}.
+        """
         # Get case information
         case = db.query(Case).filter(Case.id == case_id).first()
         if not case:
@@ -187,10 +1109,20 @@ Yanıt:"""
         # Get relevant context from documents
         case_context = ""
         if context:
-            # Query documents for relevant information
-            query_result = self.query(case_id, context, top_k=3)
-            case_context = "\n\n".join(query_result["relevant_chunks"][:2])
+            hits = self.search_case(case_id, context, top_k=3) or []
+            case_context = "\n\n".join(hit["text"] for hit in hits[:2])
         
+        prompts = {
+            template_type: self._template_prompt(case, template_type, case_context) for template_type in template_types
+        }
+        
+        # Get sources from case documents
+        documents = db.query(Document).filter(Document.case_id == case_id).all()
+        sources = [doc.filename for doc in documents]
+        
+        return {"prompts": prompts, "sources": sources}
+    
+    def _template_prompt(self, case: Case, template_type: str, case_context: str) -> str:
         # Generate template based on type
         template_prompts = {
             "dilekce": f"""Aşağıdaki dava bilgilerine göre bir dilekçe taslağı hazırla:
@@ -232,24 +1164,30 @@ Tutanak taslağını Türk hukuk sistemine uygun, detaylı ve profesyonel bir di
         
         prompt = template_prompts.get(template_type.lower(), template_prompts["dilekce"])
         
-        full_prompt = f"Sen bir yasal doküman hazırlama uzmanısın. Türk hukuk sistemine uygun, profesyonel dokümanlar hazırlarsın.\n\n{prompt}"
+        return f"Sen bir yasal doküman hazırlama uzmanısın. Türk hukuk sistemine uygun, profesyonel dokümanlar hazırlarsın.\n\n{prompt}"
+    
+    async def generate_template_draft(self, prompt: str) -> str:
+        """Generate a draft from a ``prepare_templates`` prompt without blocking a thread"""
+        return await self.generate_answer(prompt, temperature=0.5)
+    
+    def generate_template(self, case_id: int, template_type: str, db: Session, context: Optional[str] = None) -> Dict:
+        """Generate a template (dilekçe, sözleşme, tutanak) based on case documents"""
+        if not self.gemini_model:
+            raise ValueError("Google API key not configured")
         
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.5,
-        )
+        prepared = self.prepare_templates(case_id, [template_type], db, context)
         
-        response = self.gemini_model.generate_content(
-            full_prompt,
-            generation_config=generation_config
-        )
+        generation_config = self.generation_config(0.5)
         
-        # Get sources from case documents
-        documents = db.query(Document).filter(Document.case_id == case_id).all()
-        sources = [doc.filename for doc in documents]
+        with metrics.stage("llm"):
+            response = self.gemini_model.generate_content(
+                prepared["prompts"][template_type],
+                generation_config=generation_config
+            )
         
         return {
             "draft": response.text,
-            "sources": sources
+            "sources": prepared["sources"]
         }
 
 # Singleton instance
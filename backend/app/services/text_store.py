@@ -0,0 +1,217 @@
+"""Extracted text of documents, stored next to their uploads.
+
+Parsing PDFs and DOCX files is the slowest CPU step of indexing, so the text
+is extracted once and kept in a compressed file beside the original. Later
+passes (re-indexing after a chunker or model change, retried jobs) read it
+back through mmap instead of parsing the original again. The store records
+the SHA-256 of the file it was extracted from and is only used while that
+still matches.
+
+Layout: a header (magic, source SHA-256), zlib frames that each hold whole
+segments (pages, paragraphs or text blocks), then an index of the frames and
+of every segment's offset in the uncompressed UTF-8 text, and a footer
+pointing at the index. Segments can be read one at a time, decompressing
+only their frame.
+"""
+import bisect
+import mmap
+import os
+import struct
+import uuid
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Optional
+from app.config import settings
+from app.services import metrics
+from app.services.ingestion import extract_segments, iter_text_segments
+from app.services.uploads import hash_file
+
+MAGIC = b"AVTXTZ01"
+HEADER = struct.Struct("<8s32s")  # magic, SHA-256 of the source file
+FRAME = struct.Struct("<QIQ")  # file offset, compressed size, offset in the text
+FOOTER = struct.Struct("<QII8s")  # index offset, frame count, segment count, magic
+OFFSET = struct.Struct("<Q")
+
+
+def store_path(file_path: str) -> Path:
+    path = Path(file_path)
+    return path.with_name(f".{path.name}.txtz")
+
+
+class TextStore:
+    """Read-only view of a stored document text"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+        try:
+            magic, self.source_hash = HEADER.unpack_from(self._mmap, 0)
+            index_offset, frame_count, segment_count, footer_magic = FOOTER.unpack_from(
+                self._mmap, len(self._mmap) - FOOTER.size
+            )
+            if magic != MAGIC or footer_magic != MAGIC:
+                raise ValueError(f"{path} is not a text store")
+            self._frames = [
+                FRAME.unpack_from(self._mmap, index_offset + i * FRAME.size) for i in range(frame_count)
+            ]
+            offsets_start = index_offset + frame_count * FRAME.size
+            self._offsets = [
+                OFFSET.unpack_from(self._mmap, offsets_start + i * OFFSET.size)[0] for i in range(segment_count + 1)
+            ]
+        except (struct.error, ValueError):
+            self.close()
+            raise
+        self._frame_starts = [text_offset for _, _, text_offset in self._frames]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __enter__(self) -> "TextStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def _frame_text(self, frame: int) -> bytes:
+        file_offset, size, _ = self._frames[frame]
+        return zlib.decompress(self._mmap[file_offset:file_offset + size])
+
+    def segment(self, index: int) -> str:
+        """One page, paragraph or text block, decompressing only the frame that holds it"""
+        start, end = self._offsets[index], self._offsets[index + 1]
+        frame = bisect.bisect_right(self._frame_starts, start) - 1
+        frame_start = self._frame_starts[frame]
+        return self._frame_text(frame)[start - frame_start:end - frame_start].decode("utf-8")
+
+    def iter_segments(self) -> Iterator[str]:
+        """All segments in order, holding one decompressed frame at a time"""
+        segment = 0
+        for frame in range(len(self._frames)):
+            data = self._frame_text(frame)
+            frame_start = self._frame_starts[frame]
+            frame_end = frame_start + len(data)
+            while segment < len(self) and self._offsets[segment + 1] <= frame_end:
+                start, end = self._offsets[segment], self._offsets[segment + 1]
+                yield data[start - frame_start:end - frame_start].decode("utf-8")
+                segment += 1
+        # Empty segments after the last frame
+        for _ in range(segment, len(self)):
+            yield ""
+
+
+class TextStoreWriter:
+    """Write a text store segment by segment; it only replaces ``path`` once finished"""
+
+    def __init__(self, path: Path, source_hash: str):
+        self.path = path
+        self._temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        self._file = open(self._temp_path, "wb")
+        self._file.write(HEADER.pack(MAGIC, bytes.fromhex(source_hash)))
+        self._frame_bytes = settings.TEXT_STORE_FRAME_KB * 1024
+        self._frames: List[tuple] = []
+        self._offsets: List[int] = [0]
+        self._pending = bytearray()
+        self._pending_start = 0
+
+    def add(self, segment: str):
+        data = segment.encode("utf-8")
+        self._pending += data
+        self._offsets.append(self._offsets[-1] + len(data))
+        # Frames end on segment boundaries, so a segment never spans two frames
+        if len(self._pending) >= self._frame_bytes:
+            self._flush_frame()
+
+    def _flush_frame(self):
+        if not self._pending:
+            return
+        compressed = zlib.compress(bytes(self._pending), settings.TEXT_STORE_COMPRESSION_LEVEL)
+        self._frames.append((self._file.tell(), len(compressed), self._pending_start))
+        self._file.write(compressed)
+        self._pending_start += len(self._pending)
+        self._pending.clear()
+
+    def finish(self):
+        self._flush_frame()
+        index_offset = self._file.tell()
+        for frame in self._frames:
+            self._file.write(FRAME.pack(*frame))
+        for offset in self._offsets:
+            self._file.write(OFFSET.pack(offset))
+        self._file.write(FOOTER.pack(index_offset, len(self._frames), len(self._offsets) - 1, MAGIC))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self._temp_path.unlink(missing_ok=True)
+
+
+def open_store(file_path: str, content_hash: str) -> Optional[TextStore]:
+    """The stored text of a file, if it was extracted from content with this hash"""
+    path = store_path(file_path)
+    if not path.exists():
+        return None
+    try:
+        store = TextStore(path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Warning: Ignoring unreadable text store {path}: {e}")
+        return None
+    if store.source_hash != bytes.fromhex(content_hash):
+        store.close()
+        return None
+    return store
+
+
+def iter_document_text(file_path: str, content_hash: Optional[str] = None) -> Iterator[str]:
+    """Yield a document's text segments, from its text store when it is current.
+
+    Otherwise the original is parsed and the store written on the way; it is
+    only kept if extraction ran to the end. ``content_hash`` is the file's
+    SHA-256, computed here when not given.
+    """
+    if not settings.TEXT_STORE_ENABLED:
+        yield from iter_text_segments(file_path)
+        return
+
+    if content_hash is None:
+        try:
+            content_hash = hash_file(Path(file_path))
+        except OSError as e:
+            print(f"Error extracting text from {file_path}: {e}")
+            return
+    store = open_store(file_path, content_hash)
+    if store is not None:
+        metrics.TEXT_STORE_READS.labels("hit").inc()
+        with store:
+            yield from store.iter_segments()
+        return
+
+    metrics.TEXT_STORE_READS.labels("miss").inc()
+    writer = TextStoreWriter(store_path(file_path), content_hash)
+    completed = False
+    try:
+        for segment in extract_segments(file_path):
+            writer.add(segment)
+            yield segment
+        completed = True
+    except Exception as e:
+        print(f"Error extracting text from {file_path}: {e}")
+    finally:
+        # Also reached when the consumer stops early
+        if completed:
+            writer.finish()
+        else:
+            writer.abort()
+
+
+def delete_store(file_path: str):
+    store_path(file_path).unlink(missing_ok=True)
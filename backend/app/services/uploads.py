@@ -0,0 +1,301 @@
+"""Streaming uploads: request size limits, multipart uploads and resumable, chunked uploads.
+
+Multipart uploads are parsed from the request stream and written straight to
+their temporary file, instead of being spooled by the framework and copied.
+Resumable uploads are appended to a partial file chunk by chunk. The SHA-256
+is computed while chunks are written, by the process that received them;
+if a chunk lands in another process (or after a restart), the file is
+hashed once more when the upload completes.
+
+``_hashers`` and ``_writing`` are per process: with several API processes,
+a chunk's running hash is only reused if the same process received every
+chunk, and two chunks of one upload can only be told apart when they reach
+the same process. The offset check on the upload session, in the database,
+still rejects a chunk sent for a stale offset.
+"""
+import hashlib
+import re
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+from pathlib import Path
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Sequence, Set, Tuple
+
+# Bytes read (or collected from the request) for each write to disk
+WRITE_BUFFER_SIZE = 1024 * 1024
+# Multipart boundaries and headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Upload id -> (bytes hashed, hash of the file's first bytes), of this process only
+_hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+# Uploads with a chunk being written by this process; other processes don't see it
+_writing: Set[str] = set()
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File is larger than {max_bytes // (1024 * 1024)} MB")
+
+
+class UploadSizeLimitMiddleware:
+    """Reject upload request bodies over their route's limit while they are received.
+
+    ``limits`` maps path patterns to maximum file sizes in bytes; the first
+    pattern matching a POST or PUT path applies. A Content-Length over the
+    limit is refused before the body is read; bodies without one (chunked
+    transfer encoding) are cut off once they go over it, instead of being
+    spooled to disk first.
+    """
+
+    def __init__(self, app, limits: Sequence[Tuple[str, int]]):
+        self.app = app
+        self.limits = [(re.compile(pattern), max_bytes) for pattern, max_bytes in limits]
+
+    def max_bytes(self, scope) -> Optional[int]:
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return None
+        for pattern, max_bytes in self.limits:
+            if pattern.match(scope["path"]):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.max_bytes(scope)
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = max_bytes + MULTIPART_OVERHEAD
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            error = too_large(max_bytes)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Surfaces as a 413 response from the route reading the body
+                    raise too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def save_and_hash(source: BinaryIO, destination: Path, max_size: Optional[int] = None) -> Tuple[str, int]:
+    """Copy a file object to disk in chunks, returning its SHA-256 and size.
+
+    Raises 413, leaving no file behind, once more than ``max_size`` bytes were read.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(destination, "wb") as buffer:
+        while True:
+            chunk = source.read(WRITE_BUFFER_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                buffer.close()
+                destination.unlink()
+                raise too_large(max_size)
+            sha256.update(chunk)
+            buffer.write(chunk)
+    return sha256.hexdigest(), size
+
+
+async def save_multipart_file(
+    request: Request, field: str, destination: Path, max_size: int
+) -> Tuple[str, Optional[str], str, int]:
+    """Write the ``field`` file of a multipart/form-data request to disk as the body arrives.
+
+    Returns the file's (filename, content type, SHA-256, size). Other form
+    fields are ignored. Disk writes and hashing run on a worker thread in
+    WRITE_BUFFER_SIZE pieces. Raises 413, leaving no file behind, once the
+    file goes over ``max_size`` bytes, and 422 if the body has no such file.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=422, detail="Expected a multipart/form-data body")
+
+    # Parser callbacks run synchronously inside write(); their events are handled after each chunk
+    events: List[Tuple[str, object]] = []
+    headers: Dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("headers", dict(headers)))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    sha256 = hashlib.sha256()
+    size = 0
+    found: Optional[Tuple[str, Optional[str]]] = None
+    in_file = False
+    buffer = bytearray()
+    f = await run_in_threadpool(open, destination, "wb")
+    try:
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for kind, value in events:
+                    if kind == "headers":
+                        _, options = parse_options_header(value.get(b"content-disposition", b""))
+                        in_file = found is None and options.get(b"name") == field.encode() and b"filename" in options
+                        if in_file:
+                            part_type = value.get(b"content-type", b"").decode("latin-1")
+                            found = (options[b"filename"].decode("utf-8", "replace"), part_type or None)
+                    elif kind == "data" and in_file:
+                        size += len(value)
+                        if size > max_size:
+                            raise too_large(max_size)
+                        buffer += value
+                        if len(buffer) >= WRITE_BUFFER_SIZE:
+                            await run_in_threadpool(_write, f, bytes(buffer), sha256)
+                            buffer.clear()
+                    elif kind == "end":
+                        in_file = False
+                events.clear()
+            parser.finalize()
+            if buffer:
+                await run_in_threadpool(_write, f, bytes(buffer), sha256)
+        finally:
+            await run_in_threadpool(f.close)
+        if found is None:
+            raise HTTPException(status_code=422, detail=f"No file in the '{field}' form field")
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return found[0], found[1], sha256.hexdigest(), size
+
+
+def unique_file_path(directory: Path, filename: str) -> Path:
+    """Return directory/filename, adding a numeric suffix if that file already exists"""
+    name = Path(filename).name
+    file_path = directory / name
+    stem, suffix = Path(name).stem, Path(name).suffix
+    counter = 1
+    while file_path.exists():
+        file_path = directory / f"{stem} ({counter}){suffix}"
+        counter += 1
+    return file_path
+
+
+def hash_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(WRITE_BUFFER_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _open_at(path: Path, offset: int):
+    f = open(path, "r+b" if path.exists() else "wb")
+    f.seek(offset)
+    f.truncate()
+    return f
+
+
+def _write(f, data: bytes, sha256: Optional["hashlib._Hash"]):
+    f.write(data)
+    if sha256 is not None:
+        sha256.update(data)
+
+
+async def append_chunk(
+    upload_id: str,
+    path: Path,
+    offset: int,
+    body: AsyncIterator[bytes],
+    max_bytes: int
+) -> int:
+    """Write a request body to ``path`` at ``offset``, returning the number of bytes written.
+
+    Disk writes and hashing run on a worker thread in WRITE_BUFFER_SIZE
+    pieces, so a slow client never blocks the event loop. Anything after
+    ``offset`` (left by an interrupted chunk) is overwritten. Raises 413 if
+    the body would take the file past ``max_bytes``, and 409 if another
+    chunk of the upload is being written.
+    """
+    if upload_id in _writing:
+        raise HTTPException(status_code=409, detail="Another chunk of this upload is being written")
+    _writing.add(upload_id)
+    try:
+        hashed = _hashers.get(upload_id)
+        # Hash a copy, so an interrupted chunk leaves the hash of the stored bytes
+        sha256 = hashed[1].copy() if hashed and hashed[0] == offset else (hashlib.sha256() if offset == 0 else None)
+        written = 0
+        buffer = bytearray()
+        f = await run_in_threadpool(_open_at, path, offset)
+        try:
+            async for data in body:
+                if offset + written + len(buffer) + len(data) > max_bytes:
+                    raise too_large(max_bytes)
+                buffer += data
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await run_in_threadpool(_write, f, bytes(buffer), sha256)
+                    written += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(_write, f, bytes(buffer), sha256)
+                written += len(buffer)
+        finally:
+            await run_in_threadpool(f.close)
+
+        if sha256 is not None:
+            _hashers[upload_id] = (offset + written, sha256)
+        else:
+            _hashers.pop(upload_id, None)
+        return written
+    finally:
+        _writing.discard(upload_id)
+
+
+def content_hash(upload_id: str, path: Path, size: int) -> str:
+    """SHA-256 of a completed upload, from the running hash if this process saw every chunk"""
+    hashed = _hashers.pop(upload_id, None)
+    if hashed is not None and hashed[0] == size:
+        return hashed[1].hexdigest()
+    return hash_file(path)
+
+
+def discard(upload_id: str):
+    _hashers.pop(upload_id, None)
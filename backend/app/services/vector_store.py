@@ -0,0 +1,1047 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# (ids, documents, metadatas) of the matching chunks, best first
+SearchResult = Tuple[List[str], List[str], List[Dict]]
+# A case query's matches, best first, with their stored embeddings (float32, one row per
+# chunk) and cosine similarities to the query: (ids, documents, metadatas, embeddings, scores)
+QueryResult = Tuple[List[str], List[str], List[Dict], np.ndarray, List[float]]
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _query_result(query: Sequence[float], ids, documents, metadatas, embeddings) -> QueryResult:
+    """A query result with the cosine similarity of each stored embedding to the query"""
+    dim = len(query)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), dim)
+    vector = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    scores = matrix @ vector / np.maximum(norms, 1e-12)
+    return list(ids), list(documents), list(metadatas), matrix, [float(score) for score in scores]
+
+
+class VectorStore:
+    """Chunk vectors, texts and metadata, stored per case.
+
+    Chunk ids are unique within a case. Metadata always carries
+    ``document_id`` so a document's chunks can be found again. With
+    ``global_index`` every chunk is also written to one index over all cases,
+    so a search across thousands of cases is a single query.
+
+    Deleted chunks leave tombstones that take up space until the index is
+    compacted.
+    """
+
+    global_index = False
+    # Whether several processes (index workers, re-embedding) may open the store at once
+    multiprocess_safe = True
+
+    def load(self):
+        """Open the underlying store, so the first request doesn't pay for it"""
+
+    @property
+    def is_loaded(self) -> bool:
+        return True
+
+    def upsert(
+        self,
+        case_id: int,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict]
+    ):
+        raise NotImplementedError
+
+    def query(self, case_id: int, embedding: Sequence[float], top_k: int) -> Optional[QueryResult]:
+        """Nearest chunks of a case, or None if the case has no index"""
+        raise NotImplementedError
+
+    def query_many(
+        self, case_id: int, embeddings: Sequence[Sequence[float]], top_k: int
+    ) -> Optional[List[QueryResult]]:
+        """Nearest chunks of a case for each of several embeddings, or None if the case has no index"""
+        results = []
+        for embedding in embeddings:
+            result = self.query(case_id, embedding, top_k)
+            if result is None:
+                return None
+            results.append(result)
+        return results
+
+    def search(
+        self, embedding: Sequence[float], top_k: int, case_ids: Optional[Sequence[int]] = None
+    ) -> SearchResult:
+        """Nearest chunks across all cases, or only ``case_ids``, from the global index"""
+        raise NotImplementedError
+
+    def get(self, case_id: int, ids: Sequence[str]) -> SearchResult:
+        """Chunks of a case by id; unknown ids are left out"""
+        raise NotImplementedError
+
+    def get_embeddings(self, case_id: int, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Stored embeddings of chunks of a case by id; unknown ids are left out"""
+        raise NotImplementedError
+
+    def get_document(
+        self, case_id: int, document_id: int, limit: int, offset: int = 0
+    ) -> Tuple[List[str], List[List[float]], List[str], List[Dict]]:
+        """One page of a document's chunks as (ids, embeddings, documents, metadatas)"""
+        raise NotImplementedError
+
+    def iter_case(
+        self, case_id: int, batch_size: int = 500
+    ) -> Iterator[Tuple[List[str], List[List[float]], List[str], List[Dict]]]:
+        """All chunks of a case, in batches of (ids, embeddings, documents, metadatas)"""
+        raise NotImplementedError
+
+    def add_case_to_global_index(self, case_id: int) -> int:
+        """Copy a case's chunks into the global index; returns the number of chunks"""
+        raise NotImplementedError
+
+    def delete_document(self, case_id: int, document_id: int) -> int:
+        """Delete a document's chunks from the case and global index; returns the number deleted"""
+        raise NotImplementedError
+
+    def delete_case(self, case_id: int) -> int:
+        """Delete a case's index and its chunks in the global index; returns the number deleted"""
+        raise NotImplementedError
+
+    def case_ids(self) -> List[int]:
+        """Cases that have an index"""
+        raise NotImplementedError
+
+    def document_counts(self, case_id: int) -> Dict[int, int]:
+        """Number of chunks per document of a case"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """{"disk_bytes": size of the store, "tombstones": {index name: deleted chunks not yet reclaimed}}"""
+        raise NotImplementedError
+
+    def compact(self, min_deleted_ratio: float = 0.0) -> Dict[str, int]:
+        """Rewrite the indexes whose share of tombstones is at least ``min_deleted_ratio``.
+
+        Returns the number of tombstones reclaimed per index.
+        """
+        raise NotImplementedError
+
+    def versioned(self, version: int, global_index: Optional[bool] = None) -> "VectorStore":
+        """The same kind of store holding index ``version``, kept apart from the others.
+
+        Version 1 is this store's own data. ``global_index`` defaults to this
+        store's setting.
+        """
+        raise NotImplementedError
+
+    def drop(self):
+        """Delete everything in this store, all cases and the global index"""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """One ChromaDB collection (HNSW index) per case, plus ``all_cases`` as the global index.
+
+    Chroma only marks deleted vectors in its HNSW index, so deletions are
+    counted in a small SQLite log and compaction rebuilds the affected
+    collections. Other index versions live in the same client, in
+    collections named with a ``__v{n}`` suffix.
+
+    Without ``host`` the collections are opened in-process from ``path``.
+    Chroma keeps each collection's HNSW segment in the memory of the process
+    that loaded it and tells only that process about writes, so such a store
+    must only be used by one process. With ``host`` every process talks to
+    the same Chroma server instead.
+    """
+
+    compacting_suffix = "_compacting"
+
+    def __init__(
+        self,
+        path: str,
+        global_index: bool = True,
+        suffix: str = "",
+        owner: "ChromaVectorStore" = None,
+        host: str = "",
+        port: int = 8000
+    ):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.global_index = global_index
+        self.suffix = suffix
+        self.global_collection_name = f"all_cases{suffix}"
+        self._case_name = re.compile(rf"case_(\d+){re.escape(suffix)}")
+        # Versions share the client of the store they were created from
+        self._owner = owner
+        self._client = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        Path(path).mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS tombstones (name TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(Path(self.path) / "tombstones.sqlite3"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _add_tombstones(self, name: str, count: int):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO tombstones VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET count = count + excluded.count",
+                (name, count)
+            )
+
+    def _clear_tombstones(self, name: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tombstones WHERE name = ?", (name,))
+
+    @property
+    def client(self):
+        if self._owner is not None:
+            return self._owner.client
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+                    if self.host:
+                        self._client = chromadb.HttpClient(
+                            host=self.host, port=str(self.port), settings=Settings(anonymized_telemetry=False)
+                        )
+                    else:
+                        self._client = chromadb.PersistentClient(
+                            path=self.path,
+                            settings=Settings(anonymized_telemetry=False)
+                        )
+        return self._client
+
+    @property
+    def multiprocess_safe(self) -> bool:
+        return bool(self.host)
+
+    def load(self):
+        self.client
+
+    @property
+    def is_loaded(self) -> bool:
+        if self._owner is not None:
+            return self._owner.is_loaded
+        return self._client is not None
+
+    def collection_name(self, case_id: int) -> str:
+        return f"case_{case_id}{self.suffix}"
+
+    def get_collection(self, case_id: int):
+        """Collection of a case, or None if it doesn't exist"""
+        try:
+            return self.client.get_collection(name=self.collection_name(case_id))
+        except:
+            return None
+
+    def get_or_create_collection(self, case_id: int):
+        collection = self.get_collection(case_id)
+        if collection is None:
+            collection = self.client.create_collection(name=self.collection_name(case_id))
+        return collection
+
+    def global_collection(self):
+        return self.client.get_or_create_collection(name=self.global_collection_name)
+
+    def global_id(self, case_id: int, chunk_id: str) -> str:
+        return f"{case_id}:{chunk_id}"
+
+    def upsert(self, case_id, ids, embeddings, documents, metadatas):
+        embeddings = [list(map(float, embedding)) for embedding in embeddings]
+        self.get_or_create_collection(case_id).upsert(
+            ids=list(ids),
+            embeddings=embeddings,
+            documents=list(documents),
+            metadatas=list(metadatas)
+        )
+        if self.global_index:
+            self._upsert_global(case_id, ids, embeddings, documents, metadatas)
+
+    def _upsert_global(self, case_id, ids, embeddings, documents, metadatas):
+        self.global_collection().upsert(
+            ids=[self.global_id(case_id, chunk_id) for chunk_id in ids],
+            embeddings=embeddings,
+            documents=list(documents),
+            metadatas=[{**meta, "case_id": case_id} for meta in metadatas]
+        )
+
+    def query(self, case_id, embedding, top_k):
+        results = self.query_many(case_id, [embedding], top_k)
+        return results[0] if results is not None else None
+
+    def query_many(self, case_id, embeddings, top_k):
+        collection = self.get_collection(case_id)
+        if collection is None:
+            return None
+        if not embeddings:
+            return []
+        queries = [list(map(float, embedding)) for embedding in embeddings]
+        results = collection.query(
+            query_embeddings=queries, n_results=top_k, include=["documents", "metadatas", "embeddings"]
+        )
+        return [
+            _query_result(
+                queries[i],
+                results["ids"][i] if results["ids"] else [],
+                results["documents"][i] if results["documents"] else [],
+                results["metadatas"][i] if results["metadatas"] else [],
+                results["embeddings"][i] if results.get("embeddings") is not None else []
+            )
+            for i in range(len(queries))
+        ]
+
+    def search(self, embedding, top_k, case_ids=None):
+        if case_ids is not None and not case_ids:
+            return [], [], []
+        where = None
+        if case_ids is not None:
+            where = {"case_id": case_ids[0]} if len(case_ids) == 1 else {"case_id": {"$in": list(case_ids)}}
+        results = self.global_collection().query(
+            query_embeddings=[list(map(float, embedding))], n_results=top_k, where=where
+        )
+        ids = results["ids"][0] if results["ids"] else []
+        documents = results["documents"][0] if results["documents"] else []
+        metadatas = results["metadatas"][0] if results["metadatas"] else []
+        return [global_id.split(":", 1)[1] for global_id in ids], documents, metadatas
+
+    def get(self, case_id, ids):
+        collection = self.get_collection(case_id)
+        if collection is None or not ids:
+            return [], [], []
+        results = collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return results["ids"], results["documents"], results["metadatas"]
+
+    def get_embeddings(self, case_id, ids):
+        collection = self.get_collection(case_id)
+        if collection is None or not ids:
+            return {}
+        results = collection.get(ids=list(ids), include=["embeddings"])
+        return {
+            chunk_id: np.asarray(embedding, dtype=np.float32)
+            for chunk_id, embedding in zip(results["ids"], results["embeddings"])
+        }
+
+    def get_document(self, case_id, document_id, limit, offset=0):
+        collection = self.get_collection(case_id)
+        if collection is None:
+            return [], [], [], []
+        results = collection.get(
+            where={"document_id": document_id},
+            include=["embeddings", "documents", "metadatas"],
+            limit=limit,
+            offset=offset
+        )
+        return results["ids"], results["embeddings"], results["documents"], results["metadatas"]
+
+    def _iter_collection(self, collection, batch_size: int = 500):
+        offset = 0
+        while True:
+            results = collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            if not results["ids"]:
+                return
+            yield results["ids"], results["embeddings"], results["documents"], results["metadatas"]
+            offset += len(results["ids"])
+
+    def iter_case(self, case_id, batch_size=500):
+        collection = self.get_collection(case_id)
+        if collection is not None:
+            yield from self._iter_collection(collection, batch_size)
+
+    def add_case_to_global_index(self, case_id):
+        count = 0
+        for ids, embeddings, documents, metadatas in self.iter_case(case_id):
+            self._upsert_global(case_id, ids, embeddings, documents, metadatas)
+            count += len(ids)
+        return count
+
+    def delete_document(self, case_id, document_id):
+        collection = self.get_collection(case_id)
+        if collection is None:
+            return 0
+        ids = collection.get(where={"document_id": document_id}, include=[])["ids"]
+        if not ids:
+            return 0
+        collection.delete(ids=ids)
+        self._add_tombstones(collection.name, len(ids))
+        if self.global_index:
+            self.global_collection().delete(ids=[self.global_id(case_id, chunk_id) for chunk_id in ids])
+            self._add_tombstones(self.global_collection_name, len(ids))
+        return len(ids)
+
+    def delete_case(self, case_id):
+        count = 0
+        collection = self.get_collection(case_id)
+        if collection is not None:
+            count = collection.count()
+            self.client.delete_collection(name=collection.name)
+            self._clear_tombstones(collection.name)
+        if self.global_index:
+            global_collection = self.global_collection()
+            ids = global_collection.get(where={"case_id": case_id}, include=[])["ids"]
+            if ids:
+                global_collection.delete(ids=ids)
+                self._add_tombstones(self.global_collection_name, len(ids))
+        return count
+
+    def case_ids(self):
+        matches = (self._case_name.fullmatch(collection.name) for collection in self.client.list_collections())
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def document_counts(self, case_id):
+        counts: Dict[int, int] = {}
+        collection = self.get_collection(case_id)
+        if collection is None:
+            return counts
+        offset = 0
+        while True:
+            metadatas = collection.get(include=["metadatas"], limit=5000, offset=offset)["metadatas"]
+            if not metadatas:
+                return counts
+            for meta in metadatas:
+                counts[meta["document_id"]] = counts.get(meta["document_id"], 0) + 1
+            offset += len(metadatas)
+
+    def stats(self):
+        tombstones = dict(self._connect().execute("SELECT name, count FROM tombstones WHERE count > 0").fetchall())
+        return {"disk_bytes": _directory_size(Path(self.path)), "tombstones": tombstones}
+
+    def compact(self, min_deleted_ratio=0.0):
+        self._finish_interrupted_compactions()
+        reclaimed = {}
+        for name, deleted in self.stats()["tombstones"].items():
+            try:
+                collection = self.client.get_collection(name=name)
+            except:
+                self._clear_tombstones(name)
+                continue
+            if deleted / (deleted + collection.count()) < min_deleted_ratio:
+                continue
+
+            # Copy the live vectors into a fresh collection (a new HNSW index) and swap it in
+            rebuilt = self.client.create_collection(name=f"{name}{self.compacting_suffix}")
+            for ids, embeddings, documents, metadatas in self._iter_collection(collection):
+                rebuilt.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+            self.client.delete_collection(name=name)
+            rebuilt.modify(name=name)
+            self._clear_tombstones(name)
+            reclaimed[name] = deleted
+        return reclaimed
+
+    def versioned(self, version, global_index=None):
+        if version == 1 and not self.suffix and global_index in (None, self.global_index):
+            return self
+        return ChromaVectorStore(
+            self.path,
+            global_index=self.global_index if global_index is None else global_index,
+            suffix="" if version == 1 else f"__v{version}",
+            owner=self._owner or self,
+            host=self.host,
+            port=self.port
+        )
+
+    def drop(self):
+        for collection in self.client.list_collections():
+            name = collection.name
+            if name.endswith(self.compacting_suffix):
+                name = name[:-len(self.compacting_suffix)]
+            if name == self.global_collection_name or self._case_name.fullmatch(name):
+                self.client.delete_collection(name=collection.name)
+                self._clear_tombstones(collection.name)
+
+    def _finish_interrupted_compactions(self):
+        names = {collection.name for collection in self.client.list_collections()}
+        for name in names:
+            if not name.endswith(self.compacting_suffix):
+                continue
+            original = name[:-len(self.compacting_suffix)]
+            if original in names:
+                # Interrupted while copying: the original is still complete
+                self.client.delete_collection(name=name)
+            else:
+                # Interrupted between dropping the original and renaming the copy
+                self.client.get_collection(name=name).modify(name=original)
+
+
+class NumpyVectorStore(VectorStore):
+    """Brute-force search over memory-mapped float16 matrices.
+
+    Vectors are L2-normalized and appended as rows to one matrix file per
+    case, and to a global matrix for the global index; chunk ids, texts and
+    metadata live in a SQLite sidecar keyed by row. A query is a single
+    matrix-vector product followed by argpartition, which for small and
+    medium cases beats an HNSW index and needs no graph in memory. Upserting
+    an existing id overwrites its row in place. Writers from several
+    processes are serialized by the sidecar's write lock.
+
+    Deleted rows become tombstones that are masked out of searches.
+    Compaction writes the live rows to a new matrix file and renumbers them
+    in the sidecar; old files are removed once no reader can still be using them.
+
+    Converting float16 to float32 costs more than the product itself, so the
+    converted matrices of recently queried cases are kept in memory, up to
+    ``cache_mb``; a matrix's version changes on every write and invalidates them.
+    """
+
+    # Rows scored per block, bounds the float32 copy made of the float16 matrix
+    block_rows = 32768
+    global_name = "global"
+    stale_file_seconds = 300
+
+    def __init__(self, path: str, cache_mb: int = 256, global_index: bool = True):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.global_index = global_index
+        self._local = threading.local()
+        self._maps: Dict[str, np.memmap] = {}
+        self._maps_lock = threading.Lock()
+        self.cache_bytes = cache_mb * 2**20
+        self._decoded: "OrderedDict[str, Tuple[int, np.ndarray]]" = OrderedDict()
+        self._decoded_lock = threading.Lock()
+        # Tombstoned rows per matrix and the case of each global row, by matrix version
+        self._row_info: Dict[Tuple[str, str], Tuple[int, np.ndarray]] = {}
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS matrices ("
+                "name TEXT PRIMARY KEY, file TEXT, dim INTEGER NOT NULL, rows INTEGER NOT NULL, "
+                "version INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "case_id INTEGER NOT NULL, row INTEGER NOT NULL, chunk_id TEXT NOT NULL, "
+                "document_id INTEGER NOT NULL, document TEXT NOT NULL, metadata TEXT NOT NULL, "
+                "PRIMARY KEY (case_id, row))"
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_chunks_id ON chunks (case_id, chunk_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_document ON chunks (case_id, document_id, row)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS global_rows ("
+                "row INTEGER PRIMARY KEY, case_id INTEGER NOT NULL, chunk_id TEXT NOT NULL)"
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_global_rows_id ON global_rows (case_id, chunk_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tombstones ("
+                "name TEXT NOT NULL, row INTEGER NOT NULL, PRIMARY KEY (name, row)) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path / "chunks.sqlite3"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def case_name(self, case_id: int) -> str:
+        return f"case_{case_id}"
+
+    def _info(self, conn: sqlite3.Connection, name: str) -> Optional[Tuple[str, int, int, int]]:
+        """(file, dim, rows, version) of a matrix, or None if it has no vectors"""
+        info = conn.execute("SELECT file, dim, rows, version FROM matrices WHERE name = ?", (name,)).fetchone()
+        return info if info and info[0] else None
+
+    def _matrix(self, file: str, rows: int, dim: int) -> np.ndarray:
+        """The first ``rows`` rows of a matrix file, remapping it once it has grown"""
+        with self._maps_lock:
+            matrix = self._maps.get(file)
+            if matrix is None or matrix.shape[0] < rows or matrix.shape[1] != dim:
+                available = (self.path / file).stat().st_size // (2 * dim)
+                matrix = np.memmap(self.path / file, dtype=np.float16, mode="r", shape=(available, dim))
+                self._maps[file] = matrix
+        return matrix[:rows]
+
+    def _scores(self, name: str, info: Tuple[str, int, int, int], query: np.ndarray) -> np.ndarray:
+        file, dim, rows, version = info
+        with self._decoded_lock:
+            cached = self._decoded.get(name)
+            if cached is not None and cached[0] == version:
+                self._decoded.move_to_end(name)
+                return cached[1] @ query
+
+        matrix = self._matrix(file, rows, dim)
+        if rows * dim * 4 <= self.cache_bytes:
+            decoded = matrix.astype(np.float32)
+            with self._decoded_lock:
+                self._decoded[name] = (version, decoded)
+                self._decoded.move_to_end(name)
+                while sum(item[1].nbytes for item in self._decoded.values()) > self.cache_bytes:
+                    self._decoded.popitem(last=False)
+            return decoded @ query
+
+        scores = np.empty((rows,) + query.shape[1:], dtype=np.float32)
+        for start in range(0, rows, self.block_rows):
+            block = matrix[start:start + self.block_rows]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def _dead_rows(self, conn: sqlite3.Connection, name: str, version: int) -> np.ndarray:
+        cached = self._row_info.get((name, "dead"))
+        if cached is None or cached[0] != version:
+            rows = [row for row, in conn.execute("SELECT row FROM tombstones WHERE name = ?", (name,))]
+            cached = (version, np.asarray(rows, dtype=np.int64))
+            self._row_info[(name, "dead")] = cached
+        return cached[1]
+
+    def _row_cases(self, conn: sqlite3.Connection, rows: int, version: int) -> np.ndarray:
+        """Case id of every row of the global matrix, -1 for deleted rows"""
+        cached = self._row_info.get((self.global_name, "cases"))
+        if cached is None or cached[0] != version:
+            row_cases = np.full(rows, -1, dtype=np.int64)
+            for row, case_id in conn.execute("SELECT row, case_id FROM global_rows WHERE row < ?", (rows,)):
+                row_cases[row] = case_id
+            cached = (version, row_cases)
+            self._row_info[(self.global_name, "cases")] = cached
+        return cached[1]
+
+    def _top(self, scores: np.ndarray, top_k: int) -> List[int]:
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [int(row) for row in best if scores[row] > -np.inf]
+
+    def _write(self, conn: sqlite3.Connection, name: str, existing: Dict[str, int], ids, vectors) -> List[int]:
+        """Write vectors to a matrix, reusing the rows of ``existing`` ids; returns their rows"""
+        matrix = conn.execute("SELECT file, dim, rows, version FROM matrices WHERE name = ?", (name,)).fetchone()
+        file, dim, rows, version = matrix if matrix else (None, vectors.shape[1], 0, 0)
+        creating = not file
+        if creating:
+            # Versions only ever grow, so file names are never reused
+            file, dim, rows = f"{name}-{version + 1}.f16", vectors.shape[1], 0
+        if vectors.shape[1] != dim:
+            raise ValueError(f"{name} stores {dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        assigned = []
+        for chunk_id in ids:
+            row = existing.get(chunk_id)
+            if row is None:
+                row = existing[chunk_id] = rows
+                rows += 1
+            assigned.append(row)
+
+        # Vectors are written before the row count is committed, so readers never see a partial row
+        with open(self.path / file, "wb" if creating else "r+b") as f:
+            for row, vector in zip(assigned, vectors):
+                f.seek(row * dim * 2)
+                f.write(vector.tobytes())
+        conn.execute(
+            "INSERT OR REPLACE INTO matrices VALUES (?, ?, ?, ?, ?)", (name, file, dim, rows, version + 1)
+        )
+        return assigned
+
+    def upsert(self, case_id, ids, embeddings, documents, metadatas):
+        self._upsert(case_id, ids, embeddings, documents, metadatas, in_case=True, in_global=self.global_index)
+
+    def _upsert(self, case_id, ids, embeddings, documents, metadatas, in_case: bool, in_global: bool):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms > 0, norms, 1)).astype(np.float16)
+        placeholders = ",".join("?" * len(ids))
+
+        conn = self._connect()
+        # Take the write lock up front: row numbers are allocated in this transaction
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if in_case:
+                existing = dict(conn.execute(
+                    f"SELECT chunk_id, row FROM chunks WHERE case_id = ? AND chunk_id IN ({placeholders})",
+                    (case_id, *ids)
+                ).fetchall())
+                rows = self._write(conn, self.case_name(case_id), existing, ids, vectors)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (case_id, row, chunk_id, meta["document_id"], document, json.dumps(meta, ensure_ascii=False))
+                        for row, chunk_id, document, meta in zip(rows, ids, documents, metadatas)
+                    ]
+                )
+            if in_global:
+                existing = dict(conn.execute(
+                    f"SELECT chunk_id, row FROM global_rows WHERE case_id = ? AND chunk_id IN ({placeholders})",
+                    (case_id, *ids)
+                ).fetchall())
+                rows = self._write(conn, self.global_name, existing, ids, vectors)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO global_rows VALUES (?, ?, ?)",
+                    [(row, case_id, chunk_id) for row, chunk_id in zip(rows, ids)]
+                )
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+
+    def query(self, case_id, embedding, top_k):
+        results = self.query_many(case_id, [embedding], top_k)
+        return results[0] if results is not None else None
+
+    def query_many(self, case_id, embeddings, top_k):
+        conn = self._connect()
+        name = self.case_name(case_id)
+        # One read snapshot, so a compaction can't renumber rows halfway through
+        conn.execute("BEGIN")
+        try:
+            info = self._info(conn, name)
+            if info is None:
+                return None
+            if not len(embeddings):
+                return []
+
+            # All queries in one pass over the matrix: (rows, dim) @ (dim, queries)
+            queries = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries /= np.where(norms == 0, 1, norms)
+            scores = self._scores(name, info, queries.T)
+            dead = self._dead_rows(conn, name, info[3])
+            if len(dead):
+                scores[dead] = -np.inf
+            file, dim, rows, _ = info
+            matrix = self._matrix(file, rows, dim)
+            results = []
+            for i in range(len(queries)):
+                ids, documents, metadatas, found = self._rows(conn, case_id, self._top(scores[:, i], top_k))
+                results.append((
+                    ids,
+                    documents,
+                    metadatas,
+                    # Rows are stored normalized, so the scores are cosine similarities
+                    np.asarray(matrix[found], dtype=np.float32).reshape(len(found), dim),
+                    [float(scores[row, i]) for row in found]
+                ))
+            return results
+        finally:
+            conn.execute("COMMIT")
+
+    def search(self, embedding, top_k, case_ids=None):
+        if case_ids is not None and not case_ids:
+            return [], [], []
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            info = self._info(conn, self.global_name)
+            if info is None:
+                return [], [], []
+            _, _, rows, version = info
+
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1
+            scores = self._scores(self.global_name, info, query)
+            row_cases = self._row_cases(conn, rows, version)
+            if case_ids is None:
+                allowed = row_cases >= 0
+            else:
+                allowed = np.isin(row_cases, np.asarray(case_ids, dtype=np.int64))
+            best = self._top(np.where(allowed, scores, -np.inf), top_k)
+            if not best:
+                return [], [], []
+
+            placeholders = ",".join("?" * len(best))
+            found = {
+                row: (chunk_id, document, json.loads(metadata))
+                for row, chunk_id, document, metadata in conn.execute(
+                    f"SELECT g.row, c.chunk_id, c.document, c.metadata FROM global_rows g "
+                    f"JOIN chunks c ON c.case_id = g.case_id AND c.chunk_id = g.chunk_id "
+                    f"WHERE g.row IN ({placeholders})",
+                    best
+                )
+            }
+        finally:
+            conn.execute("COMMIT")
+        ordered = [found[row] for row in best if row in found]
+        return [item[0] for item in ordered], [item[1] for item in ordered], [item[2] for item in ordered]
+
+    def _rows(
+        self, conn: sqlite3.Connection, case_id: int, rows: List[int]
+    ) -> Tuple[List[str], List[str], List[Dict], List[int]]:
+        """(ids, documents, metadatas, rows) of the given rows that still hold a chunk"""
+        if not rows:
+            return [], [], [], []
+        placeholders = ",".join("?" * len(rows))
+        found = {
+            row: (chunk_id, document, json.loads(metadata))
+            for row, chunk_id, document, metadata in conn.execute(
+                f"SELECT row, chunk_id, document, metadata FROM chunks WHERE case_id = ? AND row IN ({placeholders})",
+                (case_id, *rows)
+            )
+        }
+        rows = [row for row in rows if row in found]
+        return [found[row][0] for row in rows], [found[row][1] for row in rows], [found[row][2] for row in rows], rows
+
+    def get(self, case_id, ids):
+        if not ids:
+            return [], [], []
+        conn = self._connect()
+        placeholders = ",".join("?" * len(ids))
+        found = {
+            chunk_id: (document, json.loads(metadata))
+            for chunk_id, document, metadata in conn.execute(
+                f"SELECT chunk_id, document, metadata FROM chunks WHERE case_id = ? AND chunk_id IN ({placeholders})",
+                (case_id, *ids)
+            )
+        }
+        ids = [chunk_id for chunk_id in ids if chunk_id in found]
+        return ids, [found[chunk_id][0] for chunk_id in ids], [found[chunk_id][1] for chunk_id in ids]
+
+    def get_embeddings(self, case_id, ids):
+        if not ids:
+            return {}
+        conn = self._connect()
+        placeholders = ",".join("?" * len(ids))
+        conn.execute("BEGIN")
+        try:
+            found = conn.execute(
+                f"SELECT chunk_id, row FROM chunks WHERE case_id = ? AND chunk_id IN ({placeholders})",
+                (case_id, *ids)
+            ).fetchall()
+            info = self._info(conn, self.case_name(case_id))
+            if not found or info is None:
+                return {}
+            file, dim, rows, _ = info
+            matrix = self._matrix(file, rows, dim)
+            return {chunk_id: matrix[row].astype(np.float32) for chunk_id, row in found}
+        finally:
+            conn.execute("COMMIT")
+
+    def _read_chunks(self, conn: sqlite3.Connection, case_id: int, where: str, params: Tuple):
+        """(ids, embeddings, documents, metadatas) of the chunks of a case matching ``where``"""
+        conn.execute("BEGIN")
+        try:
+            result = conn.execute(
+                f"SELECT row, chunk_id, document, metadata FROM chunks WHERE case_id = ? AND {where}",
+                (case_id, *params)
+            ).fetchall()
+            if not result:
+                return [], [], [], []
+            file, dim, rows, _ = self._info(conn, self.case_name(case_id))
+            matrix = self._matrix(file, rows, dim)
+            return (
+                [chunk_id for _, chunk_id, _, _ in result],
+                [matrix[row].astype(np.float32).tolist() for row, _, _, _ in result],
+                [document for _, _, document, _ in result],
+                [json.loads(metadata) for _, _, _, metadata in result]
+            )
+        finally:
+            conn.execute("COMMIT")
+
+    def get_document(self, case_id, document_id, limit, offset=0):
+        return self._read_chunks(
+            self._connect(), case_id, "document_id = ? ORDER BY chunk_id LIMIT ? OFFSET ?", (document_id, limit, offset)
+        )
+
+    def iter_case(self, case_id, batch_size=500):
+        # Keyset pagination on chunk ids, which compaction doesn't change
+        last_id = ""
+        while True:
+            batch = self._read_chunks(
+                self._connect(), case_id, "chunk_id > ? ORDER BY chunk_id LIMIT ?", (last_id, batch_size)
+            )
+            if not batch[0]:
+                return
+            yield batch
+            last_id = batch[0][-1]
+
+    def add_case_to_global_index(self, case_id):
+        count = 0
+        for ids, embeddings, documents, metadatas in self.iter_case(case_id):
+            self._upsert(case_id, ids, embeddings, documents, metadatas, in_case=False, in_global=True)
+            count += len(ids)
+        return count
+
+    def _bump(self, conn: sqlite3.Connection, name: str):
+        conn.execute("UPDATE matrices SET version = version + 1 WHERE name = ?", (name,))
+
+    def _delete_global(self, conn: sqlite3.Connection, where: str, params: Tuple):
+        rows = [row for row, in conn.execute(f"SELECT row FROM global_rows WHERE {where}", params)]
+        if rows:
+            conn.executemany(
+                "INSERT OR IGNORE INTO tombstones VALUES (?, ?)", [(self.global_name, row) for row in rows]
+            )
+            conn.execute(f"DELETE FROM global_rows WHERE {where}", params)
+            self._bump(conn, self.global_name)
+
+    def delete_document(self, case_id, document_id):
+        name = self.case_name(case_id)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            chunks = conn.execute(
+                "SELECT row, chunk_id FROM chunks WHERE case_id = ? AND document_id = ?", (case_id, document_id)
+            ).fetchall()
+            if chunks:
+                conn.executemany("INSERT OR IGNORE INTO tombstones VALUES (?, ?)", [(name, row) for row, _ in chunks])
+                conn.execute("DELETE FROM chunks WHERE case_id = ? AND document_id = ?", (case_id, document_id))
+                self._bump(conn, name)
+                for start in range(0, len(chunks), 500):
+                    chunk_ids = [chunk_id for _, chunk_id in chunks[start:start + 500]]
+                    self._delete_global(
+                        conn, f"case_id = ? AND chunk_id IN ({','.join('?' * len(chunk_ids))})", (case_id, *chunk_ids)
+                    )
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return len(chunks)
+
+    def delete_case(self, case_id):
+        name = self.case_name(case_id)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM chunks WHERE case_id = ?", (case_id,)).fetchone()[0]
+            conn.execute("DELETE FROM chunks WHERE case_id = ?", (case_id,))
+            conn.execute("DELETE FROM tombstones WHERE name = ?", (name,))
+            # The row is kept so the version, and with it the next file name, keeps growing
+            conn.execute("UPDATE matrices SET file = NULL, rows = 0, version = version + 1 WHERE name = ?", (name,))
+            if self.global_index:
+                self._delete_global(conn, "case_id = ?", (case_id,))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def case_ids(self):
+        return [
+            case_id for case_id, in self._connect().execute("SELECT DISTINCT case_id FROM chunks ORDER BY case_id")
+        ]
+
+    def document_counts(self, case_id):
+        return dict(self._connect().execute(
+            "SELECT document_id, COUNT(*) FROM chunks WHERE case_id = ? GROUP BY document_id", (case_id,)
+        ).fetchall())
+
+    def stats(self):
+        tombstones = dict(self._connect().execute("SELECT name, COUNT(*) FROM tombstones GROUP BY name").fetchall())
+        return {"disk_bytes": _directory_size(self.path), "tombstones": tombstones}
+
+    def compact(self, min_deleted_ratio=0.0):
+        reclaimed = {}
+        for name in self.stats()["tombstones"]:
+            count = self._compact(name, min_deleted_ratio)
+            if count:
+                reclaimed[name] = count
+        if reclaimed:
+            # Free the pages of deleted chunk texts
+            self._connect().execute("VACUUM")
+        self._remove_stale_files()
+        return reclaimed
+
+    def _compact(self, name: str, min_deleted_ratio: float) -> int:
+        """Rewrite a matrix without its tombstoned rows and renumber the rest"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            info = self._info(conn, name)
+            dead = {row for row, in conn.execute("SELECT row FROM tombstones WHERE name = ?", (name,))}
+            if info is None:
+                conn.execute("DELETE FROM tombstones WHERE name = ?", (name,))
+                conn.execute("COMMIT")
+                return 0
+            file, dim, rows, version = info
+            if not dead or len(dead) / rows < min_deleted_ratio:
+                conn.execute("COMMIT")
+                return 0
+
+            live = np.asarray([row for row in range(rows) if row not in dead], dtype=np.int64)
+            new_file = f"{name}-{version + 1}.f16"
+            matrix = self._matrix(file, rows, dim)
+            with open(self.path / new_file, "wb") as f:
+                for start in range(0, len(live), self.block_rows):
+                    f.write(np.ascontiguousarray(matrix[live[start:start + self.block_rows]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Rows only move down, so renumbering in ascending order never collides
+            moves = [(new, int(old)) for new, old in enumerate(live) if new != old]
+            if name == self.global_name:
+                conn.executemany("UPDATE global_rows SET row = ? WHERE row = ?", moves)
+            else:
+                case_id = int(name[len("case_"):])
+                conn.executemany(
+                    "UPDATE chunks SET row = ? WHERE case_id = ? AND row = ?",
+                    [(new, case_id, old) for new, old in moves]
+                )
+            conn.execute("DELETE FROM tombstones WHERE name = ?", (name,))
+            conn.execute(
+                "UPDATE matrices SET file = ?, rows = ?, version = ? WHERE name = ?",
+                (new_file, len(live), version + 1, name)
+            )
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return len(dead)
+
+    def versioned(self, version, global_index=None):
+        global_index = self.global_index if global_index is None else global_index
+        if version == 1 and global_index == self.global_index:
+            return self
+        # Each version is a store of its own, in a sibling directory
+        base = re.sub(r"__v\d+$", "", self.path.name)
+        name = base if version == 1 else f"{base}__v{version}"
+        cache_mb = self.cache_bytes // 2**20
+        return NumpyVectorStore(str(self.path.with_name(name)), cache_mb=cache_mb, global_index=global_index)
+
+    def drop(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        with self._maps_lock:
+            self._maps.clear()
+        with self._decoded_lock:
+            self._decoded.clear()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _remove_stale_files(self):
+        """Remove matrix files of deleted cases and files replaced by compaction.
+
+        Readers with an older snapshot may still open a replaced file, so it is
+        only removed once it hasn't been written to for ``stale_file_seconds``.
+        """
+        in_use = {file for file, in self._connect().execute("SELECT file FROM matrices WHERE file IS NOT NULL")}
+        cutoff = time.time() - self.stale_file_seconds
+        for path in self.path.glob("*.f16"):
+            if path.name not in in_use and path.stat().st_mtime < cutoff:
+                with self._maps_lock:
+                    self._maps.pop(path.name, None)
+                path.unlink(missing_ok=True)
+
+
+def create_vector_store(
+    backend: str,
+    path: str,
+    cache_mb: int = 256,
+    global_index: bool = True,
+    chroma_host: str = "",
+    chroma_port: int = 8000
+) -> VectorStore:
+    if backend == "chroma":
+        return ChromaVectorStore(path, global_index=global_index, host=chroma_host, port=chroma_port)
+    if backend == "numpy":
+        return NumpyVectorStore(str(Path(path) / "numpy"), cache_mb=cache_mb, global_index=global_index)
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,360 @@
+"""Indexing workers.
+
+Workers poll the persistent ``jobs`` table, so queued work survives restarts
+of the API. They are started together with the API (``INDEX_WORKERS``) or on
+their own with ``python -m app.worker``.
+
+Workers are separate processes when the vector store can be shared between
+processes (the NumPy store, or Chroma through CHROMA_SERVER_HOST). An
+in-process Chroma store only works from the process that opened it, so then
+the workers are threads of the API process, sharing its client, and cannot
+be run on their own.
+"""
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.models import Case, Document, ImportBatch, Job
+from app.services import bulk_import, index_versions, job_queue, metrics
+from app.services.query_cache import bump_case_index_version
+
+
+class PermanentJobError(Exception):
+    """A job failure that retrying cannot fix"""
+
+
+def _mark_indexed(db: Session, document: Document, duration: float):
+    document.is_indexed = True
+    document.index_status = "indexed"
+    document.index_error = None
+    document.index_duration = duration
+    document.indexed_at = datetime.utcnow()
+    bump_case_index_version(db, document.case_id, commit=False)
+    db.commit()
+
+
+def _get_document(db: Session, job: Job) -> Document:
+    document = db.query(Document).filter(Document.id == job.document_id).first()
+    if not document:
+        raise PermanentJobError(f"Document {job.document_id} not found")
+    document.index_status = "indexing"
+    db.commit()
+    return document
+
+
+def _check_case_version(db: Session, case_id: int, version: int):
+    """Retry a job whose case switched to another index version while the job was writing to this one"""
+    # End the read transaction, so the check sees the latest commit
+    db.commit()
+    current = index_versions.case_version(db, case_id)
+    if current != version:
+        raise RuntimeError(f"Case {case_id} switched from index version {version} to {current}")
+
+
+def run_index_job(db: Session, job: Job):
+    from app.services.rag_service import rag_service
+
+    document = _get_document(db, job)
+    version = index_versions.case_version(db, document.case_id)
+    stats = rag_service.index_document(
+        document.case_id, document.id, document.file_path, document.filename, document.content_hash, version
+    )
+    _check_case_version(db, document.case_id, version)
+    _mark_indexed(db, document, stats["seconds"])
+
+
+def run_copy_vectors_job(db: Session, job: Job):
+    """Reuse the vectors of an identical, already indexed document; index normally otherwise"""
+    from app.services.rag_service import rag_service
+
+    document = _get_document(db, job)
+    version = index_versions.case_version(db, document.case_id)
+    source_id = json.loads(job.payload or "{}").get("source_document_id")
+    source = db.query(Document).filter(Document.id == source_id).first()
+
+    started = time.perf_counter()
+    copied = 0
+    if source and source.is_indexed:
+        copied = rag_service.copy_document_vectors(
+            source.case_id, source.id, document.case_id, document.id, document.filename, version
+        )
+    if copied:
+        print(f"Copied {copied} chunks from document {source.id} to document {document.id}")
+        _check_case_version(db, document.case_id, version)
+        _mark_indexed(db, document, round(time.perf_counter() - started, 3))
+    else:
+        document.duplicate_of = None
+        stats = rag_service.index_document(
+            document.case_id, document.id, document.file_path, document.filename, document.content_hash, version
+        )
+        _check_case_version(db, document.case_id, version)
+        _mark_indexed(db, document, stats["seconds"])
+
+
+def run_index_documents_job(db: Session, job: Job):
+    """Index a group of small documents together, sharing embedding batches"""
+    from app.services.rag_service import rag_service
+
+    document_ids = json.loads(job.payload or "{}").get("document_ids", [])
+    # A retried job skips the documents that another job already indexed
+    documents = (
+        db.query(Document)
+        .filter(Document.id.in_(document_ids), Document.is_indexed.is_(False))
+        .order_by(Document.id)
+        .all()
+    )
+    if not documents:
+        return
+    for document in documents:
+        document.index_status = "indexing"
+    db.commit()
+
+    version = index_versions.case_version(db, job.case_id)
+    stats = rag_service.index_documents(job.case_id, [
+        (document.id, document.file_path, document.filename, document.content_hash) for document in documents
+    ], version)
+    _check_case_version(db, job.case_id, version)
+    indexed_at = datetime.utcnow()
+    for document in documents:
+        document.is_indexed = True
+        document.index_status = "indexed"
+        document.index_error = None
+        document.index_duration = stats[document.id]["seconds"]
+        document.indexed_at = indexed_at
+    bump_case_index_version(db, job.case_id, commit=False)
+    db.commit()
+
+
+def run_import_archive_job(db: Session, job: Job):
+    """Unpack an uploaded ZIP archive into its import batch and queue the indexing of its files"""
+    payload = json.loads(job.payload or "{}")
+    archive_path = Path(payload["archive_path"])
+    batch = db.query(ImportBatch).filter(ImportBatch.id == payload["batch_id"]).first()
+    if batch is None:
+        # The case was deleted in the meantime
+        archive_path.unlink(missing_ok=True)
+        raise PermanentJobError(f"Import {payload['batch_id']} not found")
+    try:
+        jobs = bulk_import.import_archive(db, batch, archive_path)
+    except (zipfile.BadZipFile, FileNotFoundError) as e:
+        raise PermanentJobError(f"Archive {batch.source} could not be read: {e}")
+    print(f"Imported {batch.total_files} files of {batch.source} into case {batch.case_id}, queued {jobs} jobs")
+
+
+def run_rebuild_search_index_job(db: Session, job: Job):
+    """Fill the cross-case index from the per-case indexes, e.g. for cases indexed before it existed"""
+    from app.services.rag_service import rag_service
+
+    total = 0
+    for case_id, version in db.query(Case.id, Case.embedding_version).order_by(Case.id).all():
+        total += rag_service.store(version or 1).add_case_to_global_index(case_id)
+    print(f"Added {total} chunks to the cross-case search index")
+
+
+def run_compact_index_job(db: Session, job: Job):
+    from app.services.rag_service import rag_service
+
+    result = rag_service.compact_index(db)
+    print(
+        f"Compacted index: purged {result['purged_orphans']} orphaned chunks, "
+        f"reclaimed {sum(result['reclaimed'].values())} deleted chunks, "
+        f"vector store now {result['disk_bytes']} bytes"
+    )
+
+
+JOB_HANDLERS: Dict[str, Callable[[Session, Job], None]] = {
+    "index": run_index_job,
+    "copy_vectors": run_copy_vectors_job,
+    "index_documents": run_index_documents_job,
+    "import_archive": run_import_archive_job,
+    "rebuild_search_index": run_rebuild_search_index_job,
+    "compact_index": run_compact_index_job,
+}
+
+
+def _record_document_failure(db: Session, job: Job, error: str, will_retry: bool):
+    if job.kind == "import_archive":
+        if not will_retry:
+            payload = json.loads(job.payload or "{}")
+            bulk_import.fail_archive_import(db, payload["batch_id"], Path(payload["archive_path"]), error)
+        return
+    if job.document_id is not None:
+        document_ids = [job.document_id]
+    else:
+        document_ids = json.loads(job.payload or "{}").get("document_ids", [])
+    if not document_ids:
+        return
+    documents = (
+        db.query(Document)
+        .filter(Document.id.in_(document_ids), Document.is_indexed.is_(False))
+        .all()
+    )
+    for document in documents:
+        document.index_status = "queued" if will_retry else "failed"
+        document.index_error = error
+    db.commit()
+
+
+def process_job(db: Session, job: Job):
+    """Run a claimed job and record its outcome, unless another worker took it over meanwhile"""
+    worker = job.locked_by
+    started = time.perf_counter()
+    try:
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise PermanentJobError(f"Unknown job kind: {job.kind}")
+        with job_queue.heartbeat(job.id, worker):
+            handler(db, job)
+    except Exception as e:
+        db.rollback()
+        duration = time.perf_counter() - started
+        error = f"{type(e).__name__}: {e}"
+        will_retry = job_queue.fail_job(
+            db, job, error, duration, worker, retry=not isinstance(e, PermanentJobError)
+        )
+        if will_retry is None:
+            print(f"Job {job.id} ({job.kind}) failed after its lock was taken over: {error}")
+            return
+        metrics.JOBS.labels(job.kind, "retried" if will_retry else "failed").inc()
+        metrics.JOB_SECONDS.labels(job.kind).observe(duration)
+        _record_document_failure(db, job, error, will_retry)
+        print(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {error}")
+        if not will_retry and not isinstance(e, PermanentJobError):
+            traceback.print_exc()
+        return
+
+    duration = time.perf_counter() - started
+    if not job_queue.complete_job(db, job, duration, worker):
+        print(f"Job {job.id} ({job.kind}) finished after its lock was taken over, leaving it to the new owner")
+        return
+    metrics.JOBS.labels(job.kind, "succeeded").inc()
+    metrics.JOB_SECONDS.labels(job.kind).observe(duration)
+
+
+def run_worker(worker_id: int, stop_event=None):
+    """Claim and process jobs until the stop event is set"""
+    worker = job_queue.worker_identity(worker_id)
+    print(f"Index worker {worker} started")
+    while stop_event is None or not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            job = job_queue.claim_next_job(db, worker)
+            if job is not None:
+                process_job(db, job)
+        except Exception as e:
+            print(f"Index worker {worker} error: {e}")
+            job = None
+        finally:
+            db.close()
+
+        if job is None:
+            if stop_event is not None:
+                stop_event.wait(settings.JOB_POLL_INTERVAL)
+            else:
+                time.sleep(settings.JOB_POLL_INTERVAL)
+    print(f"Index worker {worker} stopped")
+
+
+def _worker_main(worker_id: int, threads: int, stop_event):
+    # Let the parent decide when to stop; Ctrl+C would otherwise interrupt jobs mid-write
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        os.environ["MKL_NUM_THREADS"] = str(threads)
+    run_worker(worker_id, stop_event)
+
+
+_processes: List[multiprocessing.Process] = []
+_threads: List[threading.Thread] = []
+_stop_event = None
+
+
+def _vector_store_multiprocess_safe() -> bool:
+    from app.services.rag_service import rag_service
+
+    return rag_service.vector_store.multiprocess_safe
+
+
+def start_worker_pool(count: int):
+    """Start ``count`` workers: processes, or threads of this process for an in-process Chroma store"""
+    global _stop_event
+
+    db = SessionLocal()
+    try:
+        released = job_queue.release_orphaned_jobs(db)
+        if released:
+            print(f"Requeued {released} jobs left running by a previous process")
+    finally:
+        db.close()
+
+    if not _vector_store_multiprocess_safe():
+        print("Vector store can only be used by this process, running the index workers as threads")
+        _stop_event = threading.Event()
+        for worker_id in range(count):
+            thread = threading.Thread(
+                target=run_worker, args=(worker_id, _stop_event), name=f"index-worker-{worker_id}", daemon=True
+            )
+            thread.start()
+            _threads.append(thread)
+        return
+
+    threads = settings.INDEX_WORKER_THREADS or max(1, (os.cpu_count() or 1) // count)
+    # Spawn rather than fork so workers never inherit torch or SQLite state
+    context = multiprocessing.get_context("spawn")
+    _stop_event = context.Event()
+    for worker_id in range(count):
+        process = context.Process(
+            target=_worker_main,
+            args=(worker_id, threads, _stop_event),
+            name=f"index-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        _processes.append(process)
+
+
+def stop_worker_pool(timeout: Optional[float] = 30):
+    """Ask the workers to finish their current job and exit"""
+    if _stop_event is not None:
+        _stop_event.set()
+    for process in _processes:
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+        metrics.mark_process_dead(process.pid)
+    _processes.clear()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
+
+
+def main():
+    init_db()
+    if not _vector_store_multiprocess_safe():
+        raise SystemExit(
+            "The in-process Chroma store can only be used by the API process: set INDEX_WORKERS to run "
+            "the workers inside it, or CHROMA_SERVER_HOST to share a Chroma server between processes"
+        )
+    count = max(1, settings.INDEX_WORKERS)
+    start_worker_pool(count)
+    try:
+        while any(process.is_alive() for process in _processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_worker_pool()
+
+
+if __name__ == "__main__":
+    main()
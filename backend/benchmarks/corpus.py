@@ -0,0 +1,211 @@
+"""Synthetic Turkish legal corpus with known facts, for benchmarks"""
+import random
+import textwrap
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+TOPICS = [
+    ("Kira bedeli", "aylık {amount} TL"),
+    ("Depozito tutarı", "{amount} TL"),
+    ("Cezai şart", "{amount} TL"),
+    ("Avukatlık ücreti", "{amount} TL"),
+    ("Gecikme faizi oranı", "yıllık yüzde {percent}"),
+    ("Sözleşme süresi", "{months} ay"),
+    ("Teslim tarihi", "{day} {month} {year}"),
+    ("Ödeme günü", "her ayın {dayn}. günü"),
+    ("Yetkili mahkeme", "{city} mahkemeleri"),
+    ("Fesih bildirim süresi", "{days} gün"),
+    ("Aidat tutarı", "aylık {amount} TL"),
+    ("Tazminat miktarı", "{amount} TL"),
+    ("Hizmet bedeli", "{amount} TL"),
+    ("Deneme süresi", "{months} ay"),
+    ("Yıllık izin süresi", "{days} gün"),
+    ("Teminat mektubu tutarı", "{amount} TL"),
+    ("Sigorta bedeli", "{amount} TL"),
+    ("Arabuluculuk ücreti", "{amount} TL"),
+    ("Bakım ücreti", "{amount} TL"),
+    ("Kira artış oranı", "yüzde {percent}"),
+]
+
+FILLER = [
+    "Taraflar bu sözleşmede yer alan hükümlere iyi niyet kuralları çerçevesinde uymayı kabul ve taahhüt eder.",
+    "İşbu madde hükmü, Türk Borçlar Kanunu'nun ilgili hükümleri saklı kalmak kaydıyla uygulanır.",
+    "Bu hükmün uygulanmasında ortaya çıkabilecek uyuşmazlıklarda öncelikle sulh yoluna başvurulur.",
+    "Taraflardan birinin bu yükümlülüğü yerine getirmemesi halinde diğer taraf yazılı ihtarda bulunur.",
+    "Yapılacak tüm bildirimler taraflarca sözleşmede belirtilen adreslere noter aracılığıyla gönderilir.",
+    "Kiracı, kiralananı özenle kullanmak ve komşulara saygı göstermekle yükümlüdür.",
+    "Kiraya veren, kiralananı sözleşmede amaçlanan kullanıma elverişli bir durumda teslim eder.",
+    "Bu maddede düzenlenmeyen hususlarda yürürlükteki mevzuat hükümleri uygulanır.",
+    "Taraflar, işbu hükmün değiştirilmesinin ancak yazılı bir ek protokol ile mümkün olduğunu kabul eder.",
+    "Yargıtay 3. Hukuk Dairesi'nin yerleşik içtihatları da bu yorumu desteklemektedir.",
+    "Dava dilekçesinde belirtilen talepler, Hukuk Muhakemeleri Kanunu'nun 119. maddesine uygun olarak ileri sürülmüştür.",
+    "Davacı vekili, müvekkilinin zararının tazmin edilmesini talep etmiştir.",
+    "Davalı taraf, süresi içinde cevap dilekçesi sunarak davanın reddini istemiştir.",
+    "Bilirkişi raporunda tespit edilen hususlar dosya kapsamı ile uyumlu bulunmuştur.",
+    "Mahkemece yapılan yargılama sonucunda toplanan deliller birlikte değerlendirilmiştir.",
+]
+
+CITIES = ["İstanbul", "Ankara", "İzmir", "Bursa", "Antalya", "Kocaeli", "Eskişehir", "Trabzon"]
+MONTHS = ["Ocak", "Şubat", "Mart", "Nisan", "Mayıs", "Haziran", "Temmuz", "Ağustos", "Eylül", "Ekim", "Kasım", "Aralık"]
+ORDINALS = ["BİRİNCİ", "İKİNCİ", "ÜÇÜNCÜ", "DÖRDÜNCÜ", "BEŞİNCİ", "ALTINCI", "YEDİNCİ", "SEKİZİNCİ", "DOKUZUNCU", "ONUNCU"]
+
+
+class Fact(NamedTuple):
+    question: str
+    answer: str
+    article: int
+
+
+def _value(rng: random.Random, template: str) -> str:
+    return template.format(
+        amount=f"{rng.randint(1, 999)}.{rng.randint(0, 999):03d}",
+        percent=rng.randint(2, 60),
+        months=rng.randint(2, 60),
+        days=rng.randint(7, 120),
+        day=rng.randint(1, 28),
+        dayn=rng.randint(1, 28),
+        month=rng.choice(MONTHS),
+        year=rng.randint(2020, 2030),
+        city=rng.choice(CITIES)
+    )
+
+
+def generate_document(seed: int, articles: int = 40, filler_sentences: int = 8) -> Tuple[str, List[Fact]]:
+    """Generate a contract-like document with one fact per article.
+
+    Every document uses each topic at most once per block of len(TOPICS)
+    articles and gives it a unique value, so a question has exactly one answer.
+    """
+    rng = random.Random(seed)
+    lines = [f"KİRA SÖZLEŞMESİ NO {seed}", ""]
+    facts: List[Fact] = []
+    used_values = set()
+    topics = []
+    while len(topics) < articles:
+        block = TOPICS[:]
+        rng.shuffle(block)
+        topics.extend(block)
+
+    for number in range(1, articles + 1):
+        if number % 10 == 1:
+            lines += [f"{ORDINALS[(number // 10) % len(ORDINALS)]} BÖLÜM", ""]
+        topic, template = topics[number - 1]
+        value = _value(rng, template)
+        while value in used_values:
+            value = _value(rng, template)
+        used_values.add(value)
+
+        sentences = rng.sample(FILLER, min(filler_sentences, len(FILLER)))
+        position = rng.randint(0, len(sentences))
+        sentences.insert(position, f"{topic} {value} olarak belirlenmiştir.")
+        lines.append(f"MADDE {number} - {topic}")
+        # Split the article body into two paragraphs
+        half = len(sentences) // 2
+        lines += [" ".join(sentences[:half]), " ".join(sentences[half:]), ""]
+
+        # Only the first occurrence of a topic gets a question, so answers are unique
+        if number <= len(TOPICS):
+            facts.append(Fact(f"{topic} ne kadar olarak belirlenmiştir?", value, number))
+
+    return "\n".join(lines), facts
+
+
+# Helvetica's WinAnsi encoding has ç, ö and ü but none of these
+_PDF_FOLD = str.maketrans({"ş": "s", "Ş": "S", "ğ": "g", "Ğ": "G", "ı": "i", "İ": "I"})
+_PDF_LINE_CHARS = 95
+_PDF_PAGE_LINES = 60
+
+
+def pdf_text(text: str) -> str:
+    """The text as it ends up in a generated PDF"""
+    return text.translate(_PDF_FOLD)
+
+
+def _pdf_escape(line: str) -> bytes:
+    line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return line.encode("cp1252", errors="replace")
+
+
+def write_pdf(path: str, text: str):
+    """Write text as a PDF with one text line per source line, wrapped and paginated.
+
+    A minimal writer so benchmarks need no PDF library; Turkish letters that
+    the standard Helvetica font lacks are folded with ``pdf_text``.
+    """
+    lines: List[str] = []
+    for line in pdf_text(text).split("\n"):
+        lines.extend(textwrap.wrap(line, _PDF_LINE_CHARS) or [""])
+    pages = [lines[i:i + _PDF_PAGE_LINES] for i in range(0, len(lines), _PDF_PAGE_LINES)] or [[]]
+
+    # Objects 1-3 are the catalog, the page tree and the font; then a page and its content per page
+    objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_refs = []
+    for page_lines in pages:
+        content = b"BT /F1 10 Tf 12 TL 50 800 Td\n" + b"".join(
+            b"(" + _pdf_escape(line) + b") Tj T*\n" for line in page_lines
+        ) + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_docx(path: str, text: str):
+    import docx
+
+    document = docx.Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def write_txt(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+class CorpusFile(NamedTuple):
+    path: str
+    format: str
+    facts: List[Fact]  # answers as they appear in the file's extracted text
+
+
+def write_corpus(
+    directory: str,
+    formats: List[str],
+    documents: int,
+    articles: int = 40,
+    filler_sentences: int = 8
+) -> List[CorpusFile]:
+    """Write ``documents`` generated documents per format into ``directory``"""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    files: List[CorpusFile] = []
+    for format_index, file_format in enumerate(formats):
+        for i in range(documents):
+            seed = format_index * 100000 + i
+            text, facts = generate_document(seed, articles, filler_sentences)
+            path = str(Path(directory) / f"sozlesme_{seed}.{file_format}")
+            WRITERS[file_format](path, text)
+            if file_format == "pdf":
+                facts = [fact._replace(answer=pdf_text(fact.answer)) for fact in facts]
+            files.append(CorpusFile(path, file_format, facts))
+    return files
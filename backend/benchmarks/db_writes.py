@@ -0,0 +1,246 @@
+"""Concurrent database write throughput under the app's SQLite settings.
+
+Several processes (standing in for API workers and index workers), each with
+several threads, save chat messages, update job statuses and read chat
+history pages at the same time. Each configuration runs on a fresh database
+and reports committed writes per second, write latency percentiles and how
+many transactions failed with "database is locked".
+
+By default SQLite's own defaults (rollback journal, synchronous=FULL, the
+default pool) are compared with the app's settings (WAL, synchronous=NORMAL,
+sized pool):
+
+    cd backend && python -m benchmarks.db_writes --processes 4 --threads 8
+    cd backend && python -m benchmarks.db_writes --configs wal --mode async
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Environment of each configuration; unset settings keep the app defaults
+CONFIGS = {
+    "default": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        # pysqlite's default timeout, and SQLAlchemy's default pool
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "DATABASE_POOL_SIZE": "5",
+        "DATABASE_MAX_OVERFLOW": "10"
+    },
+    "wal": {}
+}
+
+JOBS = 100
+
+
+def configure_environment(workdir: Path, config: Dict[str, str], mode: str):
+    """Point the app at the configuration's database; must run before ``app`` is imported"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'benchmark.db'}"
+    os.environ["VECTOR_DB_PATH"] = str(workdir / "vector_db")
+    os.environ["METRICS_ENABLED"] = "false"
+    os.environ["DATABASE_ASYNC_ENABLED"] = "true" if mode == "async" else "false"
+    os.environ.update(config)
+
+
+def setup(workdir: Path, config: Dict[str, str]):
+    configure_environment(workdir, config, "sync")
+    from app.database import SessionLocal, init_db
+    from app.models import Case, Job
+
+    init_db()
+    db = SessionLocal()
+    try:
+        db.add(Case(id=1, title="Benchmark"))
+        db.add_all(Job(kind="index", status="queued", case_id=1, document_id=i) for i in range(JOBS))
+        db.commit()
+    finally:
+        db.close()
+
+
+def operations(read_ratio: float, seed: int):
+    """The database work of the app's hot paths, as functions of a session"""
+    from sqlalchemy import update
+    from app.models import ChatMessage, Job
+
+    rng = random.Random(seed)
+
+    def save_message(db):
+        db.add(ChatMessage(case_id=1, message="Soru?", response="Yanıt." * 50, sources='["sozlesme.pdf"]'))
+        db.commit()
+
+    def update_job(db):
+        db.execute(update(Job).where(Job.id == rng.randint(1, JOBS)).values(status=rng.choice(["running", "queued"])))
+        db.commit()
+
+    def read_history(db):
+        db.query(ChatMessage.id, ChatMessage.message, ChatMessage.response).filter(
+            ChatMessage.case_id == 1
+        ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(50).all()
+
+    def next_operation():
+        if rng.random() < read_ratio:
+            return "read", read_history
+        return "write", save_message if rng.random() < 0.75 else update_job
+
+    return next_operation
+
+
+def worker(workdir: Path, config: Dict[str, str], mode: str, threads: int, operations_per_thread: int,
+           read_ratio: float, seed: int, start, results):
+    configure_environment(workdir, config, mode)
+    from sqlalchemy.exc import OperationalError
+    from app.database import SessionLocal, run_with_session
+
+    stats = {"write": [], "read": [], "locked": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def record(kind: str, seconds: float = 0, error: Exception = None):
+        with lock:
+            if error is None:
+                stats[kind].append(seconds)
+            elif "locked" in str(error):
+                stats["locked"] += 1
+            else:
+                stats["errors"] += 1
+
+    def run_thread(thread: int):
+        next_operation = operations(read_ratio, seed * 1000 + thread)
+        for _ in range(operations_per_thread):
+            kind, operation = next_operation()
+            db = SessionLocal()
+            started = time.perf_counter()
+            try:
+                operation(db)
+                record(kind, time.perf_counter() - started)
+            except OperationalError as e:
+                db.rollback()
+                record(kind, error=e)
+            finally:
+                db.close()
+
+    async def run_task(thread: int):
+        next_operation = operations(read_ratio, seed * 1000 + thread)
+        for _ in range(operations_per_thread):
+            kind, operation = next_operation()
+            started = time.perf_counter()
+            try:
+                await run_with_session(operation)
+                record(kind, time.perf_counter() - started)
+            except OperationalError as e:
+                record(kind, error=e)
+
+    async def run_tasks():
+        await asyncio.gather(*(run_task(thread) for thread in range(threads)))
+
+    start.wait()
+    try:
+        if mode == "async":
+            asyncio.run(run_tasks())
+        else:
+            pool = [threading.Thread(target=run_thread, args=(thread,)) for thread in range(threads)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+    finally:
+        # Also on failure, so the parent isn't left waiting
+        results.put(stats)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(values, 95)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 2)
+    }
+
+
+def run(name: str, args: argparse.Namespace) -> Dict:
+    config = CONFIGS[name]
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench_db_{name}_"))
+    # Fresh interpreters, so each one reads the configuration's settings
+    context = multiprocessing.get_context("spawn")
+    try:
+        process = context.Process(target=setup, args=(workdir, config))
+        process.start()
+        process.join()
+
+        start = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(
+                workdir, config, args.mode, args.threads, args.operations, args.read_ratio, seed, start, results
+            ))
+            for seed in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        # Let the workers import the app before timing starts
+        time.sleep(args.startup_seconds)
+        started = time.perf_counter()
+        start.set()
+        stats = [results.get() for _ in processes]
+        seconds = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    writes = [latency for result in stats for latency in result["write"]]
+    reads = [latency for result in stats for latency in result["read"]]
+    return {
+        "config": name,
+        "mode": args.mode,
+        "processes": args.processes,
+        "threads": args.threads,
+        "settings": config,
+        "seconds": round(seconds, 2),
+        "writes": len(writes),
+        "writes_per_sec": round(len(writes) / seconds, 1),
+        "write_latency": percentiles(writes),
+        "reads": len(reads),
+        "read_latency": percentiles(reads),
+        "locked": sum(result["locked"] for result in stats),
+        "errors": sum(result["errors"] for result in stats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", choices=sorted(CONFIGS), default=["default", "wal"])
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync",
+                        help="Threads with sync sessions, or asyncio tasks using run_with_session")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="Threads (or tasks) per process")
+    parser.add_argument("--operations", type=int, default=200, help="Operations per thread")
+    parser.add_argument("--read-ratio", type=float, default=0.3, help="Share of operations that read chat history")
+    parser.add_argument("--startup-seconds", type=float, default=3.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.configs:
+        result = run(name, args)
+        print(json.dumps(result))
+        results.append(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""End-to-end RAG benchmark on a synthetic Turkish legal corpus.
+
+Writes generated PDF, DOCX and TXT contracts with known facts, ingests them
+through the upload route and the job queue (or ``RAGService.index_document``
+directly), then asks one question per fact through ``POST /api/chat`` with
+Gemini replaced by a deterministic stub of configurable latency. Reports
+ingestion throughput, chat latency percentiles, retrieval recall@k and peak
+memory, and writes them to a JSON results file. Runs against a fresh
+database and vector store in a temporary directory.
+
+    cd backend && python -m benchmarks.e2e --documents 3 --articles 40 --llm-latency 0.5
+    cd backend && python -m benchmarks.e2e --output new.json --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.corpus import WRITERS, CorpusFile, Fact, write_corpus
+from benchmarks.stub_llm import StubGeminiModel
+
+
+def configure_environment(workdir: Path, workers: int):
+    """Point the app at a scratch database and storage; must run before ``app`` is imported"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'benchmark.db'}"
+    os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+    os.environ["VECTOR_DB_PATH"] = str(workdir / "vector_db")
+    os.environ["INDEX_WORKERS"] = str(workers)
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean_ms": round(float(np.mean(values)) * 1000, 2),
+        "p50_ms": round(float(np.percentile(values, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(values, 95)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(values, 99)) * 1000, 2),
+        "max_ms": round(float(np.max(values)) * 1000, 2)
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def normalize(text: str) -> str:
+    # PDF extraction breaks lines where the writer wrapped them
+    return " ".join(text.split())
+
+
+def create_cases(client, files: List[CorpusFile]) -> List[int]:
+    # One case per file: every document answers the same questions with different values
+    case_ids = []
+    for i, corpus_file in enumerate(files):
+        response = client.post(
+            "/api/cases/",
+            json={"title": f"Benchmark {Path(corpus_file.path).name}", "case_number": f"BENCH-{i}"}
+        )
+        response.raise_for_status()
+        case_ids.append(response.json()["id"])
+    return case_ids
+
+
+def wait_for_jobs(client, job_ids: List[int], timeout: float) -> List[Dict]:
+    deadline = time.perf_counter() + timeout
+    pending = set(job_ids)
+    jobs = {}
+    while pending:
+        for job_id in list(pending):
+            job = client.get(f"/api/documents/jobs/{job_id}").json()
+            if job["status"] in ("succeeded", "failed"):
+                jobs[job_id] = job
+                pending.discard(job_id)
+        if pending:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{len(pending)} indexing jobs still pending after {timeout}s")
+            time.sleep(0.2)
+    return [jobs[job_id] for job_id in job_ids]
+
+
+def ingest_http(client, files: List[CorpusFile], case_ids: List[int], workers: int, timeout: float) -> Dict:
+    """Upload every file through the documents route and run the indexing jobs"""
+    from app import worker
+    from app.database import SessionLocal
+    from app.services import job_queue
+
+    upload_latencies = []
+    job_ids = []
+    started = time.perf_counter()
+    for corpus_file, case_id in zip(files, case_ids):
+        request_started = time.perf_counter()
+        with open(corpus_file.path, "rb") as f:
+            response = client.post(
+                f"/api/documents/{case_id}", files={"file": (Path(corpus_file.path).name, f)}
+            )
+        response.raise_for_status()
+        upload_latencies.append(time.perf_counter() - request_started)
+        job_ids.append(response.json()["job_id"])
+    upload_seconds = time.perf_counter() - started
+
+    if workers == 0:
+        # No worker processes: drain the queue in this process
+        db = SessionLocal()
+        try:
+            while True:
+                job = job_queue.claim_next_job(db, job_queue.worker_identity(0))
+                if job is None:
+                    break
+                worker.process_job(db, job)
+        finally:
+            db.close()
+    jobs = wait_for_jobs(client, job_ids, timeout)
+
+    return {
+        "upload_seconds": round(upload_seconds, 3),
+        "upload": percentiles(upload_latencies),
+        "failed_jobs": sum(1 for job in jobs if job["status"] == "failed")
+    }
+
+
+def ingest_direct(files: List[CorpusFile], case_ids: List[int]) -> Dict:
+    """Index every file with ``RAGService.index_document``, bypassing the upload route and queue"""
+    from app.database import SessionLocal
+    from app.models import Document
+    from app.services.query_cache import bump_case_index_version
+    from app.services.rag_service import rag_service
+
+    db = SessionLocal()
+    try:
+        for corpus_file, case_id in zip(files, case_ids):
+            document = Document(
+                case_id=case_id,
+                filename=Path(corpus_file.path).name,
+                file_path=corpus_file.path,
+                file_size=os.path.getsize(corpus_file.path),
+                index_status="indexing"
+            )
+            db.add(document)
+            db.commit()
+            stats = rag_service.index_document(case_id, document.id, document.file_path, document.filename)
+            document.is_indexed = True
+            document.index_status = "indexed"
+            document.index_duration = stats["seconds"]
+            bump_case_index_version(db, case_id, commit=False)
+            db.commit()
+    finally:
+        db.close()
+    return {}
+
+
+def run_ingestion(client, files: List[CorpusFile], case_ids: List[int], args) -> Dict:
+    from app.services.rag_service import rag_service
+
+    # Capture the per-document stats of in-process indexing
+    index_stats: List[Dict] = []
+    index_document = rag_service.index_document
+
+    def recording_index_document(*a, **kw):
+        stats = index_document(*a, **kw)
+        index_stats.append(stats)
+        return stats
+
+    rag_service.index_document = recording_index_document
+    started = time.perf_counter()
+    try:
+        if args.ingest == "http":
+            result = ingest_http(client, files, case_ids, args.workers, args.timeout)
+        else:
+            result = ingest_direct(files, case_ids)
+    finally:
+        del rag_service.index_document
+    seconds = time.perf_counter() - started
+
+    total_bytes = sum(os.path.getsize(corpus_file.path) for corpus_file in files)
+    chunks = sum(sum(rag_service.vector_store.document_counts(case_id).values()) for case_id in case_ids)
+    by_format = {}
+    for file_format in sorted({corpus_file.format for corpus_file in files}):
+        format_stats = [
+            stats for corpus_file, stats in zip(files, index_stats) if corpus_file.format == file_format
+        ] if len(index_stats) == len(files) else []
+        if format_stats:
+            index_seconds = sum(stats["seconds"] for stats in format_stats)
+            by_format[file_format] = {
+                "documents": len(format_stats),
+                "text_megabytes": round(sum(stats["text_bytes"] for stats in format_stats) / 2**20, 3),
+                "chunks": sum(stats["chunks"] for stats in format_stats),
+                "index_seconds": round(index_seconds, 3),
+                "chunks_per_sec": round(sum(stats["chunks"] for stats in format_stats) / index_seconds, 1)
+            }
+
+    return {
+        "mode": args.ingest,
+        "workers": args.workers,
+        "documents": len(files),
+        "megabytes": round(total_bytes / 2**20, 3),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "documents_per_sec": round(len(files) / seconds, 3),
+        "megabytes_per_sec": round(total_bytes / 2**20 / seconds, 3),
+        "chunks_per_sec": round(chunks / seconds, 1),
+        "by_format": by_format,
+        **result
+    }
+
+
+def questions_for(files: List[CorpusFile], case_ids: List[int], per_document: int) -> List[Tuple[int, Fact]]:
+    return [(case_id, fact) for corpus_file, case_id in zip(files, case_ids) for fact in corpus_file.facts[:per_document]]
+
+
+def run_retrieval(questions: List[Tuple[int, Fact]], top_k: int) -> Dict:
+    """Recall@k and MRR of retrieval alone, from cold retrieval caches.
+
+    Context recall is the share of questions whose answer is in the context
+    actually sent to the LLM, after context packing.
+    """
+    from app.services.rag_service import rag_service
+
+    rag_service.query_embedding_cache.clear()
+    rag_service.retrieval_cache.clear()
+    latencies = []
+    hits = 0
+    reciprocal_ranks = 0.0
+    context_hits = 0
+    context_tokens = []
+    tokens_saved = []
+    for case_id, fact in questions:
+        started = time.perf_counter()
+        retrieval = rag_service.retrieve(case_id, fact.question, top_k)
+        latencies.append(time.perf_counter() - started)
+        chunks = retrieval["relevant_chunks"] if retrieval else []
+        answer = normalize(fact.answer)
+        for rank, chunk in enumerate(chunks, 1):
+            if answer in normalize(chunk):
+                hits += 1
+                reciprocal_ranks += 1 / rank
+                break
+
+        prepared = rag_service.prepare_query(case_id, fact.question, top_k)
+        context_hits += any(answer in normalize(chunk) for chunk in prepared["relevant_chunks"])
+        if prepared.get("context_tokens") is not None:
+            context_tokens.append(prepared["context_tokens"])
+            tokens_saved.append(prepared["tokens_saved"])
+    return {
+        "questions": len(questions),
+        "top_k": top_k,
+        f"recall@{top_k}": round(hits / len(questions), 4) if questions else None,
+        "mrr": round(reciprocal_ranks / len(questions), 4) if questions else None,
+        "context_recall": round(context_hits / len(questions), 4) if questions else None,
+        "context_tokens_mean": round(float(np.mean(context_tokens)), 1) if context_tokens else None,
+        "tokens_saved_mean": round(float(np.mean(tokens_saved)), 1) if tokens_saved else None,
+        "latency": percentiles(latencies)
+    }
+
+
+def run_chat(client, questions: List[Tuple[int, Fact]], concurrency: int, stub: StubGeminiModel) -> Dict:
+    from app.services.rag_service import rag_service
+
+    # Cold caches, so every chat pays for embedding the question and searching
+    rag_service.query_embedding_cache.clear()
+    rag_service.retrieval_cache.clear()
+    calls_before, prompt_chars_before = stub.calls, stub.prompt_chars
+
+    def ask(question: Tuple[int, Fact]) -> Tuple[float, bool]:
+        case_id, fact = question
+        started = time.perf_counter()
+        response = client.post("/api/chat/", json={"case_id": case_id, "message": fact.question, "use_cache": False})
+        return time.perf_counter() - started, response.status_code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(ask, questions))
+    seconds = time.perf_counter() - started
+
+    calls = stub.calls - calls_before
+    return {
+        "questions": len(questions),
+        "concurrency": concurrency,
+        "errors": sum(1 for _, ok in results if not ok),
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(len(questions) / seconds, 2) if seconds > 0 else None,
+        "latency": percentiles([latency for latency, _ in results]),
+        "llm_calls": calls,
+        "prompt_chars_mean": round((stub.prompt_chars - prompt_chars_before) / calls, 1) if calls else None
+    }
+
+
+def run(args, workdir: Path) -> Dict:
+    configure_environment(workdir, args.workers)
+
+    from fastapi.testclient import TestClient
+    from app.config import settings
+    from app.main import app
+    from app.services.rag_service import rag_service
+
+    stub = StubGeminiModel(args.llm_latency, args.llm_jitter)
+    rag_service.gemini_model = stub
+    # The stub takes any generation config, so google-generativeai is not needed
+    rag_service.generation_config = lambda temperature: {"temperature": temperature}
+
+    started = time.perf_counter()
+    files = write_corpus(str(workdir / "corpus"), args.formats, args.documents, args.articles, args.filler_sentences)
+    corpus_seconds = time.perf_counter() - started
+
+    results = {
+        "run": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {
+                name: getattr(settings, name)
+                for name in (
+                    "EMBEDDING_MODEL", "EMBEDDING_MAX_SEQ_LENGTH", "EMBEDDING_BATCH_SIZE", "CHUNKER",
+                    "CHUNK_MAX_TOKENS", "CHUNK_OVERLAP_SENTENCES", "VECTOR_STORE", "HYBRID_SEARCH_ENABLED",
+                    "CROSS_CASE_SEARCH_ENABLED", "EMBEDDING_CACHE_ENABLED"
+                )
+            },
+            "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "keep")}
+        },
+        "corpus": {
+            "documents": len(files),
+            "formats": args.formats,
+            "articles": args.articles,
+            "megabytes": round(sum(os.path.getsize(f.path) for f in files) / 2**20, 3),
+            "generate_seconds": round(corpus_seconds, 3)
+        },
+        "memory": {"start_peak_rss_mb": peak_rss_mb()}
+    }
+
+    with TestClient(app) as client:
+        case_ids = create_cases(client, files)
+
+        started = time.perf_counter()
+        rag_service.warmup(include_llm=False)
+        results["run"]["warmup_seconds"] = round(time.perf_counter() - started, 3)
+        results["memory"]["after_warmup_peak_rss_mb"] = peak_rss_mb()
+
+        results["ingestion"] = run_ingestion(client, files, case_ids, args)
+        print(json.dumps({"ingestion": results["ingestion"]}, ensure_ascii=False))
+        results["memory"]["after_ingestion_peak_rss_mb"] = peak_rss_mb()
+
+        questions = questions_for(files, case_ids, args.questions_per_document)
+        results["retrieval"] = run_retrieval(questions, args.top_k)
+        print(json.dumps({"retrieval": results["retrieval"]}, ensure_ascii=False))
+
+        results["chat"] = run_chat(client, questions, args.concurrency, stub)
+        print(json.dumps({"chat": results["chat"]}, ensure_ascii=False))
+        results["memory"]["peak_rss_mb"] = peak_rss_mb()
+
+    results["memory"]["disk_mb"] = round(
+        sum(f.stat().st_size for f in (workdir / "vector_db").rglob("*") if f.is_file()) / 2**20, 2
+    )
+    return results
+
+
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if key == "run":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results: Dict, baseline: Dict) -> Dict[str, Dict]:
+    """Relative change of every numeric metric present in both runs"""
+    current, previous = _flatten(results), _flatten(baseline)
+    changes = {}
+    for name, value in current.items():
+        before = previous.get(name)
+        if before is None or before == value:
+            continue
+        changes[name] = {
+            "baseline": before,
+            "current": value,
+            "change": round((value - before) / abs(before), 4) if before else None
+        }
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", choices=sorted(WRITERS), default=["pdf", "docx", "txt"])
+    parser.add_argument("--documents", type=int, default=3, help="Documents per format")
+    parser.add_argument("--articles", type=int, default=40, help="Articles per document, sets the document size")
+    parser.add_argument("--filler-sentences", type=int, default=8, help="Sentences per article besides the fact")
+    parser.add_argument("--ingest", choices=["http", "direct"], default="http",
+                        help="Upload route and job queue, or RAGService.index_document directly")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Index worker processes; 0 runs the indexing jobs in this process")
+    parser.add_argument("--questions-per-document", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent chat requests")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stub LLM takes per answer")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="Extra seconds, 0 to this, per prompt")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds to wait for indexing jobs")
+    parser.add_argument("--workdir", help="Directory for the database, uploads and vector store (default: temporary)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    parser.add_argument("--output", default=f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json",
+                        help="Results file (default: e2e-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench_e2e_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        results = run(args, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["comparison"] = compare(results, json.load(f))
+        for name, change in results["comparison"].items():
+            print(json.dumps({name: change}))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Compare the embedding backends on a synthetic corpus.
+
+Each backend embeds the same legal chunks and questions. Reports chunk
+throughput, single-question latency and, against the first backend (the
+reference, by default torch fp32): the cosine similarity between the two
+embeddings of each text and recall@k, the share of the reference's top-k
+chunks per question that the backend also returns. hit_rate@k counts the
+questions whose answer is in the backend's own top-k.
+
+    cd backend && python -m benchmarks.embedding_backends --threads 1 4 --batch-sizes 16 64
+    cd backend && python -m benchmarks.embedding_backends --backends torch onnx-int8 --documents 10
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.chunking import LegalTextChunker
+from app.services.embedding_backends import load_model
+from benchmarks.corpus import generate_document
+
+BACKENDS = {
+    "torch": ("torch", False),
+    "onnx": ("onnx", False),
+    "onnx-int8": ("onnx", True)
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3)
+
+
+def build_corpus(model, documents: int, articles: int) -> List[Tuple[List[str], List]]:
+    """(chunks, facts) per document, chunked like the app does"""
+    tokenizer = model.tokenizer
+    chunker = LegalTextChunker(
+        count_tokens=lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"]),
+        max_tokens=settings.CHUNK_MAX_TOKENS,
+        min_tokens=settings.CHUNK_MIN_TOKENS,
+        overlap_sentences=settings.CHUNK_OVERLAP_SENTENCES
+    )
+    corpus = []
+    for seed in range(documents):
+        text, facts = generate_document(seed, articles)
+        corpus.append(([chunk.text for chunk in chunker.chunk_text(text)], facts))
+    return corpus
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def embed(model, corpus, batch_size: int, latency_queries: int) -> Dict:
+    chunks = [chunk for document_chunks, _ in corpus for chunk in document_chunks]
+    questions = [fact.question for _, facts in corpus for fact in facts]
+    model.encode(chunks[:batch_size], batch_size=batch_size, show_progress_bar=False)
+
+    started = time.perf_counter()
+    chunk_vectors = model.encode(chunks, batch_size=batch_size, show_progress_bar=False)
+    chunk_seconds = time.perf_counter() - started
+    question_vectors = model.encode(questions, batch_size=batch_size, show_progress_bar=False)
+
+    # Chat questions are embedded one at a time
+    latencies = []
+    for question in questions[:latency_queries]:
+        started = time.perf_counter()
+        model.encode([question], batch_size=1, show_progress_bar=False)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "chunks": normalized(np.asarray(chunk_vectors, dtype=np.float32)),
+        "questions": normalized(np.asarray(question_vectors, dtype=np.float32)),
+        "chunks_per_sec": round(len(chunks) / chunk_seconds, 1),
+        "query_ms_p50": percentile(latencies, 50),
+        "query_ms_p95": percentile(latencies, 95)
+    }
+
+
+def rankings(corpus, vectors: Dict, top_k: int) -> List[List[int]]:
+    """Top-k chunk indexes within its document, for every question"""
+    ranked = []
+    chunk_start = question_start = 0
+    for document_chunks, facts in corpus:
+        chunks = vectors["chunks"][chunk_start:chunk_start + len(document_chunks)]
+        questions = vectors["questions"][question_start:question_start + len(facts)]
+        for row in questions @ chunks.T:
+            ranked.append([int(i) for i in np.argsort(-row)[:top_k]])
+        chunk_start += len(document_chunks)
+        question_start += len(facts)
+    return ranked
+
+
+def compare(corpus, reference: Dict, vectors: Dict, top_k: int) -> Dict:
+    cosines = np.concatenate([
+        np.sum(reference["chunks"] * vectors["chunks"], axis=1),
+        np.sum(reference["questions"] * vectors["questions"], axis=1)
+    ])
+    reference_ranked, ranked = rankings(corpus, reference, top_k), rankings(corpus, vectors, top_k)
+    recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(reference_ranked, ranked)])
+
+    hits = 0
+    facts = [(document_chunks, fact) for document_chunks, document_facts in corpus for fact in document_facts]
+    for (document_chunks, fact), best in zip(facts, ranked):
+        hits += any(fact.answer in document_chunks[i] for i in best)
+    return {
+        "cosine_mean": round(float(cosines.mean()), 6),
+        "cosine_min": round(float(cosines.min()), 6),
+        f"recall@{top_k}": round(float(recall), 4),
+        f"hit_rate@{top_k}": round(hits / len(facts), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--max-seq-length", type=int, default=settings.EMBEDDING_MAX_SEQ_LENGTH)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS),
+                        help="The first one is the reference for drift and recall")
+    parser.add_argument("--threads", type=int, nargs="+", default=[settings.EMBEDDING_THREADS or os.cpu_count() or 1])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[settings.EMBEDDING_BATCH_SIZE])
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--articles", type=int, default=40)
+    parser.add_argument("--latency-queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    reference = None
+    corpus = None
+    results = []
+    for name in args.backends:
+        backend, quantize = BACKENDS[name]
+        for threads in args.threads:
+            started = time.perf_counter()
+            model = load_model(args.model, args.max_seq_length, backend=backend, quantize=quantize, threads=threads)
+            load_seconds = round(time.perf_counter() - started, 2)
+            if corpus is None:
+                corpus = build_corpus(model, args.documents, args.articles)
+            for batch_size in args.batch_sizes:
+                vectors = embed(model, corpus, batch_size, args.latency_queries)
+                if reference is None:
+                    reference = vectors
+                result = {
+                    "backend": name,
+                    "threads": threads,
+                    "batch_size": batch_size,
+                    "load_seconds": load_seconds,
+                    "chunks_per_sec": vectors["chunks_per_sec"],
+                    "query_ms_p50": vectors["query_ms_p50"],
+                    "query_ms_p95": vectors["query_ms_p95"],
+                    **compare(corpus, reference, vectors, args.top_k)
+                }
+                print(json.dumps(result))
+                results.append(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Deterministic stand-in for the Gemini model, for benchmarks without an API key"""
+import asyncio
+import hashlib
+import time
+from typing import AsyncIterator, List
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StubStream:
+    def __init__(self, parts: List[str], delay: float):
+        self.parts = parts
+        self.delay = delay
+
+    async def __aiter__(self) -> AsyncIterator[StubResponse]:
+        for part in self.parts:
+            await asyncio.sleep(self.delay)
+            yield StubResponse(part)
+
+
+class StubGeminiModel:
+    """Answers every prompt after a fixed latency plus prompt-dependent jitter.
+
+    The answer and the delay only depend on the prompt, so runs are
+    repeatable. Mirrors the parts of ``genai.GenerativeModel`` the app uses.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, stream_parts: int = 20):
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_parts = stream_parts
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _digest(self, prompt: str) -> bytes:
+        return hashlib.sha256(prompt.encode("utf-8")).digest()
+
+    def _delay(self, prompt: str) -> float:
+        return self.latency + self.jitter * self._digest(prompt)[0] / 255
+
+    def _answer(self, prompt: str) -> str:
+        return f"Stub yanıtı {self._digest(prompt).hex()[:16]} ({len(prompt)} karakterlik istem)."
+
+    def generate_content(self, prompt: str, generation_config=None, stream: bool = False) -> StubResponse:
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        time.sleep(self._delay(prompt))
+        return StubResponse(self._answer(prompt))
+
+    async def generate_content_async(self, prompt: str, generation_config=None, stream: bool = False):
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        answer = self._answer(prompt)
+        if not stream:
+            await asyncio.sleep(self._delay(prompt))
+            return StubResponse(answer)
+        words = answer.split(" ")
+        size = max(1, -(-len(words) // self.stream_parts))
+        parts = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        return _StubStream(parts, self._delay(prompt) / len(parts))
@@ -0,0 +1,109 @@
+"""Compare the vector store backends on random embeddings.
+
+For each case size, inserts clustered unit vectors into a fresh store and
+reports insert throughput, query latency percentiles, recall@k against an
+exact search, disk size and resident memory growth.
+
+    cd backend && python -m benchmarks.vector_store --sizes 1000 10000 50000
+"""
+import argparse
+import json
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.vector_store import create_vector_store
+
+
+def make_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    # Embeddings of real text are clustered, not uniform on the sphere
+    centers = rng.standard_normal((max(count // 100, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3)
+
+
+def disk_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def run(backend: str, size: int, dim: int, queries: int, top_k: int, batch_size: int) -> Dict:
+    rng = np.random.default_rng(size)
+    vectors = make_vectors(rng, size, dim)
+    questions = make_vectors(rng, queries, dim)
+    exact = np.argsort(-(questions @ vectors.T), axis=1)[:, :top_k]
+
+    path = Path(tempfile.mkdtemp(prefix=f"bench_{backend}_"))
+    try:
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        store = create_vector_store(backend, str(path))
+        started = time.perf_counter()
+        for start in range(0, size, batch_size):
+            rows = range(start, min(start + batch_size, size))
+            store.upsert(
+                1,
+                [f"doc_1_chunk_{i}" for i in rows],
+                vectors[start:start + len(rows)].tolist(),
+                [f"chunk {i}" for i in rows],
+                [{"document_id": 1, "filename": "bench.txt", "case_id": 1, "chunk_index": i} for i in rows]
+            )
+        insert_seconds = time.perf_counter() - started
+
+        latencies = []
+        hits = 0
+        for question, expected in zip(questions, exact):
+            started = time.perf_counter()
+            ids = store.query(1, question.tolist(), top_k)[0]
+            latencies.append(time.perf_counter() - started)
+            found = {int(chunk_id.rsplit("_", 1)[1]) for chunk_id in ids}
+            hits += len(found & set(expected.tolist()))
+
+        return {
+            "backend": backend,
+            "vectors": size,
+            "dim": dim,
+            "insert_per_sec": round(size / insert_seconds, 1),
+            "query_p50_ms": percentile(latencies, 50),
+            "query_p95_ms": percentile(latencies, 95),
+            "query_p99_ms": percentile(latencies, 99),
+            f"recall@{top_k}": round(hits / (queries * top_k), 4),
+            "disk_mb": round(disk_size(path) / 2**20, 2),
+            # ru_maxrss is in KiB on Linux; growth of the peak, so only indicative
+            "peak_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1)
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for backend in args.backends:
+            result = run(backend, size, args.dim, args.queries, args.top_k, args.batch_size)
+            print(json.dumps(result))
+            results.append(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Settings are read once at import, so point everything at a scratch directory
+# before any app module is imported (tests delete what they write to the database)
+_tmp = tempfile.mkdtemp(prefix="avukat-tests-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/avukat.db"
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["VECTOR_DB_PATH"] = os.path.join(_tmp, "vector_db")
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["INDEX_WORKERS"] = "0"
+os.environ["WARMUP_ON_STARTUP"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def db():
+    from app.database import Base, SessionLocal, engine, init_db
+
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
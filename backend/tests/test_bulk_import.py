@@ -0,0 +1,154 @@
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.models import Case, Document, ImportBatch, Job
+from app.services import bulk_import
+from app.services.bulk_import import (
+    IMPORT_EXTRACTING, IMPORT_FAILED, IMPORT_IMPORTED, ImportEntry, import_entries, iter_archive_entries
+)
+from app.services.uploads import hash_file
+
+
+@pytest.fixture
+def case_id(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE_MB", 1)
+    case = Case(title="kira")
+    db.add(case)
+    db.commit()
+    return case.id
+
+
+def make_archive(path, files):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return path
+
+
+def skipped(batch):
+    return {item["name"]: item["reason"] for item in json.loads(batch.skipped)}
+
+
+def test_archive_entries_skip_folders_and_hidden_files(tmp_path):
+    path = make_archive(tmp_path / "a.zip", {
+        "dir/": "", "dir/a.txt": "a", "__MACOSX/dir/._a.txt": "x", "dir/.DS_Store": "x", "b.pdf": "b"
+    })
+    with zipfile.ZipFile(path) as archive:
+        assert [entry.name for entry in iter_archive_entries(archive)] == ["dir/a.txt", "b.pdf"]
+
+
+def test_skip_reasons(db, case_id, tmp_path):
+    existing = tmp_path / "existing.txt"
+    existing.write_text("zaten davada")
+    db.add(Document(
+        case_id=case_id, filename="existing.txt", file_path=str(existing), file_size=12,
+        content_hash=hash_file(existing)
+    ))
+    db.commit()
+
+    path = make_archive(tmp_path / "a.zip", {
+        "dilekce.txt": "Davacı vekili dilekçesinde",
+        "kopya/dilekce.txt": "Davacı vekili dilekçesinde",
+        "existing.txt": "zaten davada",
+        "program.exe": "MZ",
+        "buyuk.pdf": b"x" * (2**20 + 1),
+        "sozlesme.DOCX": "docx",
+    })
+    with zipfile.ZipFile(path) as archive:
+        result = import_entries(db, case_id, "a.zip", iter_archive_entries(archive))
+
+    batch = result["batch"]
+    assert skipped(batch) == {
+        "kopya/dilekce.txt": "duplicate",
+        "existing.txt": "duplicate",
+        "program.exe": "unsupported",
+        "buyuk.pdf": "too_large",
+    }
+    assert (batch.total_files, batch.status) == (2, IMPORT_IMPORTED)
+    documents = db.query(Document).filter(Document.import_batch_id == batch.id).all()
+    assert sorted(document.filename for document in documents) == ["dilekce.txt", "sozlesme.DOCX"]
+    assert all(document.index_status == "queued" for document in documents)
+    # Small files share one indexing job
+    assert result["jobs"] == 1
+    assert json.loads(db.query(Job).filter(Job.kind == "index_documents").one().payload)["document_ids"]
+    # No temporary files are left
+    assert not list((tmp_path / "uploads" / f"case_{case_id}").glob(".*.part"))
+
+
+def test_size_checked_while_copying(db, case_id):
+    # An entry that declares a small size but holds more is caught while it is copied
+    data = b"x" * (2**20 + 1)
+    entries = [ImportEntry("yalan.txt", 10, lambda: io.BytesIO(data))]
+    batch = import_entries(db, case_id, "manifest", entries)["batch"]
+    assert skipped(batch) == {"yalan.txt": "too_large"}
+    assert batch.total_files == 0
+
+
+def test_unreadable_entries(db, case_id):
+    def corrupt():
+        raise zipfile.BadZipFile("Bad CRC-32")
+
+    def encrypted():
+        raise RuntimeError("File is encrypted, password required for extraction")
+
+    entries = [
+        ImportEntry("bozuk.txt", 10, corrupt),
+        ImportEntry("sifreli.pdf", 10, encrypted),
+        ImportEntry("iyi.txt", 5, lambda: io.BytesIO(b"metin")),
+    ]
+    batch = import_entries(db, case_id, "a.zip", entries)["batch"]
+    assert skipped(batch) == {"bozuk.txt": "unreadable", "sifreli.pdf": "unreadable"}
+    assert batch.total_files == 1
+
+
+def test_failed_import_removes_copied_files(db, case_id, tmp_path):
+    def broken():
+        raise OSError("disk error")
+
+    entries = [ImportEntry("a.txt", 1, lambda: io.BytesIO(b"a")), ImportEntry("b.txt", 1, broken)]
+    with pytest.raises(OSError):
+        import_entries(db, case_id, "a.zip", entries)
+    assert [path.name for path in (tmp_path / "uploads" / f"case_{case_id}").iterdir()] == []
+    assert db.query(Document).count() == 0
+
+
+def test_queued_archive_import(db, case_id, tmp_path):
+    path = make_archive(tmp_path / ".upload.zip", {"a.txt": "birinci", "b.exe": "MZ"})
+    batch = bulk_import.queue_archive_import(db, case_id, "arsiv.zip", path)
+    assert batch.status == IMPORT_EXTRACTING
+    assert bulk_import.import_progress(db, batch)["done"] is False
+    job = db.query(Job).filter(Job.kind == "import_archive").one()
+    assert json.loads(job.payload) == {"batch_id": batch.id, "archive_path": str(path)}
+
+    assert bulk_import.import_archive(db, batch, path) == 1
+    assert not path.exists()
+    assert (batch.status, batch.total_files, skipped(batch)) == (IMPORT_IMPORTED, 1, {"b.exe": "unsupported"})
+    # A retried job doesn't import the archive twice
+    assert bulk_import.import_archive(db, batch, path) == 0
+    assert db.query(Document).count() == 1
+
+
+def test_queued_archive_that_is_not_a_zip(db, case_id, tmp_path):
+    path = tmp_path / ".upload.zip"
+    path.write_bytes(b"not a zip")
+    with pytest.raises(HTTPException) as error:
+        bulk_import.queue_archive_import(db, case_id, "arsiv.zip", path)
+    assert error.value.status_code == 400
+    assert not path.exists()
+    assert db.query(ImportBatch).count() == 0
+
+
+def test_failed_archive_import(db, case_id, tmp_path):
+    path = make_archive(tmp_path / ".upload.zip", {"a.txt": "birinci"})
+    batch = bulk_import.queue_archive_import(db, case_id, "arsiv.zip", path)
+    bulk_import.fail_archive_import(db, batch.id, path, "BadZipFile: truncated")
+    db.refresh(batch)
+    assert (batch.status, batch.error) == (IMPORT_FAILED, "BadZipFile: truncated")
+    assert bulk_import.import_progress(db, batch)["done"] is True
+    assert not path.exists()
@@ -0,0 +1,135 @@
+import random
+
+from app.services.chunking import Chunk, LegalTextChunker, approximate_token_count, split_sentences
+
+
+def count_words(text):
+    return len(text.split())
+
+
+LAW = """TÜRK BORÇLAR KANUNU
+
+BİRİNCİ BÖLÜM
+Genel Hükümler
+
+Madde 1
+Sözleşme, tarafların iradelerini karşılıklı ve birbirine uygun olarak açıklamalarıyla kurulur. İrade açıklaması açık veya örtülü olabilir.
+
+Madde 2
+Taraflar sözleşmenin esaslı noktalarında uyuşmuşlarsa, ikinci derecedeki noktalar üzerinde durulmamış olsa bile sözleşme kurulmuş sayılır.
+
+İKİNCİ BÖLÜM
+Sözleşmenin Şekli
+
+Madde 3
+Sözleşmelerin geçerliliği, kanunda aksi öngörülmedikçe, hiçbir şekle bağlı değildir.
+"""
+
+
+def test_split_sentences_keeps_abbreviations_and_ordinals():
+    text = "Yargıtay 3. Hukuk Dairesi karar verdi. Bkz. Av. Ahmet Yılmaz dilekçesi. Dava reddedildi!"
+    assert split_sentences(text) == [
+        "Yargıtay 3. Hukuk Dairesi karar verdi.",
+        "Bkz. Av. Ahmet Yılmaz dilekçesi.",
+        "Dava reddedildi!",
+    ]
+
+
+def test_article_and_part_headings_become_sections():
+    chunker = LegalTextChunker(count_words, max_tokens=200, min_tokens=1)
+    chunks = chunker.chunk_text(LAW)
+
+    assert [(chunk.section, chunk.text.split(".")[0]) for chunk in chunks] == [
+        ("TÜRK BORÇLAR KANUNU", "TÜRK BORÇLAR KANUNU"),
+        ("BİRİNCİ BÖLÜM", "BİRİNCİ BÖLÜM Genel Hükümler"),
+        ("BİRİNCİ BÖLÜM > Madde 1", "Madde 1 Sözleşme, tarafların iradelerini karşılıklı ve birbirine uygun olarak açıklamalarıyla kurulur"),
+        ("BİRİNCİ BÖLÜM > Madde 2", "Madde 2 Taraflar sözleşmenin esaslı noktalarında uyuşmuşlarsa, ikinci derecedeki noktalar üzerinde durulmamış olsa bile sözleşme kurulmuş sayılır"),
+        ("İKİNCİ BÖLÜM", "İKİNCİ BÖLÜM Sözleşmenin Şekli"),
+        ("İKİNCİ BÖLÜM > Madde 3", "Madde 3 Sözleşmelerin geçerliliği, kanunda aksi öngörülmedikçe, hiçbir şekle bağlı değildir"),
+    ]
+
+
+def test_headings_wait_for_min_tokens():
+    # With a large minimum, headings only change the section of the next chunk
+    chunker = LegalTextChunker(count_words, max_tokens=200, min_tokens=1000)
+    chunks = chunker.chunk_text(LAW)
+    assert len(chunks) == 1
+    assert chunks[0].section == "TÜRK BORÇLAR KANUNU"
+
+
+def test_article_heading_variants():
+    chunker = LegalTextChunker(count_words, max_tokens=200, min_tokens=1)
+    text = "MADDE 17/A\nBirinci fıkra.\n\nGeçici Madde 2\nİkinci fıkra.\n\nEk Madde 3\nÜçüncü fıkra.\n"
+    assert [chunk.section for chunk in chunker.chunk_text(text)] == ["MADDE 17/A", "Geçici Madde 2", "Ek Madde 3"]
+
+
+def random_text(rng, paragraphs=60):
+    words = ["dava", "davacı", "davalı", "sözleşme", "tazminat", "mahkeme", "karar", "ödeme", "kira", "tahliye"]
+    lines = []
+    for i in range(paragraphs):
+        if rng.random() < 0.2:
+            lines.append(f"Madde {i + 1}")
+        sentences = []
+        for _ in range(rng.randint(1, 6)):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(1, 40)))
+            sentences.append(sentence.capitalize() + ".")
+        # Now and then one sentence longer than any chunk
+        if rng.random() < 0.1:
+            sentences.append(" ".join(rng.choice(words) for _ in range(300)) + ".")
+        lines.append(" ".join(sentences))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def test_chunks_stay_within_token_budget():
+    rng = random.Random(1)
+    text = random_text(rng)
+    for max_tokens in (32, 126, 254):
+        chunks = LegalTextChunker(count_words, max_tokens=max_tokens, min_tokens=16).chunk_text(text)
+        assert chunks
+        for chunk in chunks:
+            assert count_words(chunk.text) == chunk.tokens
+            assert 0 < chunk.tokens <= max_tokens
+
+
+def test_no_words_lost_or_reordered():
+    rng = random.Random(2)
+    text = random_text(rng)
+    chunks = LegalTextChunker(count_words, max_tokens=64, min_tokens=16).chunk_text(text)
+    assert [word for chunk in chunks for word in chunk.text.split()] == text.split()
+
+
+def test_streamed_segments_match_whole_text():
+    rng = random.Random(3)
+    text = random_text(rng)
+    chunker = LegalTextChunker(count_words, max_tokens=64, min_tokens=16)
+
+    segments = []
+    start = 0
+    while start < len(text):
+        end = start + rng.randint(1, 500)
+        segments.append(text[start:end])
+        start = end
+    assert list(chunker.chunk(segments)) == chunker.chunk_text(text)
+
+
+def test_overlap_repeats_last_sentences():
+    text = " ".join(f"Cümle numarası {i} burada." for i in range(20))
+    chunks = LegalTextChunker(count_words, max_tokens=20, min_tokens=1, overlap_sentences=1).chunk_text(text)
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = split_sentences(previous.text)[-1]
+        assert chunk.text.startswith(last_sentence)
+
+
+def test_long_paragraph_without_line_breaks():
+    text = " ".join(f"Uzun paragraf cümlesi {i}." for i in range(3000))
+    chunks = LegalTextChunker(approximate_token_count, max_tokens=126).chunk_text(text)
+    assert [word for chunk in chunks for word in chunk.text.split()] == text.split()
+    assert all(chunk.tokens <= 126 for chunk in chunks)
+
+
+def test_empty_input():
+    assert LegalTextChunker().chunk_text("") == []
+    assert LegalTextChunker().chunk_text("\n\n  \n") == []
+    assert isinstance(LegalTextChunker().chunk_text("Kısa metin.")[0], Chunk)
@@ -0,0 +1,102 @@
+import numpy as np
+
+from app.services.context_packing import pack_context, remove_overlap
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def unit(*values):
+    vector = np.zeros(4, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector.tolist()
+
+
+def meta(document_id, chunk_index):
+    return {"document_id": document_id, "chunk_index": chunk_index}
+
+
+def test_remove_overlap():
+    assert remove_overlap("kira bedeli her ay ödenir", "her ay ödenir ve artırılır") == " ve artırılır"
+    assert remove_overlap("kira bedeli", "tahliye davası") is None
+    # Shared text shorter than MIN_OVERLAP_CHARS is not an overlap
+    assert remove_overlap("karar verildi", "verildi sonra") is None
+
+
+def test_empty():
+    packed = pack_context([], [], [], count_words, max_tokens=100)
+    assert packed.chunks == [] and packed.tokens == 0
+
+
+def test_mmr_prefers_diverse_chunk_over_similar_one():
+    chunks = ["birinci parça metni", "birinciye benzeyen parça", "bambaşka konu"]
+    metadatas = [meta(1, 0), meta(2, 0), meta(3, 0)]
+    # The second chunk is close to the first (cosine 0.9), the third is unrelated
+    embeddings = [unit(1, 0), unit(0.9, np.sqrt(1 - 0.81)), unit(0, 0, 1)]
+
+    relevance_only = pack_context(chunks, metadatas, embeddings, count_words, max_tokens=100, mmr_lambda=1.0)
+    assert relevance_only.chunks == chunks
+
+    diverse = pack_context(chunks, metadatas, embeddings, count_words, max_tokens=100, mmr_lambda=0.5)
+    assert diverse.chunks == [chunks[0], chunks[2], chunks[1]]
+    assert diverse.metadatas == [metadatas[0], metadatas[2], metadatas[1]]
+
+
+def test_near_duplicates_are_skipped():
+    chunks = ["sözleşme feshedildi", "Sözleşme feshedildi kopya", "kira   sözleşme feshedildi"]
+    metadatas = [meta(1, 0), meta(2, 0), meta(3, 0)]
+    embeddings = [unit(1, 0), unit(1, 0.01), unit(0, 1)]
+    packed = pack_context(chunks, metadatas, embeddings, count_words, max_tokens=100, duplicate_threshold=0.95)
+    assert packed.chunks == [chunks[0], chunks[2]]
+
+    # A chunk whose text is contained in one already taken is a duplicate too
+    chunks = ["davacı kira bedelini ödemedi", "kira bedelini"]
+    packed = pack_context(chunks, [meta(1, 0), meta(2, 0)], [unit(1, 0), unit(0, 1)], count_words, max_tokens=100)
+    assert packed.chunks == [chunks[0]]
+
+
+def test_token_budget():
+    chunks = ["bir iki üç dört beş", "altı yedi", "sekiz dokuz on on bir", "on iki"]
+    metadatas = [meta(i, 0) for i in range(4)]
+    embeddings = [unit(0, 0, 0, 1), unit(0, 0, 1), unit(0, 1), unit(1)]
+    packed = pack_context(chunks, metadatas, embeddings, count_words, max_tokens=9, mmr_lambda=1.0, baseline_chunks=2)
+    # The third chunk doesn't fit in what is left, the fourth still does
+    assert packed.chunks == [chunks[0], chunks[1], chunks[3]]
+    assert packed.tokens == 9
+    assert packed.baseline_tokens == 7
+
+    # The best chunk is used even when it alone is over budget
+    packed = pack_context(chunks, metadatas, embeddings, count_words, max_tokens=2, mmr_lambda=1.0)
+    assert packed.chunks == [chunks[0]]
+
+
+def test_adjacent_chunks_are_merged_without_repeating_the_overlap():
+    first = "Madde 5 kira bedeli her ayın ilk günü peşin ödenir"
+    second = "her ayın ilk günü peşin ödenir ve yıllık olarak artırılır"
+    chunks = [second, "başka bir dava dosyası", first]
+    metadatas = [meta(1, 1), meta(2, 0), meta(1, 0)]
+    embeddings = [unit(1, 0.2), unit(0, 0, 1), unit(1, 0)]
+
+    packed = pack_context(
+        chunks, metadatas, embeddings, count_words, max_tokens=100, mmr_lambda=1.0, duplicate_threshold=1.1
+    )
+    assert packed.chunks == [
+        "Madde 5 kira bedeli her ayın ilk günü peşin ödenir ve yıllık olarak artırılır",
+        "başka bir dava dosyası",
+    ]
+    # Merged runs carry the metadata of their first chunk
+    assert packed.metadatas == [meta(1, 0), meta(2, 0)]
+    assert packed.tokens == 14 + 4
+
+
+def test_adjacent_overlap_is_not_charged_twice():
+    first = "bir iki üç dört beş altı"
+    second = "dört beş altı yedi sekiz dokuz"
+    chunks = [first, second]
+    metadatas = [meta(1, 0), meta(1, 1)]
+    embeddings = [unit(1, 0), unit(0, 1)]
+    # Six tokens each, but the second only adds three
+    packed = pack_context(chunks, metadatas, embeddings, count_words, max_tokens=9)
+    assert packed.chunks == ["bir iki üç dört beş altı yedi sekiz dokuz"]
+    assert packed.tokens == 9
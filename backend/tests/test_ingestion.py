@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from app.services.ingestion import batched, iter_chunks
+
+
+def chunk_text(text, chunk_size=1000, overlap=200):
+    """The fixed-size chunker as it was before streaming, on the whole text"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunks.append(text[start:end])
+        start = end - overlap
+    return chunks
+
+
+def expected_chunks(text, chunk_size=1000, overlap=200):
+    # iter_chunks leaves out trailing slices that lie entirely inside the previous chunk
+    stride = chunk_size - overlap
+    return [
+        chunk for i, chunk in enumerate(chunk_text(text, chunk_size, overlap))
+        if i == 0 or len(text) - i * stride > overlap
+    ]
+
+
+def split_randomly(text, rng):
+    segments = []
+    start = 0
+    while start < len(text):
+        end = start + rng.randint(0, 2500)
+        segments.append(text[start:end])
+        start = end
+    return segments
+
+
+@pytest.mark.parametrize("length", [0, 1, 199, 200, 201, 800, 999, 1000, 1001, 1200, 1600, 1801, 5000, 12345])
+def test_iter_chunks_matches_chunk_text(length):
+    rng = random.Random(length)
+    text = "".join(rng.choice("abc def\n") for _ in range(length))
+
+    for _ in range(5):
+        assert list(iter_chunks(split_randomly(text, rng))) == expected_chunks(text)
+    assert list(iter_chunks([text])) == expected_chunks(text)
+
+
+def test_iter_chunks_custom_size():
+    text = "".join(str(i % 10) for i in range(997))
+    segments = split_randomly(text, random.Random(0))
+    assert list(iter_chunks(segments, chunk_size=100, overlap=30)) == expected_chunks(text, 100, 30)
+
+
+def test_iter_chunks_only_drops_contained_tails():
+    # The old chunker's second slice of a 900 character text is its last 100 characters again
+    text = "".join(str(i % 10) for i in range(900))
+    assert chunk_text(text) == [text, text[800:]]
+    assert list(iter_chunks([text])) == [text]
+
+    text = "".join(str(i % 10) for i in range(1150))
+    assert list(iter_chunks([text[:500], text[500:]])) == chunk_text(text) == [text[:1000], text[800:]]
+
+
+def test_iter_chunks_rejects_overlap_not_below_size():
+    with pytest.raises(ValueError):
+        list(iter_chunks(["text"], chunk_size=100, overlap=100))
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 3)) == []
@@ -0,0 +1,138 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import Job
+from app.services import job_queue
+from app.services.job_queue import (
+    JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED,
+    claim_next_job, complete_job, enqueue_job, fail_job, release_orphaned_jobs, touch_job, worker_identity
+)
+
+
+@pytest.fixture(autouse=True)
+def worker_name(monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_NAME", "node-a")
+
+
+def test_claim_takes_jobs_in_order_once(db):
+    later = enqueue_job(db, "index", case_id=1, document_id=2, delay=0.5)
+    first = enqueue_job(db, "index", case_id=1, document_id=1)
+    waiting = enqueue_job(db, "index", case_id=1, document_id=3, delay=3600)
+
+    job = claim_next_job(db, "w1")
+    assert job.id == first.id
+    assert (job.status, job.locked_by, job.attempts) == (JOB_RUNNING, "w1", 1)
+
+    # The claimed job is not handed out again; the delayed ones aren't due yet
+    assert claim_next_job(db, "w2") is None
+    later.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert claim_next_job(db, "w2").id == later.id
+    assert claim_next_job(db, "w2") is None
+    assert db.get(Job, waiting.id).status == JOB_QUEUED
+
+
+def test_claim_compare_and_set_loses_race(db, monkeypatch):
+    contested = enqueue_job(db, "index", document_id=1)
+    other = enqueue_job(db, "index", document_id=2)
+    real_claimable = job_queue._claimable
+    calls = []
+
+    def claimable(now):
+        # Another worker claims the candidate between the SELECT and the UPDATE
+        if len(calls) == 1:
+            db.query(Job).filter(Job.id == contested.id).update({Job.status: JOB_RUNNING, Job.locked_by: "w2", Job.locked_at: now})
+        calls.append(now)
+        return real_claimable(now)
+
+    monkeypatch.setattr(job_queue, "_claimable", claimable)
+    job = claim_next_job(db, "w1")
+    assert job.id == other.id
+    assert db.get(Job, contested.id).locked_by == "w2"
+
+
+def test_stale_running_job_is_reclaimed(db, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_LOCK_TIMEOUT", 60)
+    job = enqueue_job(db, "index")
+    claim_next_job(db, "w1")
+    assert claim_next_job(db, "w2") is None
+
+    job = db.get(Job, job.id)
+    job.locked_at = datetime.utcnow() - timedelta(seconds=120)
+    db.commit()
+    reclaimed = claim_next_job(db, "w2")
+    assert (reclaimed.id, reclaimed.locked_by, reclaimed.attempts) == (job.id, "w2", 2)
+
+    # The first worker lost the lock: its heartbeat and result are ignored
+    assert not touch_job(db, job.id, "w1")
+    assert complete_job(db, reclaimed, 1.0, "w1") is False
+    assert touch_job(db, job.id, "w2")
+    assert complete_job(db, reclaimed, 1.0, "w2") is True
+    db.refresh(reclaimed)
+    assert (reclaimed.status, reclaimed.locked_by, reclaimed.duration) == (JOB_SUCCEEDED, None, 1.0)
+
+
+def test_fail_retries_with_exponential_backoff(db, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 10.0)
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    enqueue_job(db, "index")
+
+    for attempt, backoff in ((1, 10), (2, 20)):
+        job = claim_next_job(db, "w1")
+        assert job.attempts == attempt
+        before = datetime.utcnow()
+        assert fail_job(db, job, "boom", 0.5, "w1") is True
+        db.refresh(job)
+        assert (job.status, job.error, job.locked_by) == (JOB_QUEUED, "boom", None)
+        assert before + timedelta(seconds=backoff - 1) < job.run_after <= datetime.utcnow() + timedelta(seconds=backoff)
+        job.run_after = datetime.utcnow()
+        db.commit()
+
+    job = claim_next_job(db, "w1")
+    assert job.attempts == 3
+    assert fail_job(db, job, "boom", 0.5, "w1") is False
+    db.refresh(job)
+    assert job.status == JOB_FAILED and job.finished_at is not None
+    assert claim_next_job(db, "w1") is None
+
+
+def test_fail_without_retry_and_after_losing_lock(db):
+    enqueue_job(db, "index")
+    job = claim_next_job(db, "w1")
+    assert fail_job(db, job, "unsupported", 0.1, "w2") is None
+    assert fail_job(db, job, "unsupported", 0.1, "w1", retry=False) is False
+    db.refresh(job)
+    assert job.status == JOB_FAILED
+
+
+def test_release_orphaned_jobs(db, monkeypatch):
+    dead_pid = 999999
+    monkeypatch.setattr(job_queue, "_process_alive", lambda pid: pid != dead_pid)
+    locks = {
+        "dead": f"node-a:{dead_pid}:0",
+        "own_pid": worker_identity(1),
+        "alive": f"node-a:{os.getppid()}:0",
+        "other_node": f"node-b:{dead_pid}:0",
+        # Node names may contain colons
+        "colon_node": f"host:8000:{dead_pid}:0",
+    }
+    jobs = {}
+    for name, lock in locks.items():
+        job = enqueue_job(db, "index")
+        job.status, job.locked_by, job.locked_at = JOB_RUNNING, lock, datetime.utcnow()
+        jobs[name] = job
+    db.commit()
+
+    assert release_orphaned_jobs(db) == 2
+    statuses = {name: db.get(Job, job.id).status for name, job in jobs.items()}
+    assert statuses == {
+        "dead": JOB_QUEUED, "own_pid": JOB_QUEUED, "alive": JOB_RUNNING,
+        "other_node": JOB_RUNNING, "colon_node": JOB_RUNNING,
+    }
+    assert db.get(Job, jobs["dead"].id).locked_by is None
+
+    monkeypatch.setattr(settings, "WORKER_NAME", "host:8000")
+    assert release_orphaned_jobs(db) == 1
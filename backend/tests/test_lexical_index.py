@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(str(tmp_path / "lexical_index.sqlite3"))
+
+
+def test_tokenize_folds_turkish_and_stems():
+    assert tokenize("SÖZLEŞMENİN") == tokenize("sözleşmenin") == tokenize("sozlesmenin") == ["sozle"]
+    assert tokenize("KİRA ve IRGAT") == ["kira", "irgat"]
+    # Docket numbers stay whole, stopwords are dropped
+    assert tokenize("2023/1234 Esas ile 5.2 madde") == ["2023/1234", "esas", "5.2", "madde"]
+
+
+def test_search_ranks_by_bm25(index):
+    index.add_chunks(1, 10, ["a", "b", "c"], [
+        "kira sözleşmesi kira bedeli kira artışı",
+        "kira sözleşmesi feshedildi",
+        "iş sözleşmesi ve kıdem tazminatı",
+    ])
+    results = index.search(1, "kira", top_k=10)
+    assert [chunk_id for chunk_id, _ in results] == ["a", "b"]
+    assert results[0][1] > results[1][1] > 0
+
+    # Hand-computed score of "b": df = 2 of 3 chunks, tf = 1, length 3, average length (6 + 3 + 4) / 3
+    idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+    expected = idf * 1 * 2.2 / (1 + 1.2 * (1 - 0.75 + 0.75 * 3 / (13 / 3)))
+    assert results[1][1] == pytest.approx(expected)
+
+    assert [chunk_id for chunk_id, _ in index.search(1, "tazminat", top_k=10)] == ["c"]
+    assert len(index.search(1, "sözleşme", top_k=2)) == 2
+
+
+def test_search_is_per_case(index):
+    index.add_chunks(1, 10, ["a"], ["kira sözleşmesi"])
+    index.add_chunks(2, 20, ["b"], ["kira sözleşmesi"])
+    assert index.search(1, "kira", top_k=5)[0][0] == "a"
+    assert index.search(3, "kira", top_k=5) == []
+    assert index.search(1, "ve ile", top_k=5) == []
+
+
+def test_readding_a_chunk_replaces_its_postings(index):
+    index.add_chunks(1, 10, ["a"], ["kira sözleşmesi"])
+    index.add_chunks(1, 10, ["a"], ["iş sözleşmesi"])
+    assert index.search(1, "kira", top_k=5) == []
+    assert index.search(1, "iş", top_k=5)[0][0] == "a"
+
+
+def test_delete_document_and_case(index):
+    index.add_chunks(1, 10, ["a"], ["kira sözleşmesi"])
+    index.add_chunks(1, 11, ["b"], ["kira bedeli"])
+    index.add_chunks(2, 20, ["c"], ["kira"])
+    assert sorted(index.document_ids(1)) == [10, 11]
+
+    index.delete_document(1, 10)
+    assert [chunk_id for chunk_id, _ in index.search(1, "kira", top_k=5)] == ["b"]
+
+    index.delete_case(1)
+    assert index.search(1, "kira", top_k=5) == []
+    assert index.case_ids() == [2]
+
+
+def test_reciprocal_rank_fusion():
+    vector = ["a", "b", "c"]
+    lexical = ["c", "a", "d"]
+    # a: 1/61 + 1/62, c: 1/63 + 1/61, b: 1/62, d: 1/63
+    assert reciprocal_rank_fusion([vector, lexical]) == ["a", "c", "b", "d"]
+    assert reciprocal_rank_fusion([vector]) == vector
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_reciprocal_rank_fusion_k_weights_top_ranks():
+    # A smaller k favours an id ranked first once over one ranked second twice
+    rankings = [["a", "b"], ["c", "b"], ["a", "b"]]
+    assert reciprocal_rank_fusion(rankings, k=60)[0] == "b"
+    assert reciprocal_rank_fusion(rankings, k=1)[0] == "a"
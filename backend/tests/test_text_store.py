@@ -0,0 +1,104 @@
+import hashlib
+
+import pytest
+
+from app.config import settings
+from app.services import text_store
+from app.services.text_store import TextStore, TextStoreWriter, iter_document_text, open_store, store_path
+
+
+@pytest.fixture
+def small_frames(monkeypatch):
+    monkeypatch.setattr(settings, "TEXT_STORE_FRAME_KB", 1)
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_store(path, segments, source_hash="ab" * 32):
+    writer = TextStoreWriter(path, source_hash)
+    for segment in segments:
+        writer.add(segment)
+    writer.finish()
+
+
+def test_round_trip_across_frames(tmp_path, small_frames):
+    segments = [f"Sayfa {i}: sözleşme hükümleri çğıöşü " * (i % 7 + 1) for i in range(200)]
+    # Empty segments in the middle and at the end, and one larger than a frame
+    segments[10] = ""
+    segments[50] = "İ" * 3000
+    segments += ["", ""]
+    path = tmp_path / ".doc.pdf.txtz"
+    write_store(path, segments)
+
+    with TextStore(path) as store:
+        assert len(store) == len(segments)
+        assert len(store._frames) > 1
+        assert store.source_hash == bytes.fromhex("ab" * 32)
+        assert list(store.iter_segments()) == segments
+        for i in (0, 10, 49, 50, 51, 150, len(segments) - 1):
+            assert store.segment(i) == segments[i]
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_empty_document(tmp_path):
+    path = tmp_path / ".empty.txt.txtz"
+    write_store(path, [])
+    with TextStore(path) as store:
+        assert len(store) == 0
+        assert list(store.iter_segments()) == []
+
+
+def test_abort_leaves_nothing(tmp_path):
+    path = tmp_path / ".doc.txt.txtz"
+    writer = TextStoreWriter(path, "00" * 32)
+    writer.add("yarım kalan metin")
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_open_store_checks_hash_and_format(tmp_path):
+    file_path = tmp_path / "doc.txt"
+    path = store_path(str(file_path))
+    assert path == tmp_path / ".doc.txt.txtz"
+    assert open_store(str(file_path), "cd" * 32) is None
+
+    write_store(path, ["metin"], source_hash="cd" * 32)
+    store = open_store(str(file_path), "cd" * 32)
+    assert list(store.iter_segments()) == ["metin"]
+    store.close()
+    assert open_store(str(file_path), "ef" * 32) is None
+
+    path.write_bytes(b"not a text store" * 10)
+    assert open_store(str(file_path), "cd" * 32) is None
+    path.write_bytes(b"")
+    assert open_store(str(file_path), "cd" * 32) is None
+
+
+def test_iter_document_text_writes_then_reads_store(tmp_path, monkeypatch, small_frames):
+    file_path = tmp_path / "dilekce.txt"
+    content = "Davacı vekili dilekçesinde özetle; " * 5000
+    file_path.write_text(content, encoding="utf-8")
+    monkeypatch.setattr(settings, "TEXT_STORE_ENABLED", True)
+
+    first = list(iter_document_text(str(file_path)))
+    assert "".join(first) == content
+    assert store_path(str(file_path)).exists()
+
+    # The second pass reads the store instead of the file
+    monkeypatch.setattr(text_store, "extract_segments", lambda path: pytest.fail("file parsed again"))
+    content_hash = sha256(file_path.read_bytes())
+    assert list(iter_document_text(str(file_path), content_hash)) == first
+
+
+def test_iter_document_text_discards_partial_store(tmp_path, monkeypatch):
+    file_path = tmp_path / "dilekce.txt"
+    file_path.write_text("a" * 200000, encoding="utf-8")
+    monkeypatch.setattr(settings, "TEXT_STORE_ENABLED", True)
+
+    segments = iter_document_text(str(file_path))
+    next(segments)
+    segments.close()
+    assert not store_path(str(file_path)).exists()
+    assert not list(tmp_path.glob("*.part"))
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.services import uploads
+from app.services.uploads import (
+    UploadSizeLimitMiddleware, append_chunk, content_hash, save_and_hash, save_multipart_file
+)
+
+BOUNDARY = "----avukatboundary7MA4YWxk"
+
+
+def multipart_body(parts):
+    """parts: (name, filename or None, content type or None, bytes)"""
+    body = b""
+    for name, filename, content_type, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if content_type:
+            body += f"Content-Type: {content_type}\r\n".encode()
+        body += b"\r\n" + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body, chunk_size=7, content_type=f"multipart/form-data; boundary={BOUNDARY}"):
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/documents/1/upload",
+        "headers": [(b"content-type", content_type.encode())],
+    }
+    return Request(scope, receive)
+
+
+def save(request, destination, field="file", max_size=10**9):
+    return asyncio.run(save_multipart_file(request, field, destination, max_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_multipart_file_is_written_and_hashed(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(uploads, "WRITE_BUFFER_SIZE", 1000)
+    data = bytes(range(256)) * 40 + f"\r\n--{BOUNDARY[:-1]}".encode()
+    body = multipart_body([
+        ("note", None, None, b"ignored"),
+        ("file", "dilekçe.pdf", "application/pdf", data),
+        ("file", "second.pdf", "application/pdf", b"only the first file is kept"),
+    ])
+    destination = tmp_path / "upload.part"
+
+    filename, content_type, sha256, size = save(make_request(body, chunk_size), destination)
+    assert (filename, content_type, size) == ("dilekçe.pdf", "application/pdf", len(data))
+    assert sha256 == hashlib.sha256(data).hexdigest()
+    assert destination.read_bytes() == data
+
+
+def test_multipart_without_content_type(tmp_path):
+    body = multipart_body([("file", "notes.txt", None, b"")])
+    assert save(make_request(body), tmp_path / "upload.part")[1:] == (None, hashlib.sha256(b"").hexdigest(), 0)
+
+
+def test_multipart_over_size_limit_leaves_no_file(tmp_path):
+    body = multipart_body([("file", "big.pdf", "application/pdf", b"x" * 101)])
+    destination = tmp_path / "upload.part"
+    with pytest.raises(HTTPException) as error:
+        save(make_request(body), destination, max_size=100)
+    assert error.value.status_code == 413
+    assert not destination.exists()
+
+    body = multipart_body([("file", "fits.pdf", "application/pdf", b"x" * 100)])
+    assert save(make_request(body), destination, max_size=100)[3] == 100
+
+
+def test_multipart_missing_file_or_wrong_content_type(tmp_path):
+    destination = tmp_path / "upload.part"
+    body = multipart_body([("file", None, None, b"a plain field"), ("other", "a.pdf", None, b"data")])
+    with pytest.raises(HTTPException) as error:
+        save(make_request(body), destination)
+    assert error.value.status_code == 422
+    assert not destination.exists()
+
+    with pytest.raises(HTTPException) as error:
+        save(make_request(b"{}", content_type="application/json"), destination)
+    assert error.value.status_code == 422
+
+
+def run_middleware(limits, path, headers, bodies):
+    """Send a request through UploadSizeLimitMiddleware; returns (app called, bytes read, response status)"""
+    state = {"called": False, "read": 0, "status": None}
+
+    async def app(scope, receive, send):
+        state["called"] = True
+        while True:
+            message = await receive()
+            state["read"] += len(message.get("body", b""))
+            if not message.get("more_body"):
+                return
+
+    messages = [
+        {"type": "http.request", "body": body, "more_body": i < len(bodies) - 1} for i, body in enumerate(bodies)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    asyncio.run(UploadSizeLimitMiddleware(app, limits)(scope, receive, send))
+    return state
+
+
+def test_size_limit_middleware():
+    limits = [(r"/api/documents/\d+/import$", 10 * 2**20), (r"/api/documents/", 2**20)]
+    limit = 2**20 + uploads.MULTIPART_OVERHEAD
+
+    # A Content-Length over the route's limit is refused before the body is read
+    state = run_middleware(limits, "/api/documents/1/upload", [(b"content-length", str(limit + 1).encode())], [b""])
+    assert state == {"called": False, "read": 0, "status": 413}
+
+    # The import route has its own, larger limit
+    state = run_middleware(limits, "/api/documents/1/import", [(b"content-length", str(limit + 1).encode())], [b""])
+    assert state["called"] and state["status"] is None
+
+    # Without a Content-Length, the body is cut off once it goes over
+    with pytest.raises(HTTPException) as error:
+        run_middleware(limits, "/api/documents/1/upload", [], [b"x" * 2**19] * 4)
+    assert error.value.status_code == 413
+
+    state = run_middleware(limits, "/api/cases/", [], [b"x" * 2**19] * 4)
+    assert state["read"] == 2**21
+
+
+def test_save_and_hash(tmp_path):
+    data = b"sozlesme" * 1000
+    destination = tmp_path / "copy"
+    assert save_and_hash(io.BytesIO(data), destination) == (hashlib.sha256(data).hexdigest(), len(data))
+    with pytest.raises(HTTPException) as error:
+        save_and_hash(io.BytesIO(data), destination, max_size=len(data) - 1)
+    assert error.value.status_code == 413
+    assert not destination.exists()
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_resumable_chunks_and_hash(tmp_path):
+    path = tmp_path / "upload.partial"
+    first, second = b"a" * 1500, b"b" * 700
+    assert asyncio.run(append_chunk("u1", path, 0, stream(first[:1000], first[1000:]), 4000)) == 1500
+    # A chunk retried at the same offset overwrites what the interrupted one left
+    assert asyncio.run(append_chunk("u1", path, 1500, stream(b"garbage"), 4000)) == 7
+    assert asyncio.run(append_chunk("u1", path, 1500, stream(second), 4000)) == 700
+    assert path.read_bytes() == first + second
+    assert content_hash("u1", path, 2200) == hashlib.sha256(first + second).hexdigest()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(append_chunk("u1", path, 2200, stream(b"c" * 1801), 4000))
+    assert error.value.status_code == 413
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore, create_vector_store
+
+DIM = 8
+
+
+@pytest.fixture
+def store(tmp_path):
+    return NumpyVectorStore(str(tmp_path / "numpy"), cache_mb=1)
+
+
+def vectors(seed, count):
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+
+def add_document(store, case_id, document_id, embeddings):
+    ids = [f"doc_{document_id}_chunk_{i}" for i in range(len(embeddings))]
+    store.upsert(
+        case_id,
+        ids,
+        embeddings.tolist(),
+        [f"text {chunk_id}" for chunk_id in ids],
+        [{"document_id": document_id, "chunk_index": i} for i in range(len(ids))]
+    )
+    return ids
+
+
+def test_query_returns_nearest_chunks_with_cosine_scores(store):
+    embeddings = vectors(0, 20)
+    ids = add_document(store, 1, 10, embeddings)
+
+    found_ids, documents, metadatas, matrix, scores = store.query(1, embeddings[7] * 3, top_k=5)
+    assert found_ids[0] == ids[7]
+    assert documents[0] == f"text {ids[7]}"
+    assert metadatas[0] == {"document_id": 10, "chunk_index": 7}
+    assert scores[0] == pytest.approx(1.0, abs=1e-3)
+    assert scores == sorted(scores, reverse=True)
+    assert matrix.shape == (5, DIM) and matrix.dtype == np.float32
+
+    # Stored rows are normalized float16
+    normalized = embeddings[7] / np.linalg.norm(embeddings[7])
+    np.testing.assert_allclose(matrix[0], normalized, atol=1e-3)
+    assert store.query(2, embeddings[0], top_k=5) is None
+
+
+def test_query_many_matches_query(store):
+    embeddings = vectors(1, 30)
+    add_document(store, 1, 10, embeddings)
+    many = store.query_many(1, embeddings[:3], top_k=4)
+    for embedding, result in zip(embeddings[:3], many):
+        single = store.query(1, embedding, top_k=4)
+        assert result[0] == single[0]
+        assert result[4] == pytest.approx(single[4])
+
+
+def test_upsert_overwrites_rows_in_place(store):
+    embeddings = vectors(2, 4)
+    ids = add_document(store, 1, 10, embeddings)
+    replacement = vectors(3, 1)
+    store.upsert(1, [ids[2]], replacement.tolist(), ["new text"], [{"document_id": 10, "chunk_index": 2}])
+
+    assert store.get(1, [ids[2], "missing"]) == ([ids[2]], ["new text"], [{"document_id": 10, "chunk_index": 2}])
+    stored = store.get_embeddings(1, [ids[2]])[ids[2]]
+    np.testing.assert_allclose(stored, replacement[0] / np.linalg.norm(replacement[0]), atol=1e-3)
+    assert store.document_counts(1) == {10: 4}
+
+    with pytest.raises(ValueError):
+        store.upsert(1, ["other"], [[1.0, 2.0]], ["x"], [{"document_id": 11}])
+
+
+def test_delete_document_masks_rows_until_compaction(store):
+    first = vectors(4, 10)
+    second = vectors(5, 10)
+    first_ids = add_document(store, 1, 10, first)
+    second_ids = add_document(store, 1, 11, second)
+
+    assert store.delete_document(1, 10) == 10
+    assert store.document_counts(1) == {11: 10}
+    assert store.stats()["tombstones"] == {"case_1": 10, "global": 10}
+    found_ids = store.query(1, first[0], top_k=20)[0]
+    assert sorted(found_ids) == sorted(second_ids)
+    assert not set(store.search(first[0], top_k=20)[0]) & set(first_ids)
+
+    # Below the threshold nothing is rewritten
+    assert store.compact(min_deleted_ratio=0.9) == {}
+    assert store.compact() == {"case_1": 10, "global": 10}
+    assert store.stats()["tombstones"] == {}
+
+    # Rows were renumbered; chunks, embeddings and search still line up
+    for i, chunk_id in enumerate(second_ids):
+        assert store.query(1, second[i], top_k=1)[0] == [chunk_id]
+        np.testing.assert_allclose(
+            store.get_embeddings(1, [chunk_id])[chunk_id], second[i] / np.linalg.norm(second[i]), atol=1e-3
+        )
+    assert store.search(second[3], top_k=1)[0] == [second_ids[3]]
+
+    # New chunks are appended after the compacted rows
+    third_ids = add_document(store, 1, 12, vectors(6, 2))
+    assert store.document_counts(1) == {11: 10, 12: 2}
+    assert store.query(1, vectors(6, 2)[1], top_k=1)[0] == [third_ids[1]]
+
+
+def test_search_across_cases(store):
+    one = vectors(7, 5)
+    two = vectors(8, 5)
+    add_document(store, 1, 10, one)
+    two_ids = add_document(store, 2, 20, two)
+
+    assert store.search(two[2], top_k=1)[0] == [two_ids[2]]
+    assert store.search(two[2], top_k=3, case_ids=[1])[0][0].startswith("doc_10_")
+    assert store.search(two[2], top_k=3, case_ids=[]) == ([], [], [])
+    assert store.case_ids() == [1, 2]
+
+
+def test_delete_case(store):
+    embeddings = vectors(9, 5)
+    add_document(store, 1, 10, embeddings)
+    add_document(store, 2, 20, vectors(10, 5))
+
+    assert store.delete_case(1) == 5
+    assert store.query(1, embeddings[0], top_k=3) is None
+    assert store.case_ids() == [2]
+    assert all(chunk_id.startswith("doc_20_") for chunk_id in store.search(embeddings[0], top_k=10)[0])
+
+    # The case can be indexed again
+    ids = add_document(store, 1, 11, embeddings)
+    assert store.query(1, embeddings[0], top_k=1)[0] == [ids[0]]
+
+
+def test_iter_case_and_get_document(store):
+    ids = add_document(store, 1, 10, vectors(11, 7))
+    batches = list(store.iter_case(1, batch_size=3))
+    assert [len(batch[0]) for batch in batches] == [3, 3, 1]
+    assert sorted(chunk_id for batch in batches for chunk_id in batch[0]) == sorted(ids)
+
+    page_ids, embeddings, documents, metadatas = store.get_document(1, 10, limit=2, offset=1)
+    assert page_ids == sorted(ids)[1:3]
+    assert len(embeddings[0]) == DIM
+
+
+def test_versioned_store_is_separate(store):
+    add_document(store, 1, 10, vectors(12, 3))
+    v2 = store.versioned(2)
+    assert v2.path.name == "numpy__v2"
+    assert v2.case_ids() == []
+    v2.drop()
+    assert not v2.path.exists()
+    assert store.versioned(1) is store
+
+
+def test_create_vector_store(tmp_path):
+    store = create_vector_store("numpy", str(tmp_path))
+    assert isinstance(store, NumpyVectorStore) and store.path == tmp_path / "numpy"
+    with pytest.raises(ValueError):
+        create_vector_store("faiss", str(tmp_path))
@@ -3,11 +3,35 @@ import client from './client'
 export interface ChatRequest {
   case_id: number
   message: string
+  use_cache?: boolean
 }
 
 export interface ChatResponse {
+  id: number | null
+  created_at: string | null
   response: string
   sources: string[]
+  cached: boolean
+  kvkk_warning: string
+}
+
+export interface BatchChatRequest {
+  case_id: number
+  questions: string[]
+  use_cache?: boolean
+}
+
+export interface BatchChatAnswer {
+  question: string
+  response: string | null
+  sources: string[]
+  cached: boolean
+  message_id: number | null
+  error: string | null
+}
+
+export interface BatchChatResponse {
+  answers: BatchChatAnswer[]
   kvkk_warning: string
 }
 
@@ -16,17 +40,35 @@ export interface ChatMessage {
   message: string
   response: string
   sources: string[]
+  cached?: boolean
   created_at: string
 }
 
+export interface ChatHistoryPage {
+  messages: ChatMessage[]
+  next_cursor: string | null
+  latest_cursor: string | null
+}
+
+export interface ChatHistoryParams {
+  limit?: number
+  before?: string
+  since?: string
+}
+
 export const chatApi = {
   sendMessage: async (request: ChatRequest): Promise<ChatResponse> => {
     const response = await client.post('/api/chat/', request)
     return response.data
   },
   
-  getHistory: async (caseId: number): Promise<ChatMessage[]> => {
-    const response = await client.get(`/api/chat/case/${caseId}`)
+  askBatch: async (request: BatchChatRequest): Promise<BatchChatResponse> => {
+    const response = await client.post('/api/chat/batch', request)
+    return response.data
+  },
+  
+  getHistory: async (caseId: number, params: ChatHistoryParams = {}): Promise<ChatHistoryPage> => {
+    const response = await client.get(`/api/chat/case/${caseId}`, { params })
     return response.data
   },
 }
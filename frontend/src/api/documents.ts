@@ -11,6 +11,66 @@ export interface Document {
   is_indexed: boolean
 }
 
+export interface UploadSession {
+  upload_id: string
+  case_id: number
+  filename: string
+  size: number
+  offset: number
+  chunk_size: number
+}
+
+export interface ImportBatch {
+  id: number
+  case_id: number
+  source?: string
+  total_files: number
+  total_bytes: number
+  skipped: { name: string; reason: string }[]
+  status: 'extracting' | 'imported' | 'failed'
+  error?: string
+  queued: number
+  indexing: number
+  indexed: number
+  failed: number
+  documents_per_sec: number
+  mb_per_sec: number
+  eta_seconds?: number
+  done: boolean
+  created_at: string
+}
+
+// Larger files are sent in chunks that can be resumed after a dropped connection
+const RESUMABLE_UPLOAD_THRESHOLD = 16 * 1024 * 1024
+const CHUNK_RETRIES = 5
+
+const uploadResumable = async (caseId: number, file: File): Promise<Document> => {
+  let session: UploadSession = (await client.post(`/api/documents/${caseId}/uploads`, {
+    filename: file.name,
+    size: file.size,
+    content_type: file.type || null,
+  })).data
+
+  let failures = 0
+  while (session.offset < session.size) {
+    const chunk = file.slice(session.offset, session.offset + session.chunk_size)
+    try {
+      session = (await client.put(`/api/documents/uploads/${session.upload_id}`, chunk, {
+        params: { offset: session.offset },
+        headers: { 'Content-Type': 'application/octet-stream' },
+      })).data
+      failures = 0
+    } catch (error) {
+      if (++failures > CHUNK_RETRIES) throw error
+      // Continue from what the server actually stored
+      session = (await client.get(`/api/documents/uploads/${session.upload_id}`)).data
+    }
+  }
+
+  const response = await client.post(`/api/documents/uploads/${session.upload_id}/complete`)
+  return response.data
+}
+
 export const documentsApi = {
   getByCaseId: async (caseId: number): Promise<Document[]> => {
     const response = await client.get(`/api/documents/case/${caseId}`)
@@ -18,6 +78,9 @@ export const documentsApi = {
   },
   
   upload: async (caseId: number, file: File): Promise<Document> => {
+    if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+      return uploadResumable(caseId, file)
+    }
     const formData = new FormData()
     formData.append('file', file)
     const response = await client.post(`/api/documents/${caseId}`, formData, {
@@ -28,6 +91,22 @@ export const documentsApi = {
     return response.data
   },
   
+  importArchive: async (caseId: number, file: File): Promise<ImportBatch> => {
+    const formData = new FormData()
+    formData.append('file', file)
+    const response = await client.post(`/api/documents/${caseId}/import`, formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    })
+    return response.data
+  },
+  
+  getImport: async (batchId: number): Promise<ImportBatch> => {
+    const response = await client.get(`/api/documents/imports/${batchId}`)
+    return response.data
+  },
+  
   delete: async (id: number): Promise<void> => {
     await client.delete(`/api/documents/${id}`)
   },
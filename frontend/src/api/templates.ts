@@ -11,9 +11,31 @@ export interface TemplateResponse {
   sources: string[]
 }
 
+export interface TemplateBatchRequest {
+  case_id: number
+  template_types: TemplateRequest['template_type'][]
+  context?: string
+}
+
+export interface TemplateDraft {
+  template_type: string
+  draft?: string
+  error?: string
+}
+
+export interface TemplateBatchResponse {
+  drafts: TemplateDraft[]
+  sources: string[]
+}
+
 export const templatesApi = {
   generate: async (request: TemplateRequest): Promise<TemplateResponse> => {
     const response = await client.post('/api/templates/', request)
     return response.data
   },
+  
+  generateBatch: async (request: TemplateBatchRequest): Promise<TemplateBatchResponse> => {
+    const response = await client.post('/api/templates/batch', request)
+    return response.data
+  },
 }
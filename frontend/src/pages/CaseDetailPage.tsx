@@ -13,6 +13,8 @@ export default function CaseDetailPage() {
   const [caseData, setCaseData] = useState<Case | null>(null)
   const [documents, setDocuments] = useState<Document[]>([])
   const [chatMessages, setChatMessages] = useState<ChatMessage[]>([])
+  const [olderCursor, setOlderCursor] = useState<string | null>(null)
+  const [latestCursor, setLatestCursor] = useState<string | null>(null)
   const [message, setMessage] = useState('')
   const [loading, setLoading] = useState(false)
   const [activeTab, setActiveTab] = useState<'chat' | 'documents' | 'templates'>('chat')
@@ -56,13 +58,35 @@ export default function CaseDetailPage() {
 
   const loadChatHistory = async () => {
     try {
-      const data = await chatApi.getHistory(Number(caseId))
-      setChatMessages(data)
+      const page = await chatApi.getHistory(Number(caseId))
+      setChatMessages(page.messages)
+      setOlderCursor(page.next_cursor)
+      setLatestCursor(page.latest_cursor)
     } catch (error) {
       console.error('Error loading chat history:', error)
     }
   }
 
+  const loadOlderMessages = async () => {
+    if (!olderCursor) return
+    try {
+      const page = await chatApi.getHistory(Number(caseId), { before: olderCursor })
+      setChatMessages((prev: ChatMessage[]) => [...page.messages, ...prev])
+      setOlderCursor(page.next_cursor)
+    } catch (error) {
+      console.error('Error loading chat history:', error)
+    }
+  }
+
+  // Fetch only the messages saved since the last fetch
+  const loadNewMessages = async (): Promise<ChatMessage[]> => {
+    const page = latestCursor
+      ? await chatApi.getHistory(Number(caseId), { since: latestCursor })
+      : await chatApi.getHistory(Number(caseId))
+    setLatestCursor(page.latest_cursor)
+    return page.messages
+  }
+
   const handleFileUpload = async (e: React.ChangeEvent<HTMLInputElement>): Promise<void> => {
     const file = e.target.files?.[0]
     if (!file || !caseId) return
@@ -103,19 +127,30 @@ export default function CaseDetailPage() {
         message: userMessage,
       })
 
-      // Update with actual response
-      const newMessage: ChatMessage = {
-        id: Date.now() + 1,
+      // Replace the placeholder with the answer
+      const answer: ChatMessage = {
+        id: response.id ?? tempUserMessage.id,
         message: userMessage,
         response: response.response,
         sources: response.sources,
-        created_at: new Date().toISOString(),
+        cached: response.cached,
+        created_at: response.created_at ?? tempUserMessage.created_at,
       }
+      setChatMessages((prev: ChatMessage[]) =>
+        prev.map((m: ChatMessage) => (m.id === tempUserMessage.id ? answer : m))
+      )
 
-      setChatMessages((prev: ChatMessage[]) => {
-        const filtered = prev.filter((m: ChatMessage) => m.id !== tempUserMessage.id)
-        return [...filtered, newMessage]
-      })
+      // Only a saved answer moves the cursor; also pick up messages saved meanwhile elsewhere
+      if (response.id !== null) {
+        loadNewMessages()
+          .then((newMessages: ChatMessage[]) => {
+            setChatMessages((prev: ChatMessage[]) => {
+              const known = new Set(prev.map((m: ChatMessage) => m.id))
+              return [...prev, ...newMessages.filter((m: ChatMessage) => !known.has(m.id))]
+            })
+          })
+          .catch((error: unknown) => console.error('Error loading new messages:', error))
+      }
     } catch (error) {
       console.error('Error sending message:', error)
       alert('Mesaj gönderilirken hata oluştu')
@@ -196,6 +231,11 @@ export default function CaseDetailPage() {
       {activeTab === 'chat' && (
         <div className="chat-container">
           <div className="chat-messages">
+            {olderCursor && (
+              <button type="button" className="btn-secondary load-older" onClick={loadOlderMessages}>
+                Daha eski mesajlar
+              </button>
+            )}
             {chatMessages.length === 0 ? (
               <div className="empty-chat">
                 <FileText size={48} />